@@ -0,0 +1,149 @@
+"""
+Min-Sum Belief Propagation over a fixed Tanner graph
+The parity-check matrix is turned once into flat edge arrays (one entry per
+non-zero of H, ordered check by check).  Every iteration is then a handful
+of NumPy segment reductions over those arrays:
+  - check-node update : sign parity, min and second-min per check
+  - variable-node update : sum of incoming check messages per variable
+so no Python loop runs over checks, variables or neighbours.  The same
+pass also runs over a leading shot axis, so a whole (shots, m) syndrome
+matrix is decoded with one call.
+"""
+
+import numpy as np
+from scipy import sparse
+
+
+class MinSumDecoder:
+    def __init__(self, H, alpha: float = 0.75, max_iter: int = 20):
+        """H: (m, n) binary parity-check matrix, dense or scipy.sparse."""
+        self.m, self.n = H.shape
+        self.alpha = alpha
+        self.max_iter = max_iter
+
+        # Edge list in check-major order (row by row, columns ascending)
+        if sparse.issparse(H):
+            H = sparse.csr_matrix(H)
+            H.sum_duplicates()
+            edge_chk, edge_var = H.nonzero()
+        else:
+            edge_chk, edge_var = np.nonzero(np.asarray(H))
+        self.n_edges = len(edge_chk)
+        self.edge_var = edge_var
+
+        # Check segments: [chk_starts[i], chk_starts[i+1]) are the edges of check chk_ids[i]
+        self.chk_ids, self.chk_starts, chk_deg = np.unique(
+            edge_chk, return_index=True, return_counts=True
+        )
+        self.edge_seg = np.repeat(np.arange(len(self.chk_ids)), chk_deg)
+        # A check with a single neighbour has no "others": its message is 0
+        self.edge_lonely = chk_deg[self.edge_seg] == 1
+
+        # Variable segments over the edges re-sorted by variable (stable keeps
+        # the check order inside each segment, as a column scan of H would)
+        self.var_perm = np.argsort(edge_var, kind="stable")
+        self.var_ids, self.var_starts = np.unique(
+            edge_var[self.var_perm], return_index=True
+        )
+
+    def syndrome(self, E: np.ndarray) -> np.ndarray:
+        """(H @ e) % 2 computed over the edge list, for e of shape (n,) or (shots, n)."""
+        E = np.asarray(E)
+        syn = np.zeros(E.shape[:-1] + (self.m,), dtype=int)
+        if self.n_edges:
+            syn[..., self.chk_ids] = (
+                np.add.reduceat(E[..., self.edge_var], self.chk_starts, axis=-1) % 2
+            )
+        return syn
+
+    def decode(self, s: np.ndarray, ch_llr) -> np.ndarray:
+        """
+        Scaled Min-Sum BP on GF(2).
+
+        Returns e_hat — best hard-decision error estimate found.
+        Stops as soon as (H @ e_hat) % 2 == s; otherwise returns the last
+        iterate.
+
+        Parameters
+        ----------
+        s      : (m,) binary syndrome vector
+        ch_llr : channel LLR log P(bit=0) / P(bit=1), scalar or (n,)
+        """
+        e_hat, _ = self.decode_batch(np.asarray(s)[None, :], ch_llr)
+        return e_hat[0]
+
+    def decode_batch(self, S: np.ndarray, ch_llr) -> tuple:
+        """
+        Decode many syndromes of the same H in one array pass.
+
+        Messages of all shots are updated together; a shot leaves the
+        active set as soon as its own hard decision satisfies its syndrome,
+        so each row of the result is exactly what decode() returns for it.
+
+        Parameters
+        ----------
+        S      : (shots, m) binary syndrome matrix
+        ch_llr : channel LLR, scalar, (n,) or (shots, n)
+
+        Returns
+        -------
+        E_hat     : (shots, n) hard-decision error estimates
+        converged : (shots,) bool, True where (H @ e_hat) % 2 == s
+        """
+        S = np.asarray(S, dtype=int)
+        n_shots = S.shape[0]
+        ch_llr = np.broadcast_to(np.asarray(ch_llr, dtype=float), (n_shots, self.n))
+        E_hat = np.zeros((n_shots, self.n), dtype=int)
+        converged = np.zeros(n_shots, dtype=bool)
+        if self.n_edges == 0:
+            converged[:] = ~np.any(S, axis=1)
+            return E_hat, converged
+
+        active = np.arange(n_shots)  # shots still iterating
+        s_seg = S[:, self.chk_ids]
+        msg_v2c = np.zeros((n_shots, self.n_edges))  # variable → check messages
+
+        for _ in range(self.max_iter):
+            # ── Check-node update (Scaled Min-Sum) ──────────────────────
+            mag = np.abs(msg_v2c)
+            neg = msg_v2c < 0
+            min1 = np.minimum.reduceat(mag, self.chk_starts, axis=1)
+            min1_e = min1[:, self.edge_seg]
+            is_min = mag == min1_e
+            # An edge only sees the second minimum if it is the unique minimum
+            n_min = np.add.reduceat(is_min, self.chk_starts, axis=1)
+            min2 = np.minimum.reduceat(
+                np.where(is_min, np.inf, mag), self.chk_starts, axis=1
+            )
+            others_min = np.where(
+                is_min & (n_min[:, self.edge_seg] == 1),
+                min2[:, self.edge_seg],
+                min1_e,
+            )
+            # Sign of the product over the others, flipped when s[i] == 1
+            parity = (np.add.reduceat(neg, self.chk_starts, axis=1) + s_seg) % 2
+            flip = parity[:, self.edge_seg].astype(bool) ^ neg
+            magnitude = np.where(self.edge_lonely, 0.0, self.alpha * others_min)
+            msg_c2v = np.where(flip, -magnitude, magnitude)
+
+            # ── Variable-node update ─────────────────────────────────────
+            c2v_sum = np.zeros((len(active), self.n))
+            c2v_sum[:, self.var_ids] = np.add.reduceat(
+                msg_c2v[:, self.var_perm], self.var_starts, axis=1
+            )
+            llr_total = ch_llr[active] + c2v_sum
+            msg_v2c = llr_total[:, self.edge_var] - msg_c2v
+
+            # ── Hard decision + per-shot convergence mask ───────────────
+            e_hat = (llr_total < 0).astype(int)
+            E_hat[active] = e_hat
+            done = np.all(self.syndrome(e_hat) == S[active], axis=1)
+            converged[active[done]] = True
+            if np.all(done):
+                break
+            keep = ~done
+            active = active[keep]
+            s_seg = s_seg[keep]
+            msg_v2c = msg_v2c[keep]
+
+        return E_hat, converged
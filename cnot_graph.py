@@ -2,11 +2,21 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
+import sys
+
+from results import load_results
+
+# Per-shot results of runs with different node grids (main.py -o / sweep.py --results)
+paths = sys.argv[1:] or ["results.npz"]
+columns = [load_results(p, columns={"nodes_per_side", "cnot_count"}) for p in paths]
+nodes_per_side = np.concatenate([c["nodes_per_side"] for c in columns])
+shot_cnots = np.concatenate([c["cnot_count"] for c in columns])
 
 # Number of nodes (QPU groups)
-nodes = np.array([1, 4, 9, 16])
-# Total CNOT counts measured in the simulation
-cnot_counts = np.array([624.2, 676.0, 728.0, 780.0])
+grids = np.unique(nodes_per_side)
+nodes = grids ** 2
+# Mean total CNOT count per shot measured in the simulation
+cnot_counts = np.array([shot_cnots[nodes_per_side == g].mean() for g in grids])
 
 # Fit a 2nd-degree polynomial to the data
 coeffs = np.polyfit(nodes, cnot_counts, 2)
@@ -1,23 +1,84 @@
 """
 Coordinator Program — OSD Decoder
 Receives SVD-compressed payloads from all cluster nodes, assembles a
-block-diagonal global parity-check matrix, runs OSD over GF(2), then
+sparse block-diagonal global parity-check matrix, runs OSD over GF(2), then
 back-projects corrections to each node via the stored V_k matrices.
 """
 
 import json
+import logging
 import numpy as np
+import threading
 import time as t
-from scipy.linalg import block_diag
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from scipy import sparse
+
+import gf2
+import osd
+import wire
+from qec_logging import get_logger
+from surface_code import XQ, ZQ
+from syndrome_stream import NUM_ROUNDS, WINDOW, DetectionStream, window_count
+from matching_decoder import HAVE_NETWORKX, MatchingDecoder
+from uf_decoder import UnionFindDecoder
 
 from squidasm.sim.stack.program import Program, ProgramContext, ProgramMeta
 
+log = get_logger("coordinator")
+
 
 class CoordinatorProgram(Program):
-    def __init__(self, layout_manager):
+    OSD_CACHE_SIZE = 64  # max number of cached (active node set, column order) eliminations
+    OSD_MAX_CANDIDATES = 4096  # max number of test patterns evaluated per OSD call
+    # "osd": SVD-reduced systems + OSD; "uf": Union-Find on the node check matrices;
+    # "matching": minimum-weight perfect matching on the detector graph of all reporting nodes
+    DECODERS = ("osd", "uf", "matching")
+
+    def __init__(self, layout_manager, osd_method: str = "exhaustive", osd_order: int = 2,
+                 osd_max_candidates: int = None, decode_workers: int = 1, decoder: str = "osd",
+                 num_rounds: int = None, window: int = None):
+        if osd_method not in osd.OSD_METHODS:
+            raise ValueError(f"Unknown OSD method '{osd_method}' (expected one of {osd.OSD_METHODS})")
+        if decoder not in self.DECODERS:
+            raise ValueError(f"Unknown decoder '{decoder}' (expected one of {self.DECODERS})")
+        if decoder == "matching" and not HAVE_NETWORKX:
+            raise ImportError("The matching decoder needs networkx (pip install networkx)")
         self.layout_manager = layout_manager
+        self.decoder = decoder
+        self.osd_method = osd_method  # "exhaustive" (OSD-E) or "cs" (combination sweep)
+        self.osd_order = osd_order    # number of least-reliable non-pivot columns searched
+        self.osd_max_candidates = osd_max_candidates or self.OSD_MAX_CANDIDATES
+        self.decode_workers = decode_workers  # >1: eliminate independent blocks on a process pool
+        # The nodes stream num_rounds - 1 detection layers, `window` layers per message
+        self.num_rounds = NUM_ROUNDS if num_rounds is None else num_rounds
+        self.window = WINDOW if window is None else window
+        self.n_windows = window_count(self.num_rounds, self.window)
+        self._decode_pool = None
+        self._sector_pool = None  # two threads: the X and Z sectors decode concurrently
+        self._cache_lock = threading.Lock()  # the sector threads share the OSD cache
+        self._payloads, self._merged = {}, {}  # current shot, per sector (filled by run)
         N = layout_manager.nodes_per_side
         self.node_names = [f"node_{r}_{c}" for r in range(N) for c in range(N)]
+        self.node_ids = [(r, c) for r in range(N) for c in range(N)]
+        # One record per decoded shot (see _shot_record / results.py), drained by the driver
+        self.shot_log = []
+        self._n_data = None
+        self._osd_cache = OrderedDict()
+        # (node_id, error_type, energy_threshold) → (H_red, V_k, llr) from the node's SVD
+        self._node_systems = {}
+        # (node_id, error_type) → layout-only check matrix / its rows' ancilla slots / graph decoder
+        self._check_matrices = {}
+        self._check_slot_rows = {}
+        self._graph_decoders = {}
+        # (node ids, error_type) → multi-node check matrix (H, row_starts, col_starts)
+        self._multi_check_matrices = {}
+        # (node ids, error_type, rounds, open top) → (H, MatchingDecoder, row_starts, col_starts)
+        self._matching_graphs = {}
+        # Matching on the streamed windows: error_type → (e, carry) of the shot so far,
+        # then (node ids, e, col_starts) once its last window is in
+        self._window_state = {}
+        self._streamed = {}
 
     @property
     def meta(self) -> ProgramMeta:
@@ -28,46 +89,35 @@ class CoordinatorProgram(Program):
             max_qubits=1,       # SquidASM requires at least 1 qubit, but the coordinator doesn't actually use it. We just won't do anything with it.
         )
     
+    # Shut down the sector threads and the elimination processes (recreated on demand)
+    def close(self):
+        for pool in (self._sector_pool, self._decode_pool):
+            if pool is not None:
+                pool.shutdown()
+        self._sector_pool = self._decode_pool = None
+
     # ------------------------------------------------------------------ #
     #  Run                                                                 #
     # ------------------------------------------------------------------ #
     def run(self, context: ProgramContext):
-        # Step 1: receive payloads
-        payloads_X, payloads_Z = [], []
-        for name in self.node_names:
-            msg_X = yield from context.csockets[name].recv()
-            msg_Z = yield from context.csockets[name].recv()
-            payloads_X.append(json.loads(msg_X))
-            payloads_Z.append(json.loads(msg_Z))
-        
-        
-
-        # Step 2: assemble block-diagonal system and run OSD separately for X and Z errors
-        for payloads, error_type in [(payloads_X, "X"), (payloads_Z, "Z")]:
-            time_start = t.time()
-            active_nodes = [(p["node_id"], p.get("s", []), "H_reduced" in p)
-                           for p in payloads if p.get("active", False)]
-            inactive_nodes = [(p["node_id"], p.get("bp_corrections", []))
-                             for p in payloads if not p.get("active", False)]
-            print(f"\n[coordinator] {error_type}-errors: "
-                  f"active={[n for n,s,_ in active_nodes]} "
-                  f"(syndromes len={[len(s) for _,s,_ in active_nodes]}), "
-                  f"inactive={[n for n,_ in inactive_nodes]} "
-                  f"(bp_corr={[len(c) for _,c in inactive_nodes]})")
-            H_global, s_global, llr_global, registry = self._assemble_global_system(payloads)
-            if H_global is not None:
-                e_global = self._osd_gf2(H_global, s_global, llr_global=llr_global)
-                K_tot = H_global.shape[1]
-                if np.sum(e_global) > K_tot // 2:
-                    print(f"[coordinator] WARNING: OSD returned {np.sum(e_global)}/{K_tot} corrections "
-                          f"for {error_type}-errors — discarding (likely degenerate system)")
-                    e_global = np.zeros_like(e_global)
-                corrections = self._project_corrections(e_global, registry) if np.any(e_global) else {}
-            else:
-                corrections = {}
-            t_end = t.time()
-            t_tot = t_end - time_start
-            yield from self._send_corrections(context, payloads, corrections, t_tot)
+        # Steps 1-2: every node sends its X payload, then its Z payload, and only
+        # then waits for the replies. The X sector starts decoding on the sector
+        # pool as soon as the last X payload is in, while the Z payloads are still
+        # being received; each sector's corrections are sent as soon as it finishes,
+        # between two Z receptions if X is done by then.
+        if self._sector_pool is None:
+            self._sector_pool = ThreadPoolExecutor(max_workers=2)
+        yield from self._recv_windows(context)
+        self._payloads, self._merged = {}, {}
+        futures = {}
+        for error_type in ("X", "Z"):
+            self._payloads[error_type] = yield from self._recv_payloads(context, futures)
+            future = self._sector_pool.submit(self._decode_and_merge, self._payloads[error_type], error_type)
+            futures[future] = error_type
+        for future in as_completed(list(futures)):
+            yield from self._sector_done(context, futures.pop(future), future)
+        payloads_X, payloads_Z = self._payloads["X"], self._payloads["Z"]
+        merged = self._merged
 
         # Step 3: aggregate logical-Z parities and determine the global parity
         global_parity = 0
@@ -78,14 +128,14 @@ class CoordinatorProgram(Program):
                 global_parity ^= val
 
         status = "OK — no logical error" if global_parity == 0 else "FAIL — logical error survived!"
-        print(f"\n=== Logical Z (global) = {global_parity} → {status} ===\n")
+        log.info("=== Logical Z (global) = %d → %s ===", global_parity, status)
 
         # Step 4: collect the total CNOT gate count across all nodes
         global_cnot_count = 0
         for name in self.node_names:
             msg = yield from context.csockets[name].recv()
             global_cnot_count += json.loads(msg)
-        print(f"=== Global CNOT count = {global_cnot_count} ===\n")
+        log.info("=== Global CNOT count = %d ===", global_cnot_count)
 
         # Step 5: collect decoding times and report the worst-case value
         max_time = 0
@@ -94,11 +144,200 @@ class CoordinatorProgram(Program):
             node_time = json.loads(msg)
             if node_time > max_time:
                 max_time = node_time
-        print(f"=== Max decoding time across nodes = {max_time:.2f} seconds ===\n")
+        log.info("=== Max decoding time across nodes = %.2f seconds ===", max_time)
 
+        self.shot_log.append(self._shot_record(payloads_X, payloads_Z, merged["X"], merged["Z"],
+                                               global_parity, global_cnot_count, max_time))
         yield from context.connection.flush()
         return global_parity, global_cnot_count
 
+    # Receive the detection layers the nodes stream while they measure
+    def _recv_windows(self, context: ProgramContext):
+        """Window k of every node is read before window k + 1 of any, and the
+        grid's window k is handed to _absorb_window as soon as it is complete."""
+        for k in range(self.n_windows):
+            layers = {}
+            for name, node_id in zip(self.node_names, self.node_ids):
+                msg = yield from context.csockets[name].recv()
+                n_anc = len(self.layout_manager.get_node_grid(*node_id).anc_idx)
+                layers[node_id] = DetectionStream.unpack(wire.decode(msg)["events"], n_anc)
+            self._absorb_window(layers, last=k == self.n_windows - 1)
+
+    # One window of every node's detection layers ({node_id: (w, n_anc) uint8})
+    def _absorb_window(self, layers: dict, last: bool, sectors: tuple = ("X", "Z")):
+        """The node-level decoders (BP / SVD / OSD, UF) work on the running
+        XOR each node keeps of its layers, so they only drain the stream.
+        Matching decodes each window as it arrives, on a detector graph with
+        time-like edges between its rounds, and carries the defects it leaves
+        open into the next window; only the correction and the carry are kept.
+        sectors restricts the decode to the error types the caller will read."""
+        if self.decoder != "matching":
+            return
+        node_ids = list(layers)
+        for error_type in sectors:
+            events = np.concatenate([layers[node_id][:, self._check_slots(node_id, error_type)]
+                                     for node_id in node_ids], axis=1)
+            _, decoder, _, col_starts = self._matching_graph(
+                node_ids, error_type, num_rounds=len(events), open_top=not last)
+            e, carry = self._window_state.pop(error_type, (0, 0))
+            events[0] ^= carry
+            e_window, carry = decoder.decode_window(events)
+            e = e ^ e_window
+            if last:
+                self._streamed[error_type] = (node_ids, e, col_starts)
+            else:
+                self._window_state[error_type] = (e, carry)
+
+    # Receive one payload from every node
+    def _recv_payloads(self, context: ProgramContext, futures: dict = None):
+        """A socket only offers a blocking recv() (no poll / select across
+        sockets), so the nodes are read in node order; messages that arrive
+        early wait in their socket buffer, and the last arrival still sets
+        the time at which the sector is complete.  futures ({future: error_type}
+        of the sectors already decoding) is polled after every recv, and a
+        finished sector is answered right away and removed from it."""
+        payloads = []
+        for name in self.node_names:
+            msg = yield from context.csockets[name].recv()
+            payloads.append(wire.decode(msg))
+            for future in [f for f in futures or () if f.done()]:
+                yield from self._sector_done(context, futures.pop(future), future)
+        return payloads
+
+    # A sector has finished decoding: deliver its corrections
+    def _sector_done(self, context: ProgramContext, error_type: str, future):
+        self._merged[error_type], t_tot = future.result()
+        yield from self._send_corrections(context, self._merged[error_type], error_type, t_tot)
+
+    # Decode and merge one sector on a sector-pool thread
+    def _decode_and_merge(self, payloads: list, error_type: str) -> tuple:
+        """Return (merged corrections, decoding time [s]) for one sector.  The
+        two sectors overlap, so the time of a shot is the larger of the two
+        (the critical path), not their sum."""
+        time_start = t.time()
+        corrections = self._decode_sector(payloads, error_type)
+        t_tot = t.time() - time_start
+        return self._merge_corrections(payloads, corrections), t_tot
+
+    # Decode one error type (X or Z) from the node payloads
+    def _decode_sector(self, payloads: list, error_type: str) -> dict:
+        """Assemble the global system, run block-wise OSD and back-project.
+        Returns {node_id: correction mask over the node's data qubits} for the
+        active nodes; BP corrections are merged in later by _merge_corrections."""
+        if log.isEnabledFor(logging.DEBUG):
+            active_nodes = [(p["node_id"], p.get("s", []), "H_reduced" in p)
+                           for p in payloads if p.get("active", False)]
+            inactive_nodes = [(p["node_id"], p.get("bp_corrections", []))
+                             for p in payloads if not p.get("active", False)]
+            log.debug("[coordinator] %s-errors: active=%s (syndromes len=%s), inactive=%s (bp_corr=%s)",
+                      error_type,
+                      [n for n,s,_ in active_nodes],
+                      [len(s) for _,s,_ in active_nodes],
+                      [n for n,_ in inactive_nodes],
+                      [int(np.count_nonzero(c)) for _,c in inactive_nodes])
+        if self.decoder != "osd":
+            return self._decode_sector_graph(payloads, error_type)
+        H_global, s_global, llr_global, registry = self._assemble_global_system(payloads)
+        if H_global is None:
+            return {}
+        e_global = self._decode_blocks(H_global, s_global, llr_global, registry, error_type)
+        K_tot = H_global.shape[1]
+        if np.sum(e_global) > K_tot // 2:
+            log.warning("[coordinator] OSD returned %d/%d corrections for %s-errors "
+                        "— discarding (likely degenerate system)", np.sum(e_global), K_tot, error_type)
+            e_global = np.zeros_like(e_global)
+        return self._project_corrections(e_global, registry) if np.any(e_global) else {}
+
+    # Graph decoder: every active node on its own check matrix, straight to data-qubit masks
+    def _decode_sector_graph(self, payloads: list, error_type: str) -> dict:
+        """Union-Find: the node systems share no columns, so each active node's
+        residual syndrome is decoded on its own layout check matrix.  Matching
+        decodes all nodes on one graph.  Returns the same {node_id: correction
+        mask} as _project_corrections; the SVD factors are not needed."""
+        if self.decoder == "matching":
+            return self._decode_sector_matching(payloads, error_type)
+        corrections = {}
+        for p in payloads:
+            if not p.get("active", False):
+                continue
+            node_id = tuple(p["node_id"])
+            e_local = self._graph_decoder(node_id, error_type).decode(p["s"])
+            if np.any(e_local):
+                corrections[node_id] = e_local.astype(bool)
+        return corrections
+
+    # Matching: one detector graph over every reporting node, so paths may cross node borders
+    def _decode_sector_matching(self, payloads: list, error_type: str) -> dict:
+        """Takes the correction matched on the streamed windows; without a
+        stream (the top coordinator's residuals) the rounds are folded into
+        one syndrome, rebuilt from the payloads."""
+        if error_type in self._streamed:
+            node_ids, e, col_starts = self._streamed.pop(error_type)
+        else:
+            node_ids = [tuple(p["node_id"]) for p in payloads]
+            _, decoder, row_starts, col_starts = self._matching_graph(node_ids, error_type)
+            e = decoder.decode(self._sector_syndrome(payloads, row_starts, error_type))
+        corrections = {}
+        for i, node_id in enumerate(node_ids):
+            e_local = e[col_starts[i]:col_starts[i + 1]]
+            if np.any(e_local):
+                corrections[node_id] = e_local.astype(bool)
+        return corrections
+
+    # Full syndrome of every node at its rows of the multi-node check matrix
+    def _sector_syndrome(self, payloads: list, row_starts: np.ndarray, error_type: str) -> np.ndarray:
+        """A node sends its residual after BP, s + H e_bp (all-zero when BP
+        converged), and e_bp itself, so its measured syndrome is recovered
+        without BP's choice of correction."""
+        s = np.zeros(row_starts[-1], dtype=np.uint8)
+        for i, p in enumerate(payloads):
+            s_i = self._check_matrix(tuple(p["node_id"]), error_type) @ p["bp_corrections"].astype(np.uint8)
+            if p.get("active", False):
+                s_i = s_i + p["s"]
+            s[row_starts[i]:row_starts[i + 1]] = s_i % 2
+        return s
+
+    # Built once per set of reporting nodes and window shape: every shot of a flat
+    # coordinator hits the same few graphs
+    def _matching_graph(self, node_ids: list, error_type: str, num_rounds: int = 1,
+                        open_top: bool = False) -> tuple:
+        key = (tuple(node_ids), error_type, num_rounds, open_top)
+        if key not in self._matching_graphs:
+            H, row_starts, col_starts = self._multi_check_matrix(node_ids, error_type)
+            self._matching_graphs[key] = (H, MatchingDecoder(H, num_rounds, open_top),
+                                          row_starts, col_starts)
+        return self._matching_graphs[key]
+
+    # Check matrix of several nodes with the border stabilizers whole (SurfaceLayout.check_matrix)
+    def _multi_check_matrix(self, node_ids: list, error_type: str) -> tuple:
+        key = (tuple(node_ids), error_type)
+        if key not in self._multi_check_matrices:
+            self._multi_check_matrices[key] = self.layout_manager.check_matrix(
+                ZQ if error_type == "X" else XQ, node_ids)
+        return self._multi_check_matrices[key]
+
+    def _graph_decoder(self, node_id: tuple, error_type: str):
+        key = (node_id, error_type)
+        if key not in self._graph_decoders:
+            self._graph_decoders[key] = UnionFindDecoder(self._check_matrix(node_id, error_type))
+        return self._graph_decoders[key]
+
+    # Layout check matrix behind a node's payload: X errors ↔ Z stabilizers (H_Z) and vice versa
+    def _check_matrix(self, node_id: tuple, error_type: str) -> sparse.csr_matrix:
+        key = (node_id, error_type)
+        if key not in self._check_matrices:
+            grid = self.layout_manager.get_node_grid(*node_id)
+            self._check_matrices[key] = grid.check_matrix(ZQ if error_type == "X" else XQ)[0]
+        return self._check_matrices[key]
+
+    # Ancilla slot (NodeGrid.anc_idx order) of every row of that check matrix
+    def _check_slots(self, node_id: tuple, error_type: str) -> np.ndarray:
+        key = (node_id, error_type)
+        if key not in self._check_slot_rows:
+            grid = self.layout_manager.get_node_grid(*node_id)
+            self._check_slot_rows[key] = grid.check_slots(ZQ if error_type == "X" else XQ)
+        return self._check_slot_rows[key]
+
     # Assemble block-diagonal global system
     def _assemble_global_system(self, payloads: list) -> tuple:
         active = [p for p in payloads if p.get("active", False)]
@@ -106,100 +345,177 @@ class CoordinatorProgram(Program):
             return None, None, None, []
 
         H_blocks, s_list, llr_list, registry = [], [], [], []
-        col_offset = 0
+        col_offset = row_offset = 0
 
         for p in active:
-            H_red_raw = np.array(p["H_reduced"], dtype=float)
-            V_k = np.array(p["V_k"], dtype=float)
+            H_red, V_k, llr_i = self._node_system(p)
             k_i = int(p["k"])
-            H_red = (np.abs(np.round(H_red_raw).astype(int)) % 2).astype(int)
-            s_i = np.array(p["s"], dtype=int)
+            s_i = p["s"].astype(int)
 
             H_blocks.append(H_red)
             s_list.extend(s_i.tolist())
 
-            if "llr" in p and len(p["llr"]) == k_i:
-                llr_list.extend(p["llr"])
+            if len(llr_i) == k_i:
+                llr_list.extend(llr_i)
             else:
                 llr_list.extend([0.0] * k_i)
 
             registry.append({
                 "node_id":        tuple(p["node_id"]),
+                "energy_threshold": p["energy_threshold"],
                 "V_k":            V_k,
-                "data_positions": [tuple(pos) for pos in p["data_positions"]],
                 "col_start":      col_offset,
                 "col_end":        col_offset + k_i,
+                "row_start":      row_offset,
+                "row_end":        row_offset + len(s_i),
             })
             col_offset += k_i
+            row_offset += len(s_i)
 
-        H_global  = block_diag(*H_blocks)
+        H_global  = sparse.block_diag(H_blocks, format="csr")
         s_global  = np.array(s_list, dtype=int)
         llr_global = np.array(llr_list, dtype=float)
         return H_global, s_global, llr_global, registry
 
-    # Soft-decision OSD decoder over GF(2)
-    def _osd_gf2(self, H_global: np.ndarray, s_global: np.ndarray,
-                 llr_global: np.ndarray = None, osd_order: int = 2) -> np.ndarray:
-        m, K_tot = H_global.shape
-        H = H_global.astype(int) % 2
-        s = s_global.astype(int) % 2
+    # Per-node SVD factors: sent once by each node, reused on every later shot
+    def _node_system(self, p: dict) -> tuple:
+        key = (p["node_id"], p["error_type"], p["energy_threshold"])
+        if "H_reduced" in p:
+            H_red = (np.abs(np.round(np.array(p["H_reduced"], dtype=float)).astype(int)) % 2).astype(int)
+            self._node_systems[key] = (
+                sparse.csr_matrix(H_red),
+                np.array(p["V_k"], dtype=float),
+                np.array(p["llr"], dtype=float),
+            )
+        elif key not in self._node_systems:
+            raise RuntimeError(f"No SVD factors received from node {p['node_id']} "
+                               f"for {p['error_type']}-errors")
+        return self._node_systems[key]
+
+    # Decode every independent block of the global system on its own
+    def _decode_blocks(self, H_global: sparse.csr_matrix, s_global: np.ndarray,
+                       llr_global: np.ndarray, registry: list, error_type: str) -> np.ndarray:
+        """The active nodes' blocks share no columns, so OSD over the whole
+        block-diagonal matrix splits into one OSD per connected component of
+        its Tanner graph. Blocks with a zero syndrome decode to zero and are
+        skipped; the block results are stitched back into e_global in the
+        registry's column layout."""
+        e_global = np.zeros(H_global.shape[1], dtype=int)
+        col_starts = np.array([reg["col_start"] for reg in registry])
+
+        jobs = []
+        for rows, cols in gf2.split_blocks(H_global):
+            if len(cols) == 0 or not np.any(s_global[rows]):
+                continue
+            # A component never straddles two nodes: key it by its owner, the owner's SVD
+            # factors (energy threshold, as in _node_system) and its local columns
+            reg = registry[int(np.searchsorted(col_starts, cols[0], side="right")) - 1]
+            cache_key = (error_type, reg["node_id"], reg["energy_threshold"],
+                         tuple((cols - reg["col_start"]).tolist()))
+            jobs.append((rows, cols, cache_key))
+
+        if self.decode_workers > 1 and len(jobs) > 1:
+            self._prefetch_systematic_forms(H_global, llr_global, jobs)
 
+        for rows, cols, cache_key in jobs:
+            e_global[cols] = self._osd_gf2(H_global[rows][:, cols], s_global[rows],
+                                           llr_global=llr_global[cols], cache_key=cache_key)
+        return e_global
+
+    def _prefetch_systematic_forms(self, H_global: sparse.csr_matrix, llr_global: np.ndarray, jobs: list):
+        """Run the eliminations missing from the OSD cache on the worker pool,
+        so that the per-block _osd_gf2 calls only hit the cache."""
+        with self._cache_lock:
+            if self._decode_pool is None:
+                self._decode_pool = ProcessPoolExecutor(max_workers=self.decode_workers)
+        pending = {}
+        for rows, cols, cache_key in jobs:
+            H = H_global[rows][:, cols].toarray() % 2
+            _, col_order = self._column_order(llr_global[cols], len(cols))
+            key = (cache_key, gf2.digest(H), col_order.tobytes())
+            with self._cache_lock:
+                cached = key in self._osd_cache
+            if not cached and key not in pending:
+                pending[key] = self._decode_pool.submit(gf2.systematic_form, H[:, col_order], True)
+        for key, future in pending.items():
+            self._store_systematic_form(key, *future.result())
+
+    # Most reliable columns first; columns without a usable LLR weigh the same
+    def _column_order(self, llr_global: np.ndarray, K_tot: int) -> tuple:
         if llr_global is not None and len(llr_global) == K_tot:
             reliability = np.abs(llr_global)
         else:
             reliability = np.ones(K_tot)
+        return reliability, np.argsort(-reliability)
 
-        col_order = np.argsort(-reliability)
+    # Soft-decision OSD decoder over GF(2)
+    def _osd_gf2(self, H_global: np.ndarray, s_global: np.ndarray,
+                 llr_global: np.ndarray = None, osd_order: int = None,
+                 cache_key=None) -> np.ndarray:
+        if osd_order is None:
+            osd_order = self.osd_order
+        if sparse.issparse(H_global):
+            H_global = H_global.toarray()  # a single block: small enough to densify
+        m, K_tot = H_global.shape
+        H = H_global.astype(int) % 2
+        s = s_global.astype(int) % 2
+
+        reliability, col_order = self._column_order(llr_global, K_tot)
         inv_order  = np.empty(K_tot, dtype=int)
         inv_order[col_order] = np.arange(K_tot)
 
-        H_ord = H[:, col_order].copy()
-        H_sys, s_sys = H_ord.copy(), s.copy()
-        pivot_cols, pivot_rows = [], []
-        row = 0
-
-        for col in range(K_tot):
-            if row >= m:
-                break
-            found = next((r for r in range(row, m) if H_sys[r, col] == 1), -1)
-            if found == -1:
-                continue
-            H_sys[[row, found]] = H_sys[[found, row]]
-            s_sys[[row, found]] = s_sys[[found, row]]
-            for r2 in range(m):
-                if r2 != row and H_sys[r2, col] == 1:
-                    H_sys[r2] = (H_sys[r2] + H_sys[row]) % 2
-                    s_sys[r2]  = (s_sys[r2]  + s_sys[row])  % 2
-            pivot_cols.append(col)
-            pivot_rows.append(row)
-            row += 1
-
-        non_pivot = [c for c in range(K_tot) if c not in pivot_cols]
+        # The caller's key names the block; the digest pins down its actual entries
+        if cache_key is not None:
+            cache_key = (cache_key, gf2.digest(H), col_order.tobytes())
+        H_sys, pivot_cols, non_pivot, T_packed = self._systematic_form(
+            H[:, col_order], cache_key
+        )
+        s_sys = gf2.matvec(T_packed, s).astype(int)
         non_pivot_sorted = sorted(non_pivot, key=lambda c: reliability[col_order[c]])
-        test_cols = non_pivot_sorted[:osd_order]
-        n_test = len(test_cols)
+        test_cols = osd.search_columns(non_pivot_sorted, osd_order, self.osd_method)
+        n_pivot = len(pivot_cols)
 
-        def soft_cost(e_ord):
-            return float(np.sum(reliability[col_order] * e_ord))
+        # Soft cost of a candidate = sum of the reliabilities of its set columns
+        rel_ord = reliability[col_order]
+        patterns = osd.candidate_patterns(len(test_cols), self.osd_method,
+                                          self.osd_max_candidates, osd_order)
+        e_test, e_piv = osd.best_pattern(
+            H_sys[:n_pivot][:, test_cols], s_sys[:n_pivot],
+            rel_ord[pivot_cols], rel_ord[test_cols], patterns,
+        )
 
-        best_cost = float("inf")
         best_e_ord = np.zeros(K_tot, dtype=int)
+        best_e_ord[test_cols] = e_test
+        best_e_ord[pivot_cols] = e_piv
+        return best_e_ord[inv_order]
 
-        for pattern in range(2 ** n_test):
-            e_ord = np.zeros(K_tot, dtype=int)
-            for b, tc in enumerate(test_cols):
-                e_ord[tc] = (pattern >> b) & 1
-            for pc, pr in zip(pivot_cols, pivot_rows):
-                rhs = s_sys[pr]
-                for fc in non_pivot:
-                    rhs = (rhs + H_sys[pr, fc] * e_ord[fc]) % 2
-                e_ord[pc] = rhs
-            cost = soft_cost(e_ord)
-            if cost < best_cost:
-                best_cost  = cost
-                best_e_ord = e_ord.copy()
+    # Syndrome-independent part of the OSD elimination, LRU-cached across shots
+    def _systematic_form(self, H_ord: np.ndarray, cache_key=None) -> tuple:
+        """Return (H_sys, pivot_cols, non_pivot, T_packed) for the column-ordered H.
+        H_sys and the pivot structure depend only on H and the column order, so
+        for a known cache_key only the packed row transform T is applied to the
+        new syndrome (s_sys = T @ s) instead of redoing the elimination."""
+        if cache_key is not None:
+            with self._cache_lock:
+                if cache_key in self._osd_cache:
+                    self._osd_cache.move_to_end(cache_key)
+                    return self._osd_cache[cache_key]
 
-        return best_e_ord[inv_order]
+        H_sys, pivot_cols, T = gf2.systematic_form(H_ord, with_transform=True)
+        return self._store_systematic_form(cache_key, H_sys, pivot_cols, T)
+
+    def _store_systematic_form(self, cache_key, H_sys, pivot_cols, T) -> tuple:
+        is_pivot = np.zeros(H_sys.shape[1], dtype=bool)
+        is_pivot[pivot_cols] = True
+        entry = (H_sys.astype(int), pivot_cols.tolist(),
+                 np.flatnonzero(~is_pivot).tolist(), gf2.pack_rows(T))
+
+        if cache_key is not None:
+            with self._cache_lock:
+                self._osd_cache[cache_key] = entry
+                if len(self._osd_cache) > self.OSD_CACHE_SIZE:
+                    self._osd_cache.popitem(last=False)
+        return entry
 
     # Back-project global error estimate to per-node corrections
     def _project_corrections(self, e_global: np.ndarray, registry: list) -> dict:
@@ -208,33 +524,66 @@ class CoordinatorProgram(Program):
             e_block = e_global[reg["col_start"]:reg["col_end"]]
             V_k = reg["V_k"]
             e_local = (np.abs(np.round(np.array(V_k, dtype=float) @ e_block.astype(float)).astype(int)) % 2).astype(int)
-            corrections[reg["node_id"]] = [
-                list(reg["data_positions"][j])
-                for j in range(len(e_local)) if e_local[j] == 1
-            ]
+            corrections[reg["node_id"]] = e_local.astype(bool)  # mask over the node's data qubits
         return corrections
 
-    # Merge OSD and BP corrections, then deliver results to each cluster node
-    def _send_corrections(self, context: ProgramContext, payloads: list, corrections_per_node: dict, t_tot):
-        """Merge OSD corrections (active nodes) with BP corrections (inactive/converged nodes)."""
+    # Merge OSD and BP corrections into one mask per node
+    def _merge_corrections(self, payloads: list, corrections_per_node: dict) -> dict:
+        """Merge OSD corrections (active nodes) with BP corrections (inactive/converged nodes).
+        Both are masks over the node's data qubits; corrections found twice cancel (XOR).
+        The matching backend decodes the nodes' full syndromes, so its correction replaces BP's."""
+        n_data = {p["node_id"]: p["n_data"] for p in payloads}
         bp_map: dict = {}
         for p in payloads:
-            node_id = tuple(p["node_id"])
-            if p.get("active", False):
+            if p.get("active", False) or self.decoder == "matching":
                 continue
-            bp_corrs = p.get("bp_corrections", [])
-            if bp_corrs:
-                existing = bp_map.get(node_id, [])
-                bp_map[node_id] = existing + bp_corrs
+            bp_map[p["node_id"]] = p["bp_corrections"]
+
+        merged = {}
+        for node_id, n in n_data.items():
+            mask = np.zeros(n, dtype=bool)
+            if node_id in corrections_per_node:
+                mask ^= corrections_per_node[node_id]
+            if node_id in bp_map:
+                mask ^= bp_map[node_id]
+            merged[node_id] = mask
+        return merged
 
+    # Deliver the merged corrections to each cluster node
+    def _send_corrections(self, context: ProgramContext, merged: dict, error_type: str, t_tot):
+        """The sectors finish in either order, so every reply names its sector."""
         for name in self.node_names:
             parts = name.replace("node_", "").split("_")
             node_id = (int(parts[0]), int(parts[1]))
-            osd_corr = corrections_per_node.get(node_id, [])
-            bp_corr  = bp_map.get(node_id, [])
-            osd_set = set(tuple(c) for c in osd_corr)
-            bp_set  = set(tuple(c) for c in bp_corr)
-            merged  = list(osd_set.symmetric_difference(bp_set))
-            context.csockets[name].send(json.dumps(merged))
-            context.csockets[name].send(json.dumps(t_tot))
-        yield from context.connection.flush()
\ No newline at end of file
+            context.csockets[name].send(wire.encode({"corrections": merged[node_id],
+                                                     "error_type": error_type, "t_tot": t_tot}))
+        yield from context.connection.flush()
+
+    # Per-shot record for the results store (columns documented in results.py)
+    def _shot_record(self, payloads_X: list, payloads_Z: list, merged_X: dict, merged_Z: dict,
+                     logical_parity: int, cnot_count: int, decoding_time: float) -> dict:
+        """Nodes without a payload (e.g. a sector that was not decoded) count as clean."""
+        if self._n_data is None:
+            self._n_data = np.array([self.layout_manager.get_node_grid(*node_id).data_idx.size
+                                     for node_id in self.node_ids], dtype=np.int32)
+        n_data = self._n_data
+        record = {"n_data": n_data}
+        for error_type, payloads, merged in (("X", payloads_X, merged_X), ("Z", payloads_Z, merged_Z)):
+            by_node = {tuple(p["node_id"]): p for p in payloads}
+            nodes = [by_node.get(node_id, {}) for node_id in self.node_ids]
+            active = [p for p in nodes if p.get("active", False)]
+            record[f"syndrome_weight_{error_type}"] = np.array(
+                [p.get("syndrome_weight", 0) for p in nodes], dtype=np.int32)
+            record[f"bp_converged_{error_type}"] = np.array(
+                [not p.get("active", False) for p in nodes], dtype=bool)
+            record[f"k_{error_type}"] = np.array(
+                [p.get("k", 0) if p.get("active", False) else 0 for p in nodes], dtype=np.int32)
+            record[f"osd_rows_{error_type}"] = sum(len(p["s"]) for p in active)
+            record[f"osd_cols_{error_type}"] = sum(int(p["k"]) for p in active)
+            masks = [merged.get(node_id, np.zeros(n, dtype=bool))
+                     for node_id, n in zip(self.node_ids, n_data)]
+            record[f"corrections_{error_type}"] = np.packbits(np.concatenate(masks), bitorder="little")
+        record["logical_parity"] = int(logical_parity)
+        record["cnot_count"] = int(cnot_count)
+        record["decoding_time"] = float(decoding_time)
+        return record
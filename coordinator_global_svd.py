@@ -1,10 +1,11 @@
 """
 Coordinator Program — SVD-on-Coordinator variant with BP corrections support
 Receives payloads from all cluster nodes. Each payload is either:
-  - active=False, bp_corrections=[...]  → BP on the node solved it completely;
+  - active=False, bp_corrections (mask) → BP on the node solved it completely;
                                           route the corrections back directly.
-  - active=True,  H_full, s (residual)  → BP did not converge; apply global
+  - active=True,  H (CSR), s (residual) → BP did not converge; apply global
                                           SVD + OSD on the residual syndrome.
+Payloads and replies use the binary format of wire.py.
 
 Differences from coordinator_global_svd.py (original)
 ------------------------------------------------------
@@ -16,18 +17,44 @@ Differences from coordinator_global_svd.py (original)
 
 import json
 import numpy as np
-from scipy.linalg import block_diag
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse
+
+import gf2
+import osd
+import wire
+from qec_logging import get_logger
 
 from squidasm.sim.stack.program import Program, ProgramContext, ProgramMeta
 
+log = get_logger("coordinator")
 
-class CoordinatorProgram(Program):
-    ENERGY_THRESHOLD = 0.98
 
-    def __init__(self, layout_manager):
-        self.layout_manager = layout_manager
+class CoordinatorProgram(Program):
+    ENERGY_THRESHOLD   = 0.98
+    OSD_CACHE_SIZE     = 64
+    OSD_MAX_CANDIDATES = 4096
+
+    def __init__(self, layout_manager, osd_method: str = "exhaustive",
+                 osd_order: int = 2, osd_max_candidates: int = None,
+                 decode_workers: int = 1):
+        if osd_method not in osd.OSD_METHODS:
+            raise ValueError(f"Unknown OSD method '{osd_method}' "
+                             f"(expected one of {osd.OSD_METHODS})")
+        self.layout_manager     = layout_manager
+        self.osd_method         = osd_method
+        self.osd_order          = osd_order
+        self.osd_max_candidates = osd_max_candidates or self.OSD_MAX_CANDIDATES
+        self.decode_workers     = decode_workers
+        self._decode_pool       = None
         N = layout_manager.nodes_per_side
         self.node_names = [f"node_{r}_{c}" for r in range(N) for c in range(N)]
+        # (active node set, column order) → cached OSD elimination, LRU order
+        self._osd_cache = OrderedDict()
+        # Layout-only data sent once by the nodes / derived once per active set
+        self._node_H_cache = {}   # (node_id, error_type) → node H (CSR)
+        self._svd_cache    = {}   # (error_type, active ids) → global SVD column selection
 
     @property
     def meta(self) -> ProgramMeta:
@@ -42,19 +69,19 @@ class CoordinatorProgram(Program):
     #  Run                                                                 #
     # ------------------------------------------------------------------ #
     def run(self, context: ProgramContext):
-        # Step 1: receive payloads (full-H or bp_corrections) from all nodes
-        payloads_X, payloads_Z = [], []
-        for name in self.node_names:
-            msg_X = yield from context.csockets[name].recv()
-            msg_Z = yield from context.csockets[name].recv()
-            payloads_X.append(json.loads(msg_X))
-            payloads_Z.append(json.loads(msg_Z))
+        # Steps 1-5, one sector at a time: receive the payloads (full-H or
+        # bp_corrections) of every node, then SVD + OSD + corrections. The X sector
+        # is answered while the Z payloads are still on their way.
+        for error_type in ("X", "Z"):
+            payloads = []
+            for name in self.node_names:
+                msg = yield from context.csockets[name].recv()
+                payloads.append(wire.decode(msg))
 
-        # Steps 2-5: SVD + OSD + corrections (X and Z separately)
-        for payloads, error_type in [(payloads_X, "X"), (payloads_Z, "Z")]:
             H_global, s_global, registry = self._assemble_global_system(payloads)
             if H_global is not None:
-                e_global    = self._osd_gf2(H_global, s_global)
+                e_global    = self._decode_blocks(H_global, s_global, registry,
+                                                  error_type)
                 corrections = (
                     self._project_corrections(e_global, registry)
                     if np.any(e_global) else {}
@@ -72,7 +99,7 @@ class CoordinatorProgram(Program):
                 global_parity ^= val
 
         status = "OK — no logical error" if global_parity == 0 else "FAIL — logical error survived!"
-        print(f"\n=== Logical Z (global) = {global_parity} → {status} ===\n")
+        log.info("=== Logical Z (global) = %d → %s ===", global_parity, status)
 
         yield from context.connection.flush()
         return global_parity
@@ -95,26 +122,77 @@ class CoordinatorProgram(Program):
         col_offset      = 0
 
         for p in active:
-            H_full = np.array(p["H_full"], dtype=int)
-            s_i    = np.array(p["s"],      dtype=int)
+            H_full = self._node_H(p)
+            s_i    = p["s"].astype(int)
             n_i    = int(p["n"])
 
             H_blocks.append(H_full)
             s_list.extend(s_i.tolist())
             node_col_ranges.append({
-                "node_id":        tuple(p["node_id"]),
-                "data_positions": [tuple(pos) for pos in p["data_positions"]],
+                "node_id":        p["node_id"],
                 "col_start":      col_offset,
                 "col_end":        col_offset + n_i,
             })
             col_offset += n_i
 
-        H_global_full = block_diag(*H_blocks)
+        H_global_full = sparse.block_diag(H_blocks, format="csr")
         s_global      = np.array(s_list, dtype=int)
         N_total       = H_global_full.shape[1]
 
-        # Single SVD on the full global matrix
-        U, sigma, Vt  = np.linalg.svd(H_global_full.astype(float), full_matrices=False)
+        # Single SVD on the full global matrix (cached per active node set)
+        active_ids = tuple(ncr["node_id"] for ncr in node_col_ranges)
+        k_global, selected_cols, retained = self._global_svd_columns(
+            H_global_full, (payloads[0]["error_type"], active_ids))
+
+        log.debug("[coordinator] Global SVD: k=%d/%d (%.2f%% energy retained)",
+                  k_global, N_total, 100 * retained)
+
+        H_global_reduced = H_global_full[:, selected_cols]
+
+        V_global = np.zeros((N_total, k_global), dtype=float)
+        for i, col in enumerate(selected_cols):
+            V_global[col, i] = 1.0
+
+        registry = []
+        for ncr in node_col_ranges:
+            rows = slice(ncr["col_start"], ncr["col_end"])
+            V_k  = V_global[rows, :]
+            registry.append({
+                "node_id":        ncr["node_id"],
+                "V_k":            V_k,
+                "col_start":      0,
+                "col_end":        k_global,
+            })
+
+        return H_global_reduced, s_global, registry
+
+    def _node_H(self, p: dict) -> sparse.csr_matrix:
+        """H of one node: sent once per error type, then reused."""
+        key = (p["node_id"], p["error_type"])
+        if "H_indices" in p:
+            self._node_H_cache[key] = sparse.csr_matrix(
+                (np.ones(len(p["H_indices"]), dtype=int), p["H_indices"], p["H_indptr"]),
+                shape=p["H_shape"],
+            )
+        elif key not in self._node_H_cache:
+            raise RuntimeError(f"No parity-check matrix received from node {p['node_id']} "
+                               f"for {p['error_type']}-errors")
+        return self._node_H_cache[key]
+
+    def _global_svd_columns(self, H_global_full: sparse.csr_matrix, key: tuple) -> tuple:
+        """
+        Energy-truncated SVD of the assembled matrix and the SVD-guided
+        greedy column selection.  The assembled matrix only depends on which
+        nodes are active, so the result is cached per (error_type, active ids).
+
+        Returns (k_global, selected_cols, retained energy fraction).
+        """
+        if key in self._svd_cache:
+            return self._svd_cache[key]
+
+        N_total       = H_global_full.shape[1]
+        U, sigma, Vt  = np.linalg.svd(H_global_full.toarray().astype(float),
+                                      full_matrices=False)
         total_energy  = np.sum(sigma ** 2)
 
         if total_energy > 1e-10:
@@ -124,11 +202,10 @@ class CoordinatorProgram(Program):
                                     self.ENERGY_THRESHOLD * total_energy) + 1),
                 N_total,
             )
+            retained   = cumulative[k_global - 1] / total_energy
         else:
             k_global = N_total
-
-        print(f"[coordinator] Global SVD: k={k_global}/{N_total} "
-              f"({cumulative[k_global-1] / total_energy:.2%} energy retained)")
+            retained = 1.0
 
         # SVD-guided greedy column selection
         selected_cols = []
@@ -143,78 +220,108 @@ class CoordinatorProgram(Program):
             if j not in selected_cols:
                 selected_cols.append(j)
 
-        H_global_reduced = H_global_full[:, selected_cols].astype(int)
-
-        V_global = np.zeros((N_total, k_global), dtype=float)
-        for i, col in enumerate(selected_cols):
-            V_global[col, i] = 1.0
-
-        registry = []
-        for ncr in node_col_ranges:
-            rows = slice(ncr["col_start"], ncr["col_end"])
-            V_k  = V_global[rows, :]
-            registry.append({
-                "node_id":        ncr["node_id"],
-                "V_k":            V_k,
-                "data_positions": ncr["data_positions"],
-                "col_start":      0,
-                "col_end":        k_global,
-            })
-
-        return H_global_reduced, s_global, registry
+        self._svd_cache[key] = (k_global, selected_cols, retained)
+        return self._svd_cache[key]
 
     # ------------------------------------------------------------------ #
-    #  Step 3 — OSD over GF(2)                                           #
+    #  Step 3 — OSD over GF(2), one independent block at a time            #
     # ------------------------------------------------------------------ #
+    def _decode_blocks(self, H_global: np.ndarray, s_global: np.ndarray,
+                       registry: list, error_type: str) -> np.ndarray:
+        """
+        Split H_global into the connected components of its Tanner graph
+        and run OSD on each one separately.  The selected columns still come
+        from disjoint node blocks, so the components are independent; blocks
+        with a zero syndrome decode to zero and are skipped.
+        """
+        e_global   = np.zeros(H_global.shape[1], dtype=int)
+        active_ids = tuple(reg["node_id"] for reg in registry)
+
+        jobs = []
+        for rows, cols in gf2.split_blocks(H_global):
+            if len(cols) == 0 or not np.any(s_global[rows]):
+                continue
+            jobs.append((rows, cols, (error_type, active_ids, tuple(cols.tolist()))))
+
+        if self.decode_workers > 1 and len(jobs) > 1:
+            self._prefetch_systematic_forms(H_global, jobs)
+
+        for rows, cols, cache_key in jobs:
+            e_global[cols] = self._osd_gf2(H_global[rows][:, cols],
+                                           s_global[rows], cache_key=cache_key)
+        return e_global
+
+    def _prefetch_systematic_forms(self, H_global: np.ndarray, jobs: list):
+        """Eliminate the blocks missing from the OSD cache on the worker pool."""
+        if self._decode_pool is None:
+            self._decode_pool = ProcessPoolExecutor(max_workers=self.decode_workers)
+        pending = {}
+        for rows, cols, cache_key in jobs:
+            H   = H_global[rows][:, cols].toarray() % 2
+            key = (cache_key, gf2.digest(H))
+            if key not in self._osd_cache and key not in pending:
+                pending[key] = self._decode_pool.submit(gf2.systematic_form, H, True)
+        for key, future in pending.items():
+            self._store_systematic_form(key, *future.result())
+
     def _osd_gf2(self, H_global: np.ndarray, s_global: np.ndarray,
-                 osd_order: int = 2) -> np.ndarray:
+                 osd_order: int = None, cache_key=None) -> np.ndarray:
+        if osd_order is None:
+            osd_order = self.osd_order
+        if sparse.issparse(H_global):
+            H_global = H_global.toarray()
         m, K_tot = H_global.shape
         H = H_global.astype(int) % 2
         s = s_global.astype(int) % 2
 
-        H_sys, s_sys   = H.copy(), s.copy()
-        pivot_cols, pivot_rows = [], []
-        row = 0
+        # Columns are used in their natural order here; the digest of H
+        # guards against a block whose entries changed under the same key
+        if cache_key is not None:
+            cache_key = (cache_key, gf2.digest(H))
+        H_sys, pivot_cols, non_pivot, T_packed = self._systematic_form(H, cache_key)
+        s_sys      = gf2.matvec(T_packed, s).astype(int)
+        test_cols  = osd.search_columns(non_pivot, osd_order, self.osd_method)
+        n_pivot    = len(pivot_cols)
+
+        # Hard-decision cost: every column weighs 1 (Hamming weight)
+        patterns   = osd.candidate_patterns(len(test_cols), self.osd_method,
+                                            self.osd_max_candidates, osd_order)
+        e_test, e_piv = osd.best_pattern(
+            H_sys[:n_pivot][:, test_cols], s_sys[:n_pivot],
+            np.ones(n_pivot), np.ones(len(test_cols)), patterns,
+        )
 
-        for col in range(K_tot):
-            if row >= m:
-                break
-            found = next((r for r in range(row, m) if H_sys[r, col] == 1), -1)
-            if found == -1:
-                continue
-            H_sys[[row, found]] = H_sys[[found, row]]
-            s_sys[[row, found]] = s_sys[[found, row]]
-            for r2 in range(m):
-                if r2 != row and H_sys[r2, col] == 1:
-                    H_sys[r2] = (H_sys[r2] + H_sys[row]) % 2
-                    s_sys[r2] = (s_sys[r2] + s_sys[row]) % 2
-            pivot_cols.append(col)
-            pivot_rows.append(row)
-            row += 1
-
-        non_pivot  = [c for c in range(K_tot) if c not in pivot_cols]
-        test_cols  = non_pivot[:osd_order]
-        n_test     = len(test_cols)
-
-        best_weight = K_tot + 1
-        best_e      = np.zeros(K_tot, dtype=int)
-
-        for pattern in range(2 ** n_test):
-            e = np.zeros(K_tot, dtype=int)
-            for b, tc in enumerate(test_cols):
-                e[tc] = (pattern >> b) & 1
-            for pc, pr in zip(pivot_cols, pivot_rows):
-                rhs = s_sys[pr]
-                for fc in non_pivot:
-                    rhs = (rhs + H_sys[pr, fc] * e[fc]) % 2
-                e[pc] = rhs
-            weight = int(np.sum(e))
-            if weight < best_weight:
-                best_weight = weight
-                best_e      = e.copy()
+        best_e = np.zeros(K_tot, dtype=int)
+        best_e[test_cols]  = e_test
+        best_e[pivot_cols] = e_piv
 
         return best_e
 
+    def _systematic_form(self, H: np.ndarray, cache_key=None):
+        """
+        Syndrome-independent part of the elimination: (H_sys, pivot_cols,
+        non_pivot, T_packed) with T @ H = H_sys.  Kept in an LRU cache so
+        that a repeated system only costs s_sys = T @ s per shot.
+        """
+        if cache_key is not None and cache_key in self._osd_cache:
+            self._osd_cache.move_to_end(cache_key)
+            return self._osd_cache[cache_key]
+
+        H_sys, pivot_cols, T = gf2.systematic_form(H, with_transform=True)
+        return self._store_systematic_form(cache_key, H_sys, pivot_cols, T)
+
+    def _store_systematic_form(self, cache_key, H_sys, pivot_cols, T):
+        is_pivot = np.zeros(H_sys.shape[1], dtype=bool)
+        is_pivot[pivot_cols] = True
+        entry = (H_sys.astype(int), pivot_cols.tolist(),
+                 np.flatnonzero(~is_pivot).tolist(), gf2.pack_rows(T))
+
+        if cache_key is not None:
+            self._osd_cache[cache_key] = entry
+            if len(self._osd_cache) > self.OSD_CACHE_SIZE:
+                self._osd_cache.popitem(last=False)
+        return entry
+
     # ------------------------------------------------------------------ #
     #  Step 4 — Back-project corrections                                 #
     # ------------------------------------------------------------------ #
@@ -225,11 +332,8 @@ class CoordinatorProgram(Program):
             V_k     = reg["V_k"]
             e_local = (
                 np.round(np.abs(np.array(V_k, dtype=float) @ e_block.astype(float))) % 2
-            ).astype(int)
-            corrections[reg["node_id"]] = [
-                list(reg["data_positions"][j])
-                for j in range(len(e_local)) if e_local[j] == 1
-            ]
+            ).astype(bool)
+            corrections[reg["node_id"]] = e_local  # mask over the node's data qubits
         return corrections
 
     # ------------------------------------------------------------------ #
@@ -244,31 +348,20 @@ class CoordinatorProgram(Program):
                              or partial BP corrections stored in active payloads)
 
         This ensures that nodes whose syndromes were fully resolved by BP
-        still receive the right correction list.
+        still receive the right correction mask.
         """
-        # Build a map: node_id → bp_corrections from ALL payloads
-        bp_map: dict[tuple, list] = {}
-        for p in payloads:
-            node_id   = tuple(p["node_id"])
-            bp_corrs  = p.get("bp_corrections", [])
-            if bp_corrs:
-                existing = bp_map.get(node_id, [])
-                bp_map[node_id] = existing + bp_corrs
+        # Build a map: node_id → bp_corrections mask from ALL payloads
+        bp_map: dict[tuple, np.ndarray] = {p["node_id"]: p["bp_corrections"] for p in payloads}
 
         for name in self.node_names:
             parts   = name.replace("node_", "").split("_")
             node_id = (int(parts[0]), int(parts[1]))
 
-            # Start with OSD corrections (may be empty)
-            osd_corr = corrections_per_node.get(node_id, [])
-            bp_corr  = bp_map.get(node_id, [])
-
-            # Merge: XOR the two correction sets (corrections cancel if duplicated)
-            # Convert to sets of tuples for XOR merge
-            osd_set = set(tuple(c) for c in osd_corr)
-            bp_set  = set(tuple(c) for c in bp_corr)
-            merged  = list(osd_set.symmetric_difference(bp_set))
+            # Merge: XOR the two correction masks (corrections cancel if duplicated)
+            merged = bp_map[node_id].copy()
+            if node_id in corrections_per_node:
+                merged ^= corrections_per_node[node_id]
 
-            context.csockets[name].send(json.dumps(merged))
+            context.csockets[name].send(wire.encode({"corrections": merged}))
 
         yield from context.connection.flush()
\ No newline at end of file
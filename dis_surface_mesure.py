@@ -1,19 +1,30 @@
 import json
+import logging
 import random
 import time as t
 
 import numpy as np
 from netqasm.sdk.qubit import Qubit
+from scipy import sparse
 from squidasm.sim.stack.program import Program, ProgramContext, ProgramMeta
 
+import wire
+from bp_decoder import MinSumDecoder
+from qec_logging import get_logger
+from surface_code import XQ, ZQ
+import syndrome_stream
+from syndrome_stream import DetectionStream
+
+log = get_logger("node")
+
 
 class ClusterNodeProgram(Program):
     ENERGY_THRESHOLD = 0.98  # fraction of total energy to retain in SVD dimensionality reduction (0 < threshold <= 1)
-    NUM_ROUNDS = (
-        2  # number of rounds of stabilizer measurements (for spacetime decoding)
-    )
+    NUM_ROUNDS = syndrome_stream.NUM_ROUNDS  # default number of stabilizer rounds (the first is the noiseless reference)
+    WINDOW = syndrome_stream.WINDOW  # default number of detection layers streamed to the coordinator per message
     BP_ALPHA = 0.75  # Min-Sum scaling factor
     BP_MAX_ITER = 20  # max BP iterations
+    BATCHED_TELEGATE = True  # all borders at once, one EPR batch / outcome message per border
 
     def __init__(
         self,
@@ -22,8 +33,19 @@ class ClusterNodeProgram(Program):
         error,
         prob,
         coordinator_name: str = "coordinator",
+        batched_telegate: bool = None,
+        num_rounds: int = None,
+        window: int = None,
     ):
+        self.num_rounds = self.NUM_ROUNDS if num_rounds is None else num_rounds
+        if self.num_rounds < 2:
+            raise ValueError(f"num_rounds must be >= 2 (got {self.num_rounds}): "
+                             "the first round is the reference of the detection events")
+        self.window = self.WINDOW if window is None else window
+        if self.window < 1:
+            raise ValueError(f"window must be >= 1 (got {self.window})")
         self.node_coords = node_coords
+        self.batched_telegate = self.BATCHED_TELEGATE if batched_telegate is None else batched_telegate
         self.layout_manager = layout_manager
         self.coordinator_name = coordinator_name
         self.error = error
@@ -42,6 +64,12 @@ class ClusterNodeProgram(Program):
         if c < N - 1:
             self.neighbors.append(f"node_{r}_{c + 1}")
 
+        self._bp_decoders = {}  # Min-Sum decoders keyed by parity-check matrix
+        self._local_system = None  # layout-only H matrices, built on first use
+        self._syndrome_slots = None  # NodeGrid.anc_slot of the rows of H_Z / H_X
+        self._svd_cache = {}  # (error_type, energy_threshold) → truncated SVD factors
+        self._svd_sent = set()  # factor keys already delivered to the coordinator
+
     @property
     def meta(self) -> ProgramMeta:
         B = self.layout_manager.block_size
@@ -50,7 +78,12 @@ class ClusterNodeProgram(Program):
         actual_cols = len(subgrid_data[0]) if subgrid_data else B
         # print(f"{self.node_coords} subgrid size: {actual_rows} rows x {actual_cols} cols")
         actual_qubits = actual_rows * actual_cols
-        border_eprs = max(actual_rows, actual_cols)  # max EPR qubits on one border
+        r, c = self.node_coords
+        N = self.layout_manager.nodes_per_side
+        # EPR qubits: all borders are served at once (one per border position at most)
+        border_eprs = (
+            actual_rows * ((c > 0) + (c < N - 1)) + actual_cols * ((r > 0) + (r < N - 1))
+        )
         return ProgramMeta(
             name=f"node_{self.node_coords[0]}_{self.node_coords[1]}",
             csockets=self.neighbors + [self.coordinator_name],
@@ -94,14 +127,17 @@ class ClusterNodeProgram(Program):
             self.local_qubits.append(row_q)
             self.qubit_roles.append(row_r)
 
-        # ── 2. Two rounds of stabilizer measurements ──────────────────────
-
-        all_round_syndromes = []
-
-        for round_idx in range(self.NUM_ROUNDS):
-            # Apply noise only before the first round, so that the second round's syndrome reflects the effect of noise.
-            if round_idx == 1:
-                # Inject noise before the second measurement round
+        # ── 2. num_rounds rounds of stabilizer measurements ───────────────
+        # Every round's syndrome is bit-packed and XORed against the previous
+        # one as soon as it is measured (syndrome_stream.py); each full window
+        # of detection layers goes to the coordinator at once, so memory
+        # stays constant in the number of rounds.
+        grid = self.layout_manager.get_node_grid(*self.node_coords)
+        stream = DetectionStream(len(grid.anc_idx), self.window)
+
+        for round_idx in range(self.num_rounds):
+            # The first round is the noiseless reference; noise acts before every later round
+            if self._noisy_round(round_idx):
                 for error in self.errors:
                     match error:
                         case "identity":
@@ -113,10 +149,8 @@ class ClusterNodeProgram(Program):
                                     ):
                                         self.local_qubits[r][c].X()
                                         self.injected_X_errors.add((r, c))
-                            print(
-                                f"[{self.node_coords}] Noise: "
-                                f"{len(self.injected_X_errors) if self.injected_X_errors else 'none'}"
-                            )
+                            log.debug("[%s] Noise: %s", self.node_coords,
+                                      len(self.injected_X_errors) or "none")
                         case "hadamard":
                             for r in range(self.B_rows):
                                 for c in range(self.B_cols):
@@ -128,29 +162,30 @@ class ClusterNodeProgram(Program):
                                         self._noisy_H(self.local_qubits[r][c], r, c)
 
                         case "initialization":
-                            print(
-                                f"[{self.node_coords}] initialization error: simulating by flipping all ancilla measurements in round 2."
+                            log.debug(
+                                "[%s] initialization error: simulating by flipping ancilla preparations in round %d.",
+                                self.node_coords, round_idx + 1,
                             )
 
                         case "readout":
-                            print(
-                                f"[{self.node_coords}] readout error: simulating by flipping all ancilla measurements in round 2 with probability {self.NOISE_PROBABILITY}."
+                            log.debug(
+                                "[%s] readout error: simulating by flipping ancilla measurements in round %d with probability %s.",
+                                self.node_coords, round_idx + 1, self.NOISE_PROBABILITY,
                             )
 
                         case "cnot":
-                            print(
-                                f"[{self.node_coords}] CNOT error: simulating by applying a random X error to the target of each CNOT with probability {self.NOISE_PROBABILITY}."
+                            log.debug(
+                                "[%s] CNOT error: simulating by applying a random X error to the target of each CNOT with probability %s.",
+                                self.node_coords, self.NOISE_PROBABILITY,
                             )
                         case "none":
-                            print(
-                                f"[{self.node_coords}] Ideal simulation: no noise applied."
-                            )
+                            log.debug("[%s] Ideal simulation: no noise applied.", self.node_coords)
                         case _:
-                            print(
-                                f"[{self.node_coords}] WARNING: Unknown error type '{self.error}'. Skipping noise."
+                            log.warning(
+                                "[%s] Unknown error type '%s'. Skipping noise.", self.node_coords, self.error
                             )
 
-            round_syndrome = {}
+            round_syndrome = np.zeros(len(grid.anc_idx), dtype=np.uint8)
 
             # ============================================================== #
             #  Z sub-round — Z stabilizers (data = CONTROL, ancilla |0⟩)      #
@@ -169,28 +204,19 @@ class ClusterNodeProgram(Program):
                 context, role="xQ", round_idx=round_idx, round_syndrome=round_syndrome
             )
 
-            all_round_syndromes.append(round_syndrome)
-            active = {k: v for k, v in round_syndrome.items() if v == 1}
-            print(
-                f"[{self.node_coords}] Round {round_idx + 1} syndrome: "
-                f"{active if active else 'clean'}"
-            )
+            self._stream_window(context, stream.push(round_syndrome), round_idx)
+        self._stream_window(context, stream.flush(), self.num_rounds - 1)
 
-        # ── 3. Spacetime decoding: XOR between the two rounds ──────────────
-        s1 = all_round_syndromes[0]
-        s2 = all_round_syndromes[1]
-        all_pos = set(s1.keys()) | set(s2.keys())
-        self.ancilla_measurements = {
-            pos: s1.get(pos, 0) ^ s2.get(pos, 0) for pos in all_pos
-        }
-        # self.ancilla_measurements = s1  # For NUM_ROUNDS=1, just use the single round syndrome without XOR
+        # ── 3. Local pre-filter input: running XOR of the detection events ─
+        # One uint8 per ancilla (NodeGrid.anc_idx order); the local BP / SVD
+        # stage works on it, the coordinator also has the streamed layers.
+        self.detection_events = stream.detection_events()
 
-        # Print the final spacetime syndrome after XOR. Active syndromes indicate potential error locations that the coordinator will use for decoding.
-        active_final = {k: v for k, v in self.ancilla_measurements.items() if v == 1}
-        print(
-            f"[{self.node_coords}] Spacetime syndrome (XOR): "
-            f"{active_final if active_final else 'clean'}"
-        )
+        if log.isEnabledFor(logging.DEBUG):
+            r_loc, c_loc = np.divmod(grid.anc_idx[self.detection_events == 1], grid.shape[1])
+            active_final = list(zip(r_loc.tolist(), c_loc.tolist()))
+            log.debug("[%s] Spacetime syndrome (XOR): %s", self.node_coords,
+                      active_final if active_final else "clean")
 
         # ── 4. Build SVD payloads, exchange with coordinator, apply corrections ──
         t_start = t.time()
@@ -203,20 +229,16 @@ class ClusterNodeProgram(Program):
         self._apply_corrections(corr_Z, gate="Z")
         yield from conn.flush()  # materialise correction gates before measurement
 
-        if self.applied_X_corrections and self.applied_Z_corrections:
-            print(
-                f"[{self.node_coords}] Corrections X: {sorted(self.applied_X_corrections)} Corrections Z: {sorted(self.applied_Z_corrections)}"
-            )
-        elif self.applied_Z_corrections:
-            print(
-                f"[{self.node_coords}] Corrections Z: {sorted(self.applied_Z_corrections)}"
-            )
-        elif self.applied_X_corrections:
-            print(
-                f"[{self.node_coords}] Corrections X: {sorted(self.applied_X_corrections)}"
-            )
-        else:
-            print(f"[{self.node_coords}] Corrections: none")
+        if log.isEnabledFor(logging.DEBUG):
+            if self.applied_X_corrections and self.applied_Z_corrections:
+                log.debug("[%s] Corrections X: %s Corrections Z: %s", self.node_coords,
+                          sorted(self.applied_X_corrections), sorted(self.applied_Z_corrections))
+            elif self.applied_Z_corrections:
+                log.debug("[%s] Corrections Z: %s", self.node_coords, sorted(self.applied_Z_corrections))
+            elif self.applied_X_corrections:
+                log.debug("[%s] Corrections X: %s", self.node_coords, sorted(self.applied_X_corrections))
+            else:
+                log.debug("[%s] Corrections: none", self.node_coords)
 
         # ── 5. Logical-Z parity ───────────────────────────────────────────
         yield from self._send_logical_parity(context)
@@ -232,6 +254,15 @@ class ClusterNodeProgram(Program):
         context.csockets[self.coordinator_name].send(json.dumps(decoding_time))
         yield from conn.flush()
 
+    # Send a completed window of packed detection layers (None: window still filling)
+    def _stream_window(self, context, layers, round_idx):
+        if layers is None:
+            return
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("[%s] Rounds ..%d: %d detection events in a window of %d layers",
+                      self.node_coords, round_idx + 1, DetectionStream.weight(layers), len(layers))
+        context.csockets[self.coordinator_name].send(wire.encode({"events": layers}))
+
     # ------------------------------------------------------------------ #
     #  One stabilizer sub-round (all 'zQ' OR all 'xQ' checks)              #
     # ------------------------------------------------------------------ #
@@ -242,6 +273,7 @@ class ClusterNodeProgram(Program):
         X- and Z-check circuits commute on every shared data qubit, so the syndrome is
         repeatable from round to round (no schedule-induced cross-talk)."""
         conn = context.connection
+        anc_slot = self.layout_manager.get_node_grid(*self.node_coords).anc_slot
 
         # a) Allocate fresh ancillas for this type
         for r in range(self.B_rows):
@@ -253,13 +285,12 @@ class ClusterNodeProgram(Program):
                 if (
                     self.error in ("initialization", "all")
                     and random.random() < self.NOISE_PROBABILITY
-                    and round_idx == 1
+                    and self._noisy_round(round_idx)
                 ):
                     # zQ: |0⟩→|1⟩ ; xQ: |0⟩→|1⟩ which becomes |−⟩ after the H below.
                     ancilla.X()
-                    print(
-                        f"[{self.node_coords}] Noise: init error on {role} ancilla at ({r}, {c})"
-                    )
+                    log.debug("[%s] Noise: init error on %s ancilla at (%d, %d)",
+                              self.node_coords, role, r, c)
                 if role == "xQ":
                     ancilla.H()  # prepare |+⟩ for the X-parity measurement
                 self.local_qubits[r][c] = ancilla
@@ -291,7 +322,8 @@ class ClusterNodeProgram(Program):
             context, round_idx=round_idx, only_stab=role
         )
 
-        # d) Measure the ancillas of this type
+        # d) Measure the ancillas of this type: queue every measurement, flush once
+        measured = []
         for r in range(self.B_rows):
             for c in range(self.B_cols):
                 if self.qubit_roles[r][c] != role:
@@ -299,16 +331,19 @@ class ClusterNodeProgram(Program):
                 ancilla = self.local_qubits[r][c]
                 if role == "xQ":
                     ancilla.H()  # rotate to the X basis before measuring
-                m = ancilla.measure()
-                yield from conn.flush()
-                if (
-                    self.error in ("readout", "all")
-                    and random.random() < self.NOISE_PROBABILITY
-                    and round_idx == 1
-                ):
-                    m = 1 - m
-                    print(f"[{self.node_coords}] Error flip at: ({r}, {c})")
-                round_syndrome[(r, c)] = int(m)
+                measured.append(((r, c), ancilla.measure()))
+        yield from conn.flush()
+
+        for (r, c), future in measured:
+            m = int(future)
+            if (
+                self.error in ("readout", "all")
+                and random.random() < self.NOISE_PROBABILITY
+                and self._noisy_round(round_idx)
+            ):
+                m = 1 - m
+                log.debug("[%s] Error flip at: (%d, %d)", self.node_coords, r, c)
+            round_syndrome[anc_slot[r * self.B_cols + c]] = m
 
     # ------------------------------------------------------------------ #
     #  TeleGate border protocol                                            #
@@ -320,6 +355,10 @@ class ClusterNodeProgram(Program):
                 set(),
                 set(),
             )  # No neighbors → no TeleGate interactions → no Z or X gates applied, no teleported flips
+        if self.batched_telegate:
+            return (yield from self._run_borders_concurrent(
+                context, self._border_specs(), round_idx=round_idx, only_stab=only_stab
+            ))
         r_node, c_node = self.node_coords
         N = self.layout_manager.nodes_per_side
         B = self.layout_manager.block_size
@@ -437,44 +476,9 @@ class ClusterNodeProgram(Program):
         x_applied = set()
         tele_flip = set()
 
-        subgrid_data = self.layout_manager.get_subgrid_for_node(*self.node_coords)
-
-        for idx in range(border_len):
-            r_loc, c_loc = (idx, local_fixed) if axis == "col" else (local_fixed, idx)
-            # print(f"[{self.node_coords}] Border idx {idx} at local ({r_loc}, {c_loc})")
-            r_glob, c_glob = subgrid_data[r_loc][c_loc]["global_pos"]
-            local_role = self.qubit_roles[r_loc][c_loc]
-
-            # Compute the global position of the remote neighbour across the boundary
-            if axis == "col":
-                dc = 1 if local_fixed != 0 else -1
-                nr_glob, nc_glob = r_glob, c_glob + dc
-            else:
-                dr = 1 if local_fixed != 0 else -1
-                nr_glob, nc_glob = r_glob + dr, c_glob
-
-            remote_role = self.layout_manager.get_qubit_role(nr_glob, nc_glob)
-
-            # --- Determine per-qubit interaction type ---
-            # LOCAL is ancilla, REMOTE is data → this node handles ancilla side
-            if local_role in ("xQ", "zQ") and remote_role == "pQ":
-                local_is_ancilla = True
-                stab_type = local_role  # "xQ" or "zQ"
-            # LOCAL is data, REMOTE is ancilla → this node handles data side
-            elif local_role == "pQ" and remote_role in ("xQ", "zQ"):
-                local_is_ancilla = False
-                stab_type = remote_role
-            else:
-                # Neither useful pair (pQ-pQ or anc-anc) — both sides skip.
-                # Both nodes independently detect this, so no message exchange needed.
-                continue
-
-            # Restrict this pass to one stabilizer type. Both nodes compute the same
-            # stab_type for a given border position, so they skip symmetrically (no
-            # message exchange for skipped positions) and stay in lock-step.
-            if only_stab is not None and stab_type != only_stab:
-                continue
-
+        for r_loc, c_loc, local_is_ancilla, stab_type in self._border_positions(
+            axis, local_fixed, border_len, only_stab
+        ):
             # --- Ancilla side ---
             if local_is_ancilla:
                 ancilla = self.local_qubits[r_loc][c_loc]
@@ -554,41 +558,202 @@ class ClusterNodeProgram(Program):
 
         return z_applied, x_applied, tele_flip
 
-    def _bp_local(self, H: np.ndarray, s: np.ndarray) -> np.ndarray:
+    # Border positions of one pass, in border order, as seen from this node
+    def _border_positions(self, axis: str, local_fixed: int, border_len: int, only_stab=None) -> list:
+        """[(r_loc, c_loc, local_is_ancilla, stab_type)] for every position of
+        the border that takes part in a TeleGate. Both nodes of a border derive
+        the same list (mirrored) from the global layout."""
+        subgrid_data = self.layout_manager.get_subgrid_for_node(*self.node_coords)
+        positions = []
+
+        for idx in range(border_len):
+            r_loc, c_loc = (idx, local_fixed) if axis == "col" else (local_fixed, idx)
+            r_glob, c_glob = subgrid_data[r_loc][c_loc]["global_pos"]
+            local_role = self.qubit_roles[r_loc][c_loc]
+
+            # Compute the global position of the remote neighbour across the boundary
+            if axis == "col":
+                dc = 1 if local_fixed != 0 else -1
+                nr_glob, nc_glob = r_glob, c_glob + dc
+            else:
+                dr = 1 if local_fixed != 0 else -1
+                nr_glob, nc_glob = r_glob + dr, c_glob
+
+            remote_role = self.layout_manager.get_qubit_role(nr_glob, nc_glob)
+
+            # --- Determine per-qubit interaction type ---
+            # LOCAL is ancilla, REMOTE is data → this node handles ancilla side
+            if local_role in ("xQ", "zQ") and remote_role == "pQ":
+                local_is_ancilla = True
+                stab_type = local_role  # "xQ" or "zQ"
+            # LOCAL is data, REMOTE is ancilla → this node handles data side
+            elif local_role == "pQ" and remote_role in ("xQ", "zQ"):
+                local_is_ancilla = False
+                stab_type = remote_role
+            else:
+                # Neither useful pair (pQ-pQ or anc-anc) — both sides skip.
+                # Both nodes independently detect this, so no message exchange needed.
+                continue
+
+            # Restrict this pass to one stabilizer type. Both nodes compute the same
+            # stab_type for a given border position, so they skip symmetrically (no
+            # message exchange for skipped positions) and stay in lock-step.
+            if only_stab is not None and stab_type != only_stab:
+                continue
+            positions.append((r_loc, c_loc, local_is_ancilla, stab_type))
+        return positions
+
+    # Every border of this node, in the global order used to schedule them
+    def _border_specs(self) -> list:
+        """One dict per neighbour with the _run_border_direction arguments.
+        Borders are sorted by the (lower node, upper node) pair they join, a
+        total order both endpoints agree on: processing EPR requests in this
+        order on every node keeps the blocking requests free of cycles."""
+        r_node, c_node = self.node_coords
+        N = self.layout_manager.nodes_per_side
+        specs = []
+        for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            nr, nc = r_node + dr, c_node + dc
+            if not (0 <= nr < N and 0 <= nc < N):
+                continue
+            axis = "col" if dc else "row"
+            forward = dr + dc > 0  # neighbour to the right / below: this node is the first one
+            specs.append({
+                "neighbor": f"node_{nr}_{nc}",
+                "is_ancilla_side": forward,
+                "axis": axis,
+                "local_fixed": ((self.B_cols if axis == "col" else self.B_rows) - 1) if forward else 0,
+                "border_len": self.B_rows if axis == "col" else self.B_cols,
+                "edge": min((r_node, c_node), (nr, nc)) + max((r_node, c_node), (nr, nc)),
+            })
+        return sorted(specs, key=lambda spec: spec["edge"])
+
+    def _run_borders_concurrent(self, context, borders: list, round_idx=None, only_stab=None):
+        """
+        TeleGate on all borders at once: the gates of _run_border_direction,
+        with one flush per phase for every border together, one EPR request
+        per border and creating side and one outcome message per phase,
+        border and direction.
+
+        Per position one side measures first and the other needs its outcome:
+          FIRST  (xQ: ancilla side, zQ: data side):
+            CNOT(local→e), meas e in Z, send m1     ... later recv m2, Z^m2 on local
+          SECOND (xQ: data side, zQ: ancilla side):
+            recv m1, X^m1 on e, CNOT(e→local), meas e in X, send m2
+        which is exactly the per-qubit protocol of both stabilizer types.
+
+        Phases, each over all borders:
+          1. EPR pairs: per border in _border_specs order, the first node
+             (is_ancilla_side, left / top) creates its pairs, then the other.
+          2. first movers' gates and measurements, one message per border.
+          3. receive m1 from every neighbour, second movers, one message per border.
+          4. receive m2 from every neighbour, byproduct Z on the local qubits.
+        Every node sends a phase's messages before receiving any, so the round
+        lasts as long as the slowest border, not the sum of them.  Every
+        position's role follows from the global layout, so both nodes know how
+        many pairs and outcome bits to expect; stab_type is never sent.
+        """
+        conn = context.connection
+        states = []
+        for border in borders:
+            positions = self._border_positions(
+                border["axis"], border["local_fixed"], border["border_len"], only_stab
+            )
+            if not positions:
+                continue
+            states.append({
+                "csock": context.csockets[border["neighbor"]],
+                "epr_sock": context.epr_sockets[border["neighbor"]],
+                "is_ancilla_side": border["is_ancilla_side"],
+                "positions": positions,
+                "first": [p for p in positions if p[2] == (p[3] == "xQ")],
+                "second": [p for p in positions if p[2] != (p[3] == "xQ")],
+                "epr": {},
+            })
+        if not states:
+            return set(), set(), set()
+
+        # 1. EPR pairs (local ancilla side creates the pair)
+        for st in states:
+            created = [p for p in st["positions"] if p[2]]
+            received = [p for p in st["positions"] if not p[2]]
+            batches = [(created, True), (received, False)]
+            if not st["is_ancilla_side"]:
+                batches.reverse()
+            for batch, create in batches:
+                if not batch:
+                    continue
+                if create:
+                    halves = st["epr_sock"].create_keep(number=len(batch))
+                else:
+                    halves = st["epr_sock"].recv_keep(number=len(batch))
+                for (r_loc, c_loc, _, _), e in zip(batch, halves):
+                    st["epr"][(r_loc, c_loc)] = e
+        yield from conn.flush()
+
+        # 2. First movers: CNOT(local→e), measure e, send all outcomes of the border
+        for st in states:
+            st["m1"] = []
+            for r_loc, c_loc, _, _ in st["first"]:
+                e = st["epr"][(r_loc, c_loc)]
+                self._noise_cnot(self.local_qubits[r_loc][c_loc], e, (r_loc, c_loc), None, round_idx)
+                st["m1"].append(e.measure())
+        yield from conn.flush()
+        for st in states:
+            if st["first"]:
+                st["csock"].send("".join(str(int(m)) for m in st["m1"]))
+
+        # 3. Second movers: recv the peer's outcomes, X^m1, CNOT(e→local), measure e in X
+        for st in states:
+            st["m2"] = []
+            if not st["second"]:
+                continue
+            m1_bits = yield from st["csock"].recv()
+            for (r_loc, c_loc, _, _), m1 in zip(st["second"], m1_bits):
+                e = st["epr"][(r_loc, c_loc)]
+                if m1 == "1":
+                    e.X()
+                self._noise_cnot(e, self.local_qubits[r_loc][c_loc], None, (r_loc, c_loc), round_idx)
+                e.H()
+                st["m2"].append(e.measure())
+        yield from conn.flush()
+        for st in states:
+            if st["second"]:
+                st["csock"].send("".join(str(int(m)) for m in st["m2"]))
+
+        # 4. First movers: byproduct Z on the local qubit (the teleported CNOT is then
+        #    exact, so nothing is tracked in z_applied / tele_flip)
+        for st in states:
+            if not st["first"]:
+                continue
+            m2_bits = yield from st["csock"].recv()
+            for (r_loc, c_loc, _, _), m2 in zip(st["first"], m2_bits):
+                if m2 == "1":
+                    self.local_qubits[r_loc][c_loc].Z()
+
+        return set(), set(), set()
+
+    def _bp_local(self, H: sparse.csr_matrix, s: np.ndarray) -> np.ndarray:
         """Scaled Min-Sum BP on GF(2). Returns best hard-decision error estimate."""
-        m, n = H.shape
         p_safe = np.clip(self.NOISE_PROBABILITY, 1e-10, 1 - 1e-10)
-        ch_llr = np.full(n, np.log((1.0 - p_safe) / p_safe))
-        msg_v2c = np.zeros((m, n))
-        msg_c2v = np.zeros((m, n))
-        e_hat = np.zeros(n, dtype=int)
-        for _ in range(self.BP_MAX_ITER):
-            for i in range(m):
-                neighbors = np.where(H[i] == 1)[0]
-                for j in neighbors:
-                    others = neighbors[neighbors != j]
-                    if len(others) == 0:
-                        msg_c2v[i, j] = 0.0
-                        continue
-                    sign = 1
-                    for k in others:
-                        sign *= -1 if msg_v2c[i, k] < 0 else 1
-                    if s[i] == 1:
-                        sign *= -1
-                    magnitude = self.BP_ALPHA * float(
-                        np.min(np.abs(msg_v2c[i, others]))
-                    )
-                    msg_c2v[i, j] = sign * magnitude
-            for j in range(n):
-                neighbors = np.where(H[:, j] == 1)[0]
-                total = ch_llr[j] + float(np.sum(msg_c2v[neighbors, j]))
-                for i in neighbors:
-                    msg_v2c[i, j] = total - msg_c2v[i, j]
-            llr_total = ch_llr + msg_c2v.sum(axis=0)
-            e_hat = (llr_total < 0).astype(int)
-            if np.all((H @ e_hat) % 2 == s):
-                return e_hat
-        return e_hat
+        ch_llr = np.log((1.0 - p_safe) / p_safe)
+        return self._bp_decoder(H).decode(s, ch_llr)
+
+    def _bp_local_batch(self, H: sparse.csr_matrix, S: np.ndarray) -> tuple:
+        """Batched _bp_local over an (n_shots, m) syndrome matrix.
+        Returns (E_hat, converged) with one row / flag per shot."""
+        p_safe = np.clip(self.NOISE_PROBABILITY, 1e-10, 1 - 1e-10)
+        ch_llr = np.log((1.0 - p_safe) / p_safe)
+        return self._bp_decoder(H).decode_batch(S, ch_llr)
+
+    def _bp_decoder(self, H: sparse.csr_matrix) -> MinSumDecoder:
+        # The Tanner graph only depends on H, so build its edge arrays once
+        key = (H.shape, H.indptr.tobytes(), H.indices.tobytes())
+        if key not in self._bp_decoders:
+            self._bp_decoders[key] = MinSumDecoder(
+                H, alpha=self.BP_ALPHA, max_iter=self.BP_MAX_ITER
+            )
+        return self._bp_decoders[key]
 
     # ------------------------------------------------------------------ #
     #  SVD payload                                                         #
@@ -604,168 +769,169 @@ class ClusterNodeProgram(Program):
         stack them; the coordinator's GF(2) OSD handles the joint system
         correctly because xQ and zQ never share a column after elimination.
         """
-        B = self.layout_manager.block_size
-        r_node, c_node = self.node_coords
-        d_pos = []  # positions of data qubits (pQ)
-        zq_pos = []  # positions of zQ ancillas (detect X errors)
-        xq_pos = []  # positions of xQ ancillas (detect Z errors)
-
-        # use actual subgrid dimensions so border nodes include all their qubits.
-        # The global position of qubit (r,c) in this node is derived from subgrid_data
-        # to avoid the r_node*B offset being wrong for non-square partitions.
-        subgrid_data = self.layout_manager.get_subgrid_for_node(*self.node_coords)
-        actual_rows = len(subgrid_data)
-        actual_cols = len(subgrid_data[0]) if subgrid_data else B
-
-        for r in range(actual_rows):
-            for c in range(actual_cols):
-                gr, gc = subgrid_data[r][c]["global_pos"]  # use stored global position
-                role = self.qubit_roles[r][c]
-                if role == "pQ":
-                    d_pos.append((gr, gc))
-                elif role == "zQ":
-                    zq_pos.append((gr, gc))
-                elif role == "xQ":
-                    xq_pos.append((gr, gc))
-
-        n = len(d_pos)
-
-        def _make_H_and_s(anc_pos):
-            # Build (H_block, s_block) for a list of ancilla positions.
-            H_block = np.zeros((len(anc_pos), n), dtype=int)
-            for i, (ar, ac) in enumerate(anc_pos):
-                for j, (dr, dc) in enumerate(d_pos):
-                    if abs(ar - dr) + abs(ac - dc) == 1:
-                        H_block[i, j] = (
-                            1  # This ancilla is connected to this data qubit → 1 in H.
-                        )
-
-            # Convert each ancilla global position back to local using the actual subgrid.
-            def _global_to_local(gr, gc):
-                for ri in range(actual_rows):
-                    for ci in range(actual_cols):
-                        if subgrid_data[ri][ci]["global_pos"] == (gr, gc):
-                            return (ri, ci)
-                return None
-
-            s_block = np.array(
-                [
-                    self.ancilla_measurements.get(_global_to_local(p[0], p[1]), 0)
-                    for p in anc_pos
-                ],
-                dtype=int,
+        H_Z, anc_Z, H_X, anc_X, d_pos = self._local_structure()
+
+        # Per shot only the syndrome is gathered, in the row order of H
+        if self._syndrome_slots is None:
+            grid = self.layout_manager.get_node_grid(*self.node_coords)
+            self._syndrome_slots = tuple(
+                grid.anc_slot[[r * grid.shape[1] + c for r, c in anc_local]].astype(int)
+                for anc_local in (anc_Z, anc_X)
             )
+        slots_Z, slots_X = self._syndrome_slots
+        s_Z = self.detection_events[slots_Z].astype(int)  # Z stabilizers → X error detection
+        s_X = self.detection_events[slots_X].astype(int)  # X stabilizers → Z error detection
+        return H_Z, s_Z, H_X, s_X, d_pos
 
-            # remove rows with all zeros (border ancillas whose neighbors
-            # are entirely on another node's subgrid). These rows have no
-            # data-qubit column to assign an error to, so they only add
-            # inconsistent constraints to the OSD solver.
-            nonzero_rows = H_block.sum(axis=1) > 0
-            H_block = H_block[nonzero_rows]
-            s_block = s_block[nonzero_rows]
+    def _local_structure(self) -> tuple:
+        """Layout-only part of the local system, built once per node.
 
-            return H_block, s_block
+        Returns (H_Z, anc_Z, H_X, anc_X, d_pos): the CSR parity-check
+        matrices, the local (r, c) of the ancilla behind each of their rows,
+        and the global positions of the data qubits (one per column).
+        """
+        if self._local_system is not None:
+            return self._local_system
+
+        # Role grid and stabilizer neighbour tables are precomputed by the layout
+        grid = self.layout_manager.get_node_grid(*self.node_coords)
+        d_pos = list(
+            zip(
+                grid.global_rows.ravel()[grid.data_idx].tolist(),
+                grid.global_cols.ravel()[grid.data_idx].tolist(),
+            )
+        )
 
-        H_Z, s_Z = _make_H_and_s(zq_pos)  # Z stabilizers → X error detection
-        H_X, s_X = _make_H_and_s(xq_pos)  # X stabilizers → Z error detection
-        return H_Z, s_Z, H_X, s_X, d_pos
+        # Sparse CSR from the layout's neighbour tables: at most four ones per row
+        H_Z, anc_Z = grid.check_matrix(ZQ)
+        H_X, anc_X = grid.check_matrix(XQ)
+        self._local_system = (H_Z, anc_Z, H_X, anc_X, d_pos)
+        return self._local_system
 
     def _build_svd_payloads(self, energy_threshold=None):
         if energy_threshold is None:
             energy_threshold = self.ENERGY_THRESHOLD
 
-        H_Z, s_Z, H_X, s_X, data_pos = self._build_local_system()
+        H_Z, s_Z, H_X, s_X, _ = self._build_local_system()
+        return (self._sector_payload(H_Z, s_Z, "X", energy_threshold),
+                self._sector_payload(H_X, s_X, "Z", energy_threshold))
 
-        def _make_payload(H, s, error_type):
-            if H.size == 0 or not np.any(s):
-                return {
-                    "active": False,
-                    "node_id": list(self.node_coords),
-                    "error_type": error_type,
-                    "data_positions": [list(p) for p in data_pos],
-                    "bp_corrections": [],
-                }
+    def _sector_payload(self, H, s, error_type: str, energy_threshold: float, e_bp=None) -> dict:
+        """Payload of one sector.  e_bp: the BP estimate for s if already
+        decoded (the Pauli-frame engine runs BP batched over shots)."""
+        n_data = H.shape[1]
+        if H.nnz == 0 or not np.any(s):
+            return {
+                "active": False,
+                "node_id": tuple(self.node_coords),
+                "error_type": error_type,
+                "n_data": n_data,
+                "syndrome_weight": int(np.count_nonzero(s)),
+                "bp_corrections": np.zeros(n_data, dtype=bool),
+            }
 
-            # 1. Run local BP
+        # 1. Run local BP
+        if e_bp is None:
             e_bp = self._bp_local(H, s)
-            s_residual = (s + H @ e_bp) % 2
-            bp_corrections = [
-                list(data_pos[j]) for j in range(len(e_bp)) if e_bp[j] == 1
-            ]
-
-            if not np.any(s_residual):
-                # BP converged — no SVD needed
-                return {
-                    "active": False,
-                    "node_id": list(self.node_coords),
-                    "error_type": error_type,
-                    "data_positions": [list(p) for p in data_pos],
-                    "bp_corrections": bp_corrections,
-                }
-
-            # 2. BP did not converge — SVD on residual
-            m_h, n_h = H.shape
-            U, sigma, Vt = np.linalg.svd(H.astype(float), full_matrices=False)
-            total_energy = np.sum(sigma**2)
-            max_k = min(m_h, n_h)
-            if total_energy > 1e-10:
-                cumulative = np.cumsum(sigma**2)
-                k = min(
-                    int(
-                        np.searchsorted(cumulative, energy_threshold * total_energy) + 1
-                    ),
-                    max_k,
-                )
-            else:
-                k = max_k
-
-            energy_retained = (
-                np.cumsum(sigma**2)[k - 1] / total_energy
-                if total_energy > 1e-10
-                else 1.0
-            )
-            print(
-                f"[{self.node_coords}] Local SVD ({error_type}): k={k}/{n_h} "
-                f"({energy_retained:.2%} energy retained)"
-            )
+        s_residual = (s + H @ e_bp) % 2
+        # Corrections travel as a mask over data_pos (the columns of H)
+        bp_corrections = e_bp.astype(bool)
 
-            U_k = U[:, :k]
-            Sig_k = np.diag(sigma[:k])
-            H_reduced = U_k @ Sig_k  # (m, k) real-valued
-            V_k = Vt[:k, :].T  # (n, k)
-
-            r_node, c_node = self.node_coords
-            B = self.layout_manager.block_size
+        if not np.any(s_residual):
+            # BP converged — no SVD needed
             return {
-                "active": True,
-                "node_id": list(self.node_coords),
+                "active": False,
+                "node_id": tuple(self.node_coords),
                 "error_type": error_type,
-                "H_reduced": H_reduced.tolist(),
-                "V_k": V_k.tolist(),
-                "s": s_residual.tolist(),
-                "k": k,
-                "data_positions": [list(p) for p in data_pos],
-                "global_offset": [r_node * B, c_node * B],
+                "n_data": n_data,
+                "syndrome_weight": int(np.count_nonzero(s)),
                 "bp_corrections": bp_corrections,
-                "llr": (U_k @ Sig_k @ Vt[:k, :]).diagonal().tolist()
-                if k <= n_h
-                else [],
             }
 
-        return _make_payload(H_Z, s_Z, "X"), _make_payload(H_X, s_X, "Z")
+        # 2. BP did not converge — SVD of H, computed once per error type
+        svd = self._svd_factors(H, error_type, energy_threshold)
+        log.debug("[%s] Local SVD (%s): k=%d/%d (%.2f%% energy retained)", self.node_coords,
+                  error_type, svd["k"], H.shape[1], 100 * svd["energy_retained"])
+
+        payload = {
+            "active": True,
+            "node_id": tuple(self.node_coords),
+            "error_type": error_type,
+            "energy_threshold": energy_threshold,
+            "s": s_residual.astype(bool),
+            "k": svd["k"],
+            "n_data": n_data,
+            "syndrome_weight": int(np.count_nonzero(s)),
+            "bp_corrections": bp_corrections,
+        }
+        # The factors never change, so the coordinator keeps them after the
+        # first transfer: later payloads only carry the fresh syndrome.
+        if (error_type, energy_threshold) not in self._svd_sent:
+            payload.update(H_reduced=svd["H_reduced"], V_k=svd["V_k"], llr=svd["llr"])
+            self._svd_sent.add((error_type, energy_threshold))
+        return payload
+
+    def _svd_factors(self, H, error_type: str, energy_threshold: float) -> dict:
+        """Energy-truncated SVD of the node's H for one error type.
+        H only depends on the layout, so it is factorized once per
+        (error_type, energy_threshold) and reused on every later shot."""
+        key = (error_type, energy_threshold)
+        if key in self._svd_cache:
+            return self._svd_cache[key]
+
+        m_h, n_h = H.shape
+        # H is tiny after truncation to the node; densify only for the SVD
+        U, sigma, Vt = np.linalg.svd(H.toarray().astype(float), full_matrices=False)
+        total_energy = np.sum(sigma**2)
+        max_k = min(m_h, n_h)
+        if total_energy > 1e-10:
+            cumulative = np.cumsum(sigma**2)
+            k = min(
+                int(np.searchsorted(cumulative, energy_threshold * total_energy) + 1),
+                max_k,
+            )
+        else:
+            k = max_k
+
+        energy_retained = (
+            np.cumsum(sigma**2)[k - 1] / total_energy if total_energy > 1e-10 else 1.0
+        )
+
+        U_k = U[:, :k]
+        Sig_k = np.diag(sigma[:k])
+        H_reduced = U_k @ Sig_k  # (m, k) real-valued
+        V_k = Vt[:k, :].T  # (n, k)
+
+        # float32 is ample: the coordinator rounds H_reduced and V_k @ e to GF(2)
+        self._svd_cache[key] = {
+            "k": k,
+            "energy_retained": energy_retained,
+            "H_reduced": H_reduced.astype(np.float32),
+            "V_k": V_k.astype(np.float32),
+            "llr": (U_k @ Sig_k @ Vt[:k, :]).diagonal().astype(np.float32)
+            if k <= n_h
+            else np.zeros(0, dtype=np.float32),
+        }
+        return self._svd_cache[key]
 
     def _communicate_with_coordinator(self, context, payload_X, payload_Z):
         csock = context.csockets[self.coordinator_name]
-        csock.send(json.dumps(payload_X))
-        csock.send(json.dumps(payload_Z))
+        csock.send(wire.encode(payload_X))
+        csock.send(wire.encode(payload_Z))
         yield from context.connection.flush()
-        msg_X = yield from csock.recv()
-        tmp_time_x = yield from csock.recv()
-        t_x = float(json.loads(tmp_time_x))
-        msg_Z = yield from csock.recv()
-        tmp_time_z = yield from csock.recv()
-        t_z = float(json.loads(tmp_time_z))
-        return json.loads(msg_X), json.loads(msg_Z), t_x + t_z
+        # The coordinator decodes both sectors concurrently and replies in
+        # completion order; each reply carries its error_type
+        replies = {}
+        for _ in range(2):
+            reply = wire.decode((yield from csock.recv()))
+            replies[reply["error_type"]] = reply
+        reply_X, reply_Z = replies["X"], replies["Z"]
+        # Replies carry a correction mask over the node's data qubits
+        data_pos = self._local_structure()[4]
+        corr_X = [data_pos[j] for j in np.flatnonzero(reply_X["corrections"])]
+        corr_Z = [data_pos[j] for j in np.flatnonzero(reply_Z["corrections"])]
+        # Overlapping sectors: the critical path is the slower one
+        return corr_X, corr_Z, max(reply_X["t_tot"], reply_Z["t_tot"])
 
     def _apply_corrections(self, corrections: list, gate: str = "X"):
         r_node, c_node = self.node_coords
@@ -823,7 +989,7 @@ class ClusterNodeProgram(Program):
                 yield from context.connection.flush()
                 parity ^= int(outcome)
 
-            print(f"[{self.node_coords}] Logical-Z physical parity = {parity}")
+            log.debug("[%s] Logical-Z physical parity = %d", self.node_coords, parity)
             csock.send(json.dumps(parity))
 
         yield from context.connection.flush()
@@ -865,7 +1031,7 @@ class ClusterNodeProgram(Program):
                 yield from context.connection.flush()
                 parity ^= int(outcome)
 
-            print(f"[{self.node_coords}] Logical-X physical parity = {parity}")
+            log.debug("[%s] Logical-X physical parity = %d", self.node_coords, parity)
             csock.send(json.dumps(parity))
 
         yield from context.connection.flush()
@@ -882,29 +1048,22 @@ class ClusterNodeProgram(Program):
             if choice == "X":
                 qubit.X()
                 self.injected_X_errors.add((r, c))
-                print(
-                    f"[{self.node_coords}] Noise: "
-                    f"{len(self.injected_X_errors) if self.injected_X_errors else 'none'}"
-                )
+                log.debug("[%s] Noise: %s", self.node_coords, len(self.injected_X_errors))
             elif choice == "Y":
                 qubit.Y()
                 self.injected_X_errors.add((r, c))
-                print(
-                    f"[{self.node_coords}] Noise: "
-                    f"{len(self.injected_X_errors) if self.injected_X_errors else 'none'}"
-                )
+                log.debug("[%s] Noise: %s", self.node_coords, len(self.injected_X_errors))
                 self.injected_Z_errors.add((r, c))
-                print(
-                    f"[{self.node_coords}] Noise: "
-                    f"{len(self.injected_Z_errors) if self.injected_Z_errors else 'none'}"
-                )
+                log.debug("[%s] Noise: %s", self.node_coords, len(self.injected_Z_errors))
             elif choice == "Z":
                 qubit.Z()
                 self.injected_Z_errors.add((r, c))
-                print(
-                    f"[{self.node_coords}] Noise: "
-                    f"{len(self.injected_Z_errors) if self.injected_Z_errors else 'none'}"
-                )
+                log.debug("[%s] Noise: %s", self.node_coords, len(self.injected_Z_errors))
+
+    # Noise acts from the second round on (round_idx None: outside the rounds)
+    @staticmethod
+    def _noisy_round(round_idx) -> bool:
+        return round_idx is not None and round_idx >= 1
 
     def _noise_cnot(self, qubit1, qubit2, coords1, coords2, round_idx=None):
         qubit1.cnot(qubit2)
@@ -913,7 +1072,7 @@ class ClusterNodeProgram(Program):
         if (
             (self.error == "cnot" or self.error == "all")
             and random.random() < self.NOISE_PROBABILITY
-            and round_idx == 1
+            and self._noisy_round(round_idx)
         ):
             qubits_and_coords = [(qubit1, coords1), (qubit2, coords2)]
 
@@ -943,8 +1102,5 @@ class ClusterNodeProgram(Program):
                     if is_local_data:
                         toggle_error(self.injected_Z_errors, coords)
 
-            print(
-                f"[{self.node_coords}] CNOT Noise applied. "
-                f"X errors: {len(self.injected_X_errors)}, "
-                f"Z errors: {len(self.injected_Z_errors)}"
-            )
+            log.debug("[%s] CNOT Noise applied. X errors: %d, Z errors: %d", self.node_coords,
+                      len(self.injected_X_errors), len(self.injected_Z_errors))
@@ -20,23 +20,37 @@ Differences from dis_surface_mesure_global_svd.py (original)
 """
 
 import json
+import logging
 import random
 import numpy as np
+from scipy import sparse
 
 from squidasm.sim.stack.program import Program, ProgramContext, ProgramMeta
 from netqasm.sdk.qubit import Qubit
 
+import wire
+from bp_decoder import MinSumDecoder
+from qec_logging import get_logger
+from surface_code import XQ, ZQ
+from syndrome_stream import DetectionStream
+
+log = get_logger("node")
+
 
 class ClusterNodeProgram(Program):
     ENERGY_THRESHOLD = 0.98
-    NUM_ROUNDS       = 2
+    NUM_ROUNDS       = 2   # default; the first round is the noiseless reference
     # Min-Sum scaling factor (0.75 corrects the magnitude under-estimation
     # of plain Min-Sum while keeping cycle-robustness)
     BP_ALPHA         = 0.75
     BP_MAX_ITER      = 20
 
     def __init__(self, node_coords: tuple, layout_manager, error, prob,
-                 coordinator_name: str = "coordinator"):
+                 coordinator_name: str = "coordinator", num_rounds: int = None):
+        self.num_rounds       = self.NUM_ROUNDS if num_rounds is None else num_rounds
+        if self.num_rounds < 2:
+            raise ValueError(f"num_rounds must be >= 2 (got {self.num_rounds}): "
+                             "the first round is the reference of the detection events")
         self.node_coords      = node_coords
         self.layout_manager   = layout_manager
         self.coordinator_name = coordinator_name
@@ -51,6 +65,11 @@ class ClusterNodeProgram(Program):
         if c > 0:     self.neighbors.append(f"node_{r}_{c-1}")
         if c < N - 1: self.neighbors.append(f"node_{r}_{c+1}")
 
+        self._bp_decoders  = {}
+        self._local_system = None
+        self._syndrome_slots = None  # NodeGrid.anc_slot of the rows of H_Z / H_X
+        self._H_sent       = set()   # error types whose H the coordinator already has
+
     @property
     def meta(self) -> ProgramMeta:
         B = self.layout_manager.block_size
@@ -99,10 +118,12 @@ class ClusterNodeProgram(Program):
         z_parity          = [[0] * self.B_cols for _ in range(self.B_rows)]
         x_parity          = [[0] * self.B_cols for _ in range(self.B_rows)]
         tele_flip         = {}
-        all_round_syndromes = []
+        # Streamed detection events: memory constant in num_rounds (syndrome_stream.py)
+        grid              = self.layout_manager.get_node_grid(*self.node_coords)
+        stream            = DetectionStream(len(grid.anc_idx))
 
-        for round_idx in range(self.NUM_ROUNDS):
-            if round_idx == 1:
+        for round_idx in range(self.num_rounds):
+            if self._noisy_round(round_idx):
                 # 2. Apply noise
                 for error in self.errors:
                     match error:
@@ -113,8 +134,8 @@ class ClusterNodeProgram(Program):
                                             and random.random() < self.NOISE_PROBABILITY):
                                         self.local_qubits[r][c].X()
                                         self.injected_X_errors.add((r, c))
-                            print(f"[{self.node_coords}] Noise: "
-                                  f"{len(self.injected_X_errors) if self.injected_X_errors else 'none'}")
+                            log.debug("[%s] Noise: %s", self.node_coords,
+                                      len(self.injected_X_errors) or "none")
                         case "hadamard":
                             for r in range(self.B_rows):
                                 for c in range(self.B_cols):
@@ -122,15 +143,15 @@ class ClusterNodeProgram(Program):
                                         self._noisy_H(self.local_qubits[r][c], r, c)
                                         self._noisy_H(self.local_qubits[r][c], r, c)
                         case "initialization":
-                            print(f"[{self.node_coords}] initialization error: simulating by flipping ancilla measurements.")
+                            log.debug("[%s] initialization error: simulating by flipping ancilla measurements.", self.node_coords)
                         case "readout":
-                            print(f"[{self.node_coords}] readout error: simulating by flipping measurements with p={self.NOISE_PROBABILITY}.")
+                            log.debug("[%s] readout error: simulating by flipping measurements with p=%s.", self.node_coords, self.NOISE_PROBABILITY)
                         case "cnot":
-                            print(f"[{self.node_coords}] CNOT error: applying random X error with p={self.NOISE_PROBABILITY}.")
+                            log.debug("[%s] CNOT error: applying random X error with p=%s.", self.node_coords, self.NOISE_PROBABILITY)
                         case "none":
-                            print(f"[{self.node_coords}] Ideal simulation: no noise applied.")
+                            log.debug("[%s] Ideal simulation: no noise applied.", self.node_coords)
                         case _:
-                            print(f"[{self.node_coords}] WARNING: Unknown error type '{self.error}'. Skipping noise.")
+                            log.warning("[%s] Unknown error type '%s'. Skipping noise.", self.node_coords, self.error)
 
             # a) Re-allocate ancillas
             for r in range(self.B_rows):
@@ -140,13 +161,13 @@ class ClusterNodeProgram(Program):
                         ancilla = Qubit(conn)
                         if (self.error in ("initialization", "all")
                                 and random.random() < self.NOISE_PROBABILITY
-                                and round_idx == 1):
+                                and self._noisy_round(round_idx)):
                             if role == "zQ":
                                 ancilla.X()
-                                print(f"[{self.node_coords}] Noise: X error on zQ ancilla at ({r}, {c})")
+                                log.debug("[%s] Noise: X error on zQ ancilla at (%d, %d)", self.node_coords, r, c)
                             else:
                                 ancilla.Z()
-                                print(f"[{self.node_coords}] Noise: Z error on xQ ancilla at ({r}, {c})")
+                                log.debug("[%s] Noise: Z error on xQ ancilla at (%d, %d)", self.node_coords, r, c)
                         self.local_qubits[r][c] = ancilla
 
             # b) Local gates
@@ -182,8 +203,9 @@ class ClusterNodeProgram(Program):
             for (r, c) in round_tf:
                 tele_flip[(r, c)] = tele_flip.get((r, c), 0) ^ 1
 
-            # e) Measure ancillas
-            round_syndrome = {}
+            # e) Measure ancillas: queue every measurement, flush once
+            round_syndrome = np.zeros(len(grid.anc_idx), dtype=np.uint8)
+            measured = []
             for r in range(self.B_rows):
                 for c in range(self.B_cols):
                     role = self.qubit_roles[r][c]
@@ -192,50 +214,50 @@ class ClusterNodeProgram(Program):
                     ancilla = self.local_qubits[r][c]
                     if role == "xQ":
                         ancilla.H()
-                    m = ancilla.measure()
-                    yield from conn.flush()
-                    if (self.error in ("readout", "all")
-                            and random.random() < self.NOISE_PROBABILITY
-                            and round_idx == 1):
-                        m = 1 - m
-                        print(f"[{self.node_coords}] Error flip at: ({r}, {c})")
-                    raw = int(m)
-                    if role == "xQ":
-                        z_flip = 0
-                        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                            nr, nc = r + dr, c + dc
-                            if (0 <= nr < self.B_rows and 0 <= nc < self.B_cols
-                                    and self.qubit_roles[nr][nc] == "pQ"
-                                    and z_parity[nr][nc] == 1):
-                                z_flip ^= 1
-                        tf = tele_flip.get((r, c), 0)
-                        round_syndrome[(r, c)] = raw ^ z_flip ^ tf
-                    else:
-                        x_flip = 0
-                        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                            nr, nc = r + dr, c + dc
-                            if (0 <= nr < self.B_rows and 0 <= nc < self.B_cols
-                                    and self.qubit_roles[nr][nc] == "pQ"
-                                    and x_parity[nr][nc] == 1):
-                                x_flip ^= 1
-                        round_syndrome[(r, c)] = raw ^ x_flip
-
-            all_round_syndromes.append(round_syndrome)
-            active_synd = {k: v for k, v in round_syndrome.items() if v == 1}
-            print(f"[{self.node_coords}] Round {round_idx + 1} syndrome: "
-                  f"{active_synd if active_synd else 'clean'}")
-
-        # 4. Spacetime decoding: XOR between the two rounds
-        s1      = all_round_syndromes[0]
-        s2      = all_round_syndromes[1]
-        all_pos = set(s1.keys()) | set(s2.keys())
-        self.ancilla_measurements = {
-            pos: s1.get(pos, 0) ^ s2.get(pos, 0) for pos in all_pos
-        }
-
-        active_final = {k: v for k, v in self.ancilla_measurements.items() if v == 1}
-        print(f"[{self.node_coords}] Spacetime syndrome (XOR): "
-              f"{active_final if active_final else 'clean'}")
+                    measured.append((r, c, role, ancilla.measure()))
+            yield from conn.flush()
+
+            for r, c, role, m in measured:
+                m = int(m)
+                if (self.error in ("readout", "all")
+                        and random.random() < self.NOISE_PROBABILITY
+                        and self._noisy_round(round_idx)):
+                    m = 1 - m
+                    log.debug("[%s] Error flip at: (%d, %d)", self.node_coords, r, c)
+                raw = m
+                if role == "xQ":
+                    z_flip = 0
+                    for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                        nr, nc = r + dr, c + dc
+                        if (0 <= nr < self.B_rows and 0 <= nc < self.B_cols
+                                and self.qubit_roles[nr][nc] == "pQ"
+                                and z_parity[nr][nc] == 1):
+                            z_flip ^= 1
+                    tf = tele_flip.get((r, c), 0)
+                    round_syndrome[grid.anc_slot[r * self.B_cols + c]] = raw ^ z_flip ^ tf
+                else:
+                    x_flip = 0
+                    for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                        nr, nc = r + dr, c + dc
+                        if (0 <= nr < self.B_rows and 0 <= nc < self.B_cols
+                                and self.qubit_roles[nr][nc] == "pQ"
+                                and x_parity[nr][nc] == 1):
+                            x_flip ^= 1
+                    round_syndrome[grid.anc_slot[r * self.B_cols + c]] = raw ^ x_flip
+
+            events = stream.push(round_syndrome)
+            if events is not None:
+                log.debug("[%s] Round %d: %d detection events", self.node_coords, round_idx + 1,
+                          DetectionStream.weight(events))
+
+        # 4. Spacetime decoding: running XOR of the detection events
+        self.detection_events = stream.detection_events()
+
+        if log.isEnabledFor(logging.DEBUG):
+            r_loc, c_loc = np.divmod(grid.anc_idx[self.detection_events == 1], grid.shape[1])
+            active_final = list(zip(r_loc.tolist(), c_loc.tolist()))
+            log.debug("[%s] Spacetime syndrome (XOR): %s", self.node_coords,
+                      active_final if active_final else "clean")
 
         # 5. Build payloads with local BP pre-filter and exchange with coordinator
         payload_X, payload_Z = self._build_full_payloads()
@@ -246,15 +268,16 @@ class ClusterNodeProgram(Program):
         self._apply_corrections(corr_Z, gate="Z")
         yield from conn.flush()
 
-        if self.applied_X_corrections and self.applied_Z_corrections:
-            print(f"[{self.node_coords}] Corrections X: {sorted(self.applied_X_corrections)} "
-                  f"Corrections Z: {sorted(self.applied_Z_corrections)}")
-        elif self.applied_Z_corrections:
-            print(f"[{self.node_coords}] Corrections Z: {sorted(self.applied_Z_corrections)}")
-        elif self.applied_X_corrections:
-            print(f"[{self.node_coords}] Corrections X: {sorted(self.applied_X_corrections)}")
-        else:
-            print(f"[{self.node_coords}] Corrections: none")
+        if log.isEnabledFor(logging.DEBUG):
+            if self.applied_X_corrections and self.applied_Z_corrections:
+                log.debug("[%s] Corrections X: %s Corrections Z: %s", self.node_coords,
+                          sorted(self.applied_X_corrections), sorted(self.applied_Z_corrections))
+            elif self.applied_Z_corrections:
+                log.debug("[%s] Corrections Z: %s", self.node_coords, sorted(self.applied_Z_corrections))
+            elif self.applied_X_corrections:
+                log.debug("[%s] Corrections X: %s", self.node_coords, sorted(self.applied_X_corrections))
+            else:
+                log.debug("[%s] Corrections: none", self.node_coords)
 
         # 6. Logical-Z parity
         yield from self._send_logical_parity(context, z_parity)
@@ -408,52 +431,43 @@ class ClusterNodeProgram(Program):
     #  Local system builder                                               #
     # ------------------------------------------------------------------ #
     def _build_local_system(self):
-        B = self.layout_manager.block_size
-        subgrid_data = self.layout_manager.get_subgrid_for_node(*self.node_coords)
-        actual_rows  = len(subgrid_data)
-        actual_cols  = len(subgrid_data[0]) if subgrid_data else B
-
-        d_pos, zq_pos, xq_pos = [], [], []
-        for r in range(actual_rows):
-            for c in range(actual_cols):
-                gr, gc = subgrid_data[r][c]["global_pos"]
-                role   = self.qubit_roles[r][c]
-                if   role == "pQ": d_pos.append((gr, gc))
-                elif role == "zQ": zq_pos.append((gr, gc))
-                elif role == "xQ": xq_pos.append((gr, gc))
-
-        n = len(d_pos)
-
-        def _make_H_and_s(anc_pos):
-            H_block = np.zeros((len(anc_pos), n), dtype=int)
-            for i, (ar, ac) in enumerate(anc_pos):
-                for j, (dr, dc) in enumerate(d_pos):
-                    if abs(ar - dr) + abs(ac - dc) == 1:
-                        H_block[i, j] = 1
-
-            def _global_to_local(gr, gc):
-                for ri in range(actual_rows):
-                    for ci in range(actual_cols):
-                        if subgrid_data[ri][ci]["global_pos"] == (gr, gc):
-                            return (ri, ci)
-                return None
-
-            s_block = np.array(
-                [self.ancilla_measurements.get(_global_to_local(p[0], p[1]), 0)
-                 for p in anc_pos],
-                dtype=int,
-            )
-            nonzero_rows = H_block.sum(axis=1) > 0
-            return H_block[nonzero_rows], s_block[nonzero_rows]
-
-        H_Z, s_Z = _make_H_and_s(zq_pos)
-        H_X, s_X = _make_H_and_s(xq_pos)
+        H_Z, anc_Z, H_X, anc_X, d_pos = self._local_structure()
+
+        # Per shot only the syndrome is gathered, in the row order of H
+        if self._syndrome_slots is None:
+            grid = self.layout_manager.get_node_grid(*self.node_coords)
+            self._syndrome_slots = tuple(
+                grid.anc_slot[[r * grid.shape[1] + c for r, c in anc_local]].astype(int)
+                for anc_local in (anc_Z, anc_X))
+        slots_Z, slots_X = self._syndrome_slots
+        s_Z = self.detection_events[slots_Z].astype(int)
+        s_X = self.detection_events[slots_X].astype(int)
         return H_Z, s_Z, H_X, s_X, d_pos
 
+    def _local_structure(self):
+        """
+        Layout-only part of the local system, built once and kept on the
+        instance: (H_Z, anc_Z, H_X, anc_X, d_pos) with the CSR matrices,
+        the local (r, c) of the ancilla behind each row and the global
+        position of the data qubit behind each column.
+        """
+        if self._local_system is not None:
+            return self._local_system
+
+        grid  = self.layout_manager.get_node_grid(*self.node_coords)
+        d_pos = list(zip(grid.global_rows.ravel()[grid.data_idx].tolist(),
+                         grid.global_cols.ravel()[grid.data_idx].tolist()))
+
+        # Sparse CSR from the layout's neighbour tables: at most four ones per row
+        H_Z, anc_Z = grid.check_matrix(ZQ)
+        H_X, anc_X = grid.check_matrix(XQ)
+        self._local_system = (H_Z, anc_Z, H_X, anc_X, d_pos)
+        return self._local_system
+
     # ------------------------------------------------------------------ #
     #  Min-Sum Belief Propagation (local pre-filter)                       #
     # ------------------------------------------------------------------ #
-    def _bp_local(self, H: np.ndarray, s: np.ndarray) -> np.ndarray:
+    def _bp_local(self, H: sparse.csr_matrix, s: np.ndarray) -> np.ndarray:
         """
         Scaled Min-Sum BP on GF(2).
 
@@ -464,58 +478,21 @@ class ClusterNodeProgram(Program):
 
         Parameters
         ----------
-        H : (m, n) binary parity-check matrix
+        H : (m, n) sparse binary parity-check matrix
         s : (m,)  binary syndrome vector
         """
-        m, n = H.shape
-        p    = self.NOISE_PROBABILITY
+        p = self.NOISE_PROBABILITY
         # Channel LLR: log P(bit=0) / P(bit=1)
-        ch_llr = np.full(n, np.log((1.0 - p) / p))
+        ch_llr = np.log((1.0 - p) / p)
+        return self._bp_decoder(H).decode(s, ch_llr)
 
-        msg_v2c = np.zeros((m, n))   # variable → check messages
-        msg_c2v = np.zeros((m, n))   # check   → variable messages
-
-        e_hat = np.zeros(n, dtype=int)
-
-        for _ in range(self.BP_MAX_ITER):
-            # ── Check-node update (Scaled Min-Sum) ──────────────────────
-            for i in range(m):
-                neighbors = np.where(H[i] == 1)[0]
-                for j in neighbors:
-                    others = neighbors[neighbors != j]
-                    if len(others) == 0:
-                        msg_c2v[i, j] = 0.0
-                        continue
-                    # Sign: product of signs of incoming messages
-                    sign = 1
-                    for k in others:
-                        v = msg_v2c[i, k]
-                        sign *= (-1 if v < 0 else 1)
-                    # Account for syndrome bit: flip sign if s[i] == 1
-                    if s[i] == 1:
-                        sign *= -1
-                    # Magnitude: scaled minimum of absolute values
-                    magnitude = self.BP_ALPHA * float(
-                        np.min(np.abs(msg_v2c[i, others]))
-                    )
-                    msg_c2v[i, j] = sign * magnitude
-
-            # ── Variable-node update ─────────────────────────────────────
-            for j in range(n):
-                neighbors = np.where(H[:, j] == 1)[0]
-                total = ch_llr[j] + float(np.sum(msg_c2v[neighbors, j]))
-                for i in neighbors:
-                    msg_v2c[i, j] = total - msg_c2v[i, j]
-
-            # ── Hard decision ────────────────────────────────────────────
-            llr_total = ch_llr + msg_c2v.sum(axis=0)
-            e_hat     = (llr_total < 0).astype(int)
-
-            # ── Convergence check ────────────────────────────────────────
-            if np.all((H @ e_hat) % 2 == s):
-                return e_hat
-
-        return e_hat
+    def _bp_decoder(self, H: sparse.csr_matrix) -> MinSumDecoder:
+        # Edge arrays of the Tanner graph are built once per distinct H
+        key = (H.shape, H.indptr.tobytes(), H.indices.tobytes())
+        if key not in self._bp_decoders:
+            self._bp_decoders[key] = MinSumDecoder(
+                H, alpha=self.BP_ALPHA, max_iter=self.BP_MAX_ITER)
+        return self._bp_decoders[key]
 
     # ------------------------------------------------------------------ #
     #  Build full payloads with BP pre-filter                              #
@@ -535,18 +512,16 @@ class ClusterNodeProgram(Program):
                 The coordinator runs SVD+OSD on the cleaner residual syndrome.
         """
         H_Z, s_Z, H_X, s_X, data_pos = self._build_local_system()
-        r_node, c_node = self.node_coords
-        B = self.layout_manager.block_size
 
         def _make_payload(H, s, error_type):
             # Empty or all-zero syndrome — nothing to do
-            if H.size == 0 or not np.any(s):
+            if H.nnz == 0 or not np.any(s):
                 return {
                     "active":         False,
-                    "node_id":        list(self.node_coords),
+                    "node_id":        tuple(self.node_coords),
                     "error_type":     error_type,
-                    "data_positions": [list(p) for p in data_pos],
-                    "bp_corrections": [],
+                    "n_data":         len(data_pos),
+                    "bp_corrections": np.zeros(len(data_pos), dtype=bool),
                 }
 
             # Run Min-Sum BP
@@ -554,29 +529,33 @@ class ClusterNodeProgram(Program):
             s_residual = (s + H @ e_bp) % 2
 
             if not np.any(s_residual):
-                # BP converged — send corrections, no H needed
-                bp_corr = [list(data_pos[j]) for j in range(len(e_bp)) if e_bp[j] == 1]
+                # BP converged — send corrections (mask over data_pos), no H needed
                 return {
                     "active":         False,
-                    "node_id":        list(self.node_coords),
+                    "node_id":        tuple(self.node_coords),
                     "error_type":     error_type,
-                    "data_positions": [list(p) for p in data_pos],
-                    "bp_corrections": bp_corr,
+                    "n_data":         len(data_pos),
+                    "bp_corrections": e_bp.astype(bool),
                 }
 
-            # BP did not converge — send full H with residual syndrome
+            # BP did not converge — send the residual syndrome, plus H (CSR
+            # index arrays) the first time: the coordinator keeps it afterwards
             m, n = H.shape
-            return {
+            payload = {
                 "active":         True,
-                "node_id":        list(self.node_coords),
+                "node_id":        tuple(self.node_coords),
                 "error_type":     error_type,
-                "H_full":         H.tolist(),
-                "s":              s_residual.tolist(),
+                "s":              s_residual.astype(bool),
                 "n":              n,
-                "data_positions": [list(p) for p in data_pos],
-                "global_offset":  [r_node * B, c_node * B],
-                "bp_corrections": [list(data_pos[j]) for j in range(len(e_bp)) if e_bp[j] == 1],
+                "n_data":         len(data_pos),
+                "bp_corrections": e_bp.astype(bool),
             }
+            if error_type not in self._H_sent:
+                payload.update(H_shape=tuple(H.shape),
+                               H_indptr=H.indptr.astype(np.int32),
+                               H_indices=H.indices.astype(np.int32))
+                self._H_sent.add(error_type)
+            return payload
 
         return _make_payload(H_Z, s_Z, "X"), _make_payload(H_X, s_X, "Z")
 
@@ -585,12 +564,15 @@ class ClusterNodeProgram(Program):
     # ------------------------------------------------------------------ #
     def _communicate_with_coordinator(self, context, payload_X, payload_Z):
         csock = context.csockets[self.coordinator_name]
-        csock.send(json.dumps(payload_X))
-        csock.send(json.dumps(payload_Z))
+        csock.send(wire.encode(payload_X))
+        csock.send(wire.encode(payload_Z))
         yield from context.connection.flush()
-        msg_X = yield from csock.recv()
-        msg_Z = yield from csock.recv()
-        return json.loads(msg_X), json.loads(msg_Z)
+        reply_X  = wire.decode((yield from csock.recv()))
+        reply_Z  = wire.decode((yield from csock.recv()))
+        # Corrections come back as masks over the node's data qubits
+        data_pos = self._local_structure()[4]
+        return ([data_pos[j] for j in np.flatnonzero(reply_X["corrections"])],
+                [data_pos[j] for j in np.flatnonzero(reply_Z["corrections"])])
 
     # ------------------------------------------------------------------ #
     #  Apply corrections                                                 #
@@ -634,7 +616,7 @@ class ClusterNodeProgram(Program):
                 outcome = self.local_qubits[r][0].measure()
                 yield from context.connection.flush()
                 parity ^= int(outcome)
-            print(f"[{self.node_coords}] Logical-Z physical parity = {parity}")
+            log.debug("[%s] Logical-Z physical parity = %d", self.node_coords, parity)
             csock.send(json.dumps(parity))
         yield from context.connection.flush()
 
@@ -656,11 +638,16 @@ class ClusterNodeProgram(Program):
                 qubit.Z()
                 self.injected_Z_errors.add((r, c))
 
+    # Noise acts from the second round on (round_idx None: outside the rounds)
+    @staticmethod
+    def _noisy_round(round_idx) -> bool:
+        return round_idx is not None and round_idx >= 1
+
     def _noise_cnot(self, qubit1, qubit2, coords1, coords2, round_idx=None):
         qubit1.cnot(qubit2)
         if (self.error in ("cnot", "all")
                 and random.random() < self.NOISE_PROBABILITY
-                and round_idx == 1):
+                and self._noisy_round(round_idx)):
             qubits_and_coords = [(qubit1, coords1), (qubit2, coords2)]
             for qb, coords in qubits_and_coords:
                 choice = random.choice(["X", "Y", "Z", "I"])
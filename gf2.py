@@ -0,0 +1,174 @@
+"""
+Bit-packed linear algebra over GF(2)
+Rows of a binary matrix are packed into uint64 words (bit c of a row lives
+in word c // 64, bit c % 64), so a row operation is a single XOR over
+ceil(n / 64) words and a pivot search is a shift-and-mask over one column
+of words.  Used by both coordinators for the OSD elimination.
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+WORD_BITS = 64
+
+
+def pack_rows(M) -> np.ndarray:
+    """Pack a binary (m, n) matrix, dense or scipy.sparse, into an
+    (m, ceil(n / 64)) uint64 array."""
+    if sparse.issparse(M):
+        return _pack_sparse_rows(M)
+    M = np.atleast_2d(np.asarray(M) % 2).astype(np.uint8)
+    m, n = M.shape
+    n_words = max(1, -(-n // WORD_BITS))
+    packed = np.zeros((m, n_words * 8), dtype=np.uint8)
+    packed[:, : -(-n // 8)] = np.packbits(M, axis=1, bitorder="little")
+    return packed.view("<u8").astype(np.uint64)
+
+
+# Exact, hashable fingerprint of a binary matrix (shape plus packed rows), for cache keys
+def digest(M) -> tuple:
+    return (M.shape, pack_rows(M).tobytes())
+
+
+def _pack_sparse_rows(M) -> np.ndarray:
+    # Set the bits straight from the non-zeros, without densifying M
+    M = sparse.coo_matrix(M)
+    M.sum_duplicates()
+    m, n = M.shape
+    P = np.zeros((m, max(1, -(-n // WORD_BITS))), dtype=np.uint64)
+    odd = (M.data % 2) == 1
+    rows, cols = M.row[odd], M.col[odd].astype(np.uint64)
+    np.bitwise_or.at(P, (rows, (cols // WORD_BITS).astype(np.intp)),
+                     np.uint64(1) << (cols % np.uint64(WORD_BITS)))
+    return P
+
+
+def unpack_rows(P: np.ndarray, n_cols: int) -> np.ndarray:
+    """Inverse of pack_rows: (m, n_words) uint64 → (m, n_cols) uint8."""
+    P = np.ascontiguousarray(P, dtype="<u8")
+    bits = np.unpackbits(P.view(np.uint8), axis=1, bitorder="little")
+    return bits[:, :n_cols]
+
+
+def _parity(words: np.ndarray) -> np.ndarray:
+    # Fold every uint64 down to the parity of its set bits
+    x = words.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        x ^= x >> np.uint64(shift)
+    return (x & np.uint64(1)).astype(np.uint8)
+
+
+def matvec(P: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """(M @ v) % 2 for a packed matrix P and a binary vector v."""
+    v_packed = pack_rows(np.asarray(v).reshape(1, -1))[0]
+    return _parity(np.bitwise_xor.reduce(P & v_packed, axis=1))
+
+
+def _eliminate(P: np.ndarray, n_cols: int, m: int) -> list:
+    """In-place Gauss-Jordan elimination of the first n_cols columns of P.
+    Pivot i ends up on row i; returns the list of pivot columns."""
+    pivot_cols = []
+    row = 0
+    for col in range(n_cols):
+        if row >= m:
+            break
+        word, bit = divmod(col, WORD_BITS)
+        col_bits = ((P[:, word] >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+        candidates = np.flatnonzero(col_bits[row:])
+        if len(candidates) == 0:
+            continue
+        found = row + candidates[0]
+        if found != row:
+            P[[row, found]] = P[[found, row]]
+            col_bits[[row, found]] = col_bits[[found, row]]
+        col_bits[row] = False
+        P[col_bits] ^= P[row]
+        pivot_cols.append(col)
+        row += 1
+    return pivot_cols
+
+
+def systematic_form(M, with_transform: bool = False) -> tuple:
+    """
+    Reduced row-echelon form of M (dense or scipy.sparse) over GF(2).
+
+    The first pivot row found for each column (scanning from the current
+    row down) is swapped into place and eliminated from every other row,
+    so pivot i lives on row i.
+
+    Returns
+    -------
+    M_sys      : (m, n) uint8 reduced matrix
+    pivot_cols : (rank,) int array of pivot columns, in order
+    T          : (m, m) uint8 row-operation transform with T @ M = M_sys
+                 (mod 2), or None when with_transform is False
+    """
+    m, n = M.shape
+    P = pack_rows(M)
+    n_words = P.shape[1]
+    if with_transform:
+        P = np.hstack([P, pack_rows(np.eye(m, dtype=np.uint8))])
+
+    pivot_cols = _eliminate(P, n, m)
+
+    M_sys = unpack_rows(P[:, :n_words], n)
+    T = unpack_rows(P[:, n_words:], m) if with_transform else None
+    return M_sys, np.array(pivot_cols, dtype=int), T
+
+
+def rank(M) -> int:
+    m, n = M.shape
+    return len(_eliminate(pack_rows(M), n, m))
+
+
+def solve(M, b: np.ndarray):
+    """One solution x of M @ x = b (mod 2), free variables set to 0.
+    Returns None when the system is inconsistent."""
+    m, n = M.shape
+    M_sys, pivot_cols, T = systematic_form(M, with_transform=True)
+    b_sys = matvec(pack_rows(T), b)
+    r = len(pivot_cols)
+    if np.any(b_sys[r:]):
+        return None
+    x = np.zeros(n, dtype=np.uint8)
+    x[pivot_cols] = b_sys[:r]
+    return x
+
+
+def null_space(M) -> np.ndarray:
+    """Basis of {x : M @ x = 0 (mod 2)} as the rows of an (n - rank, n) matrix."""
+    m, n = M.shape
+    M_sys, pivot_cols, _ = systematic_form(M)
+    r = len(pivot_cols)
+    is_pivot = np.zeros(n, dtype=bool)
+    is_pivot[pivot_cols] = True
+    free_cols = np.flatnonzero(~is_pivot)
+
+    basis = np.zeros((len(free_cols), n), dtype=np.uint8)
+    basis[np.arange(len(free_cols)), free_cols] = 1
+    # Each pivot variable equals the sum of the free variables in its row
+    basis[:, pivot_cols] = M_sys[:r, free_cols].T
+    return basis
+
+
+def split_blocks(M) -> list:
+    """
+    Independent sub-systems of M: connected components of its Tanner graph
+    (rows and columns linked by non-zeros).  Each block can be solved on
+    its own.  Returns a list of (rows, cols) index arrays; a block made of
+    an all-zero row or column has the other index array empty.
+    """
+    M = sparse.csr_matrix(M)
+    m, n = M.shape
+    if m == 0 or n == 0:
+        return [(np.arange(m), np.arange(n))] if m + n else []
+    adjacency = sparse.bmat([[None, M], [M.T, None]])
+    n_blocks, labels = connected_components(adjacency, directed=False)
+
+    order = np.argsort(labels, kind="stable")
+    bounds = np.cumsum(np.bincount(labels, minlength=n_blocks))[:-1]
+    blocks = []
+    for members in np.split(order, bounds):
+        blocks.append((members[members < m], members[members >= m] - m))
+    return blocks
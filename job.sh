@@ -20,6 +20,6 @@ CONTAINER_NAME="squidasm-debian-12.sif"
 
 echo "Start simulation: $(date)"
  
-apptainer exec $CONTAINER_NAME python3.10 main.py --error all --prob 0.001
+apptainer exec $CONTAINER_NAME python3.10 main.py --error all --prob 0.001 --workers ${SLURM_CPUS_PER_TASK:-1}
 
 echo "End simulation: $(date)"
\ No newline at end of file
@@ -1,18 +1,23 @@
-import re
 import sys
 from fractions import Fraction
 
+import numpy as np
+
+from results import load_results
+
 def calculate_average_k_over_n(filepath):
+    columns = load_results(filepath, columns={"k_X", "k_Z", "n_data"})
+    if not columns:
+        print("No n/k values found.")
+        return
+
+    # One n/k value per node and sector that sent an SVD payload (k > 0)
     fractions = []
-    
-    with open(filepath, 'r') as f:
-        for line in f:
-            match = re.search(r'k:(\d+)\s*/\s*(\d+)\s+captures', line)
-            if match:
-                k = int(match.group(1))
-                n = int(match.group(2))
-                fractions.append(Fraction(n, k))
-    
+    n = columns["n_data"]
+    for k in (columns["k_X"], columns["k_Z"]):
+        active = k > 0
+        fractions.extend(Fraction(int(n_i), int(k_i)) for n_i, k_i in zip(n[active], k[active]))
+
     if not fractions:
         print("No n/k values found.")
         return
@@ -27,4 +32,4 @@ def calculate_average_k_over_n(filepath):
 if __name__ == "__main__":
     if len(sys.argv) != 2:
         sys.exit(1)
-    calculate_average_k_over_n(sys.argv[1])
\ No newline at end of file
+    calculate_average_k_over_n(sys.argv[1])
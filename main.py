@@ -2,6 +2,13 @@ import traceback
 from contextlib import redirect_stdout
 import netsquid as n
 import argparse
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
 
 from squidasm.run.stack.run import run as run_simulation
 from squidasm.util.util import create_complete_graph_network
@@ -11,29 +18,179 @@ from netsquid_netbuilder.modules.qdevices.generic import GenericQDeviceConfig
 
 from surface_code import SurfaceLayout
 from coordinator import CoordinatorProgram
+from regional_coordinator import RegionalCoordinatorProgram, TopCoordinatorProgram, region_tiles
 from dis_surface_mesure import ClusterNodeProgram
+from pauli_frame import PauliFrameSimulator
+from qec_logging import LOG_LEVELS, configure_logging
+from results import append_results, to_columns
 
 n.set_qstate_formalism(n.QFormalism.STAB)
 
-def main(error, prob):
+# BLAS / OpenMP pools read these once at import time, so they are set before
+# the worker processes start: one thread per worker, the pool gives the cores.
+BLAS_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                    "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+
+def main(error, prob, osd_method="exhaustive", osd_order=2, decode_workers=1,
+         engine="netsquid", num_runs=1000, workers=1, seed=None, results_path=None,
+         batch_size=1000, log_level="warning", log_file=None, region_size=0, num_rounds=None,
+         decoder="osd", window=None):
     global_size    = 13   # distance-13 planar surface code (13×13 qubit grid)
     nodes_per_side = 2    # 2×2 grid of cluster nodes
 
+    print(f"Running Distributed Surface Code simulation ({engine} engine)...")
+    print(f"Global grid   : {global_size}x{global_size} qubits")
+    print(f"Cluster nodes : {nodes_per_side ** 2} nodes ")
+    print(f"Rounds        : {num_rounds or ClusterNodeProgram.NUM_ROUNDS} stabilizer rounds, "
+          f"detection events streamed {window or ClusterNodeProgram.WINDOW} layer(s) at a time")
+    backend = {"osd": "local SVD compression + OSD",
+               "uf": "Union-Find on the node check matrices",
+               "matching": "minimum-weight matching on the detector graph"}[decoder]
+    if region_size and engine == "netsquid":
+        print(f"Decoder       : {backend} at {len(region_tiles(nodes_per_side, region_size))} "
+              f"regional coordinators, residuals at the top coordinator")
+    else:
+        print(f"Decoder       : {backend} at coordinator")
+
+    shard_args = (global_size, nodes_per_side, error, prob, osd_method, osd_order,
+                  decode_workers, engine, region_size, num_rounds, decoder, window)
+    try:
+        parities, sim_time_ns = run_shards(shard_args, num_runs, workers, seed,
+                                           batch_size, results_path, log_level, log_file)
+        print_summary(parities, num_runs)
+        return sim_time_ns
+
+    except Exception as e:
+        print(f"\nError: {e}")
+        traceback.print_exc()
+
+
+def run_shards(shard_args, num_runs, workers=1, seed=None, batch_size=1000, results_path=None,
+               log_level="warning", log_file=None):
+    """Run the shots in shards of at most batch_size, on a process pool when
+    workers > 1.  Each shard gets its own SeedSequence child, so a given
+    (seed, batch_size) pair is reproducible whatever the worker count.
+    Every finished shard is appended to results_path as one batch; returns
+    (logical parity per shot, total simulated ns).  Pool workers log at
+    log_level, each to its own log_file.<pid>."""
+    starts = list(range(0, num_runs, batch_size))
+    shots = [min(batch_size, num_runs - start) for start in starts]
+    seed_seq = np.random.SeedSequence(seed)
+    seeds = [int(s.generate_state(1)[0]) for s in seed_seq.spawn(len(starts))]
+    workers = max(1, min(workers, len(starts)))
+    print(f"Shards        : {len(starts)} x {batch_size} shots on {workers} processes "
+          f"(base seed {seed_seq.entropy})")
+
+    parities = np.zeros(num_runs, dtype=np.uint8)
+    sim_time_ns = 0
+
+    def collect(start, shard):
+        nonlocal sim_time_ns
+        columns, shard_ns = shard
+        if columns:
+            parities[start:start + len(columns["logical_parity"])] = columns["logical_parity"]
+        if results_path:
+            append_results(results_path, columns)
+        sim_time_ns += shard_ns
+
+    if workers == 1:
+        for start, n_shots, shard_seed in zip(starts, shots, seeds):
+            collect(start, run_shard(*shard_args, n_shots, shard_seed, start))
+        return parities, sim_time_ns
+
+    for var in BLAS_THREAD_VARS:
+        os.environ.setdefault(var, "1")
+    # spawn, not fork: every worker starts from a clean NetSquid simulator state
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=configure_logging,
+                             initargs=(log_level, log_file, True)) as pool:
+        futures = {pool.submit(run_shard, *shard_args, n_shots, shard_seed, start): start
+                   for start, n_shots, shard_seed in zip(starts, shots, seeds)}
+        for future in as_completed(futures):
+            collect(futures[future], future.result())
+    return parities, sim_time_ns
+
+
+def run_shard(global_size, nodes_per_side, error, prob, osd_method, osd_order,
+              decode_workers, engine, region_size, num_rounds, decoder, window, num_runs, seed=None,
+              first_shot=0):
+    """Run num_runs shots in this process; returns (per-shot result columns, simulated ns).
+    The columns are documented in results.py.  region_size > 0 decodes with regional
+    coordinators over tiles of region_size × region_size nodes (netsquid engine only);
+    num_rounds=None keeps ClusterNodeProgram.NUM_ROUNDS and window=None its WINDOW
+    (detection layers per streamed message); decoder is one of CoordinatorProgram.DECODERS."""
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed % 2**32)
+        n.set_random_state(seed=seed % 2**32)
+
+    if engine == "pauli":
+        simulator = get_pauli_simulator(global_size, nodes_per_side, error, prob,
+                                        osd_method, osd_order, decode_workers, num_rounds, decoder,
+                                        window)
+        coordinator = simulator.coordinator
+        coordinators = [coordinator]
+    else:
+        cfg = get_network_config(nodes_per_side, region_size)
+        programs = get_programs(global_size, nodes_per_side, error, prob,
+                                osd_method, osd_order, decode_workers, region_size, num_rounds,
+                                decoder, window)
+        coordinator = programs["coordinator"]
+        coordinators = [p for p in programs.values() if isinstance(p, CoordinatorProgram)]
+
+    # The coordinators' thread / process pools do not outlive the shard
+    # (they are recreated on demand if this worker runs another one)
+    try:
+        if engine == "pauli":
+            simulator.rng = np.random.default_rng(seed)
+            simulator.run(num_runs)
+            sim_time_ns = 0
+        else:
+            # Step 5: Run the simulation
+            run_simulation(config=cfg, programs=programs, num_times=num_runs)
+            sim_time_ns = n.sim_time()
+    finally:
+        for program in coordinators:
+            program.close()
+
+    # The coordinator logs one record per shot; drain it for this shard
+    shot_log, coordinator.shot_log = coordinator.shot_log, []
+    columns = to_columns(shot_log, seed=-1 if seed is None else seed, error=error, prob=prob,
+                         distance=global_size, nodes_per_side=nodes_per_side, engine=engine,
+                         rounds=num_rounds or ClusterNodeProgram.NUM_ROUNDS, decoder=decoder,
+                         window=window or ClusterNodeProgram.WINDOW)
+    if columns:
+        columns["shot"] = first_shot + np.arange(len(shot_log))
+    return columns, sim_time_ns
+
+
+# ------------------------------------------------------------------ #
+#  Per-process caches: a worker that runs several shards of the same   #
+#  configuration builds its layout, network and programs only once.    #
+# ------------------------------------------------------------------ #
+@lru_cache(maxsize=None)
+def get_layout(global_size, nodes_per_side):
     # Step 1: Create the Surface Layout Manager
-    layout_manager = SurfaceLayout(global_size, nodes_per_side)
+    return SurfaceLayout(global_size, nodes_per_side)
 
-    # Step 2: Define node names - cluster nodes + coordinator
+
+@lru_cache(maxsize=None)
+def get_network_config(nodes_per_side, region_size=0):
+    # Step 2: Define node names - cluster nodes + (regional coordinators) + coordinator
     cluster_node_names = []
     for r in range(nodes_per_side):
         for c in range(nodes_per_side):
             cluster_node_names.append(f"node_{r}_{c}")
 
     coordinator_name = "coordinator"
-    all_node_names   = cluster_node_names + [coordinator_name]
+    region_names     = list(region_tiles(nodes_per_side, region_size)) if region_size else []
+    all_node_names   = cluster_node_names + region_names + [coordinator_name]
 
     # Step 3: Configure the network (complete graph: every node can reach every other)
     max_qubits_per_node = 1200
-    cfg = create_complete_graph_network(
+    return create_complete_graph_network(
         node_names=all_node_names,
         link_typ="perfect",
         link_cfg=PerfectQLinkConfig(state_delay=100),
@@ -47,58 +204,88 @@ def main(error, prob):
         qdevice_cfg=GenericQDeviceConfig.perfect_config(num_qubits=max_qubits_per_node)
     )
 
+
+def make_coordinator(global_size, nodes_per_side, osd_method, osd_order, decode_workers,
+                     decoder="osd", num_rounds=None, window=None):
+    return CoordinatorProgram(
+        layout_manager=get_layout(global_size, nodes_per_side),
+        osd_method=osd_method,
+        osd_order=osd_order,
+        decode_workers=decode_workers,
+        decoder=decoder,
+        num_rounds=num_rounds,
+        window=window,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_programs(global_size, nodes_per_side, error, prob, osd_method, osd_order, decode_workers,
+                 region_size=0, num_rounds=None, decoder="osd", window=None):
     # Step 4: Create programs for each cluster node and coordinator
+    layout_manager = get_layout(global_size, nodes_per_side)
+    coordinator_name = "coordinator"
     programs = {}
 
-    for r in range(nodes_per_side):
-        for c in range(nodes_per_side):
+    # Tiered mode: every node reports to the regional coordinator of its tile
+    if region_size:
+        tiles = region_tiles(nodes_per_side, region_size)
+    else:
+        tiles = {coordinator_name: [(r, c) for r in range(nodes_per_side) for c in range(nodes_per_side)]}
+
+    for region_name, node_ids in tiles.items():
+        for r, c in node_ids:
             node_id = f"node_{r}_{c}"
             programs[node_id] = ClusterNodeProgram(
                 node_coords=(r, c),
                 layout_manager=layout_manager,
-                coordinator_name=coordinator_name,
+                coordinator_name=region_name,
                 error = error,
-                prob = prob
+                prob = prob,
+                num_rounds = num_rounds,
+                window = window
             )
 
-    programs[coordinator_name] = CoordinatorProgram(
-        layout_manager=layout_manager,
+    if region_size:
+        decoder_kwargs = dict(osd_method=osd_method, osd_order=osd_order,
+                              decode_workers=decode_workers, decoder=decoder,
+                              num_rounds=num_rounds, window=window)
+        for region_name, node_ids in tiles.items():
+            programs[region_name] = RegionalCoordinatorProgram(
+                layout_manager, region_name, node_ids, coordinator_name, **decoder_kwargs)
+        programs[coordinator_name] = TopCoordinatorProgram(layout_manager, tiles, **decoder_kwargs)
+    else:
+        programs[coordinator_name] = make_coordinator(global_size, nodes_per_side,
+                                                      osd_method, osd_order, decode_workers, decoder,
+                                                      num_rounds, window)
+    return programs
+
+
+@lru_cache(maxsize=None)
+def get_pauli_simulator(global_size, nodes_per_side, error, prob, osd_method, osd_order,
+                        decode_workers, num_rounds=None, decoder="osd", window=None):
+    return PauliFrameSimulator(
+        get_layout(global_size, nodes_per_side), error, prob,
+        coordinator=make_coordinator(global_size, nodes_per_side,
+                                     osd_method, osd_order, decode_workers, decoder,
+                                     num_rounds, window),
+        num_rounds=num_rounds,
     )
 
-    # Step 5: Run the simulation
-    num_runs = 1000
-    print("Running Distributed Surface Code simulation...")
-    print(f"Global grid   : {global_size}x{global_size} qubits")
-    print(f"Cluster nodes : {len(cluster_node_names)} nodes ")
-    print(f"Decoder       : local SVD compression + global OSD at coordinator")
 
-    try:
-        results = run_simulation(config=cfg, programs=programs, num_times=num_runs)
-
-        parities = []
-        for node_results in results:
-            for res in node_results:
-                if isinstance(res, tuple) and len(res) == 2:
-                    parities.append(res[0])
-                elif isinstance(res, int):
-                    parities.append(res)
-                    
-        # Calculate statistics
-        failures = sum(parities)                # Every 1 is a failure
-        successes = num_runs - failures         # The rest are successes
-        accuracy = (successes / num_runs) * 100 # Calculate percentage
-        
-        print(f"SIMULATION COMPLETE ({num_runs} runs)")
-        print(f"Failures (Logical Error) : {failures}")
-        print(f" Successes: {successes}")
-        print(f"Accuracy: {accuracy:.2f}%")
 
-    except Exception as e:
-        print(f"\nError: {e}")
-        traceback.print_exc()
+def print_summary(parities, num_runs):
+    # Calculate statistics
+    failures = int(np.sum(parities))           # Every 1 is a failure
+    successes = num_runs - failures             # The rest are successes
+    accuracy = (successes / num_runs) * 100     # Calculate percentage
 
+    print(f"SIMULATION COMPLETE ({num_runs} runs)")
+    print(f"Failures (Logical Error) : {failures}")
+    print(f" Successes: {successes}")
+    print(f"Accuracy: {accuracy:.2f}%")
 
-if __name__ == "__main__":
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-e", "--error", 
@@ -113,11 +300,117 @@ if __name__ == "__main__":
         default=0.01,
         help="Error probability (default: %(default)s)"
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--decoder",
+        type=str,
+        default="osd",
+        choices=CoordinatorProgram.DECODERS,
+        help="Coordinator backend: osd (SVD + OSD), uf (Union-Find) or matching "
+             "(minimum-weight perfect matching, needs networkx) (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--osd-method",
+        type=str,
+        default="exhaustive",
+        choices=["exhaustive", "cs"],
+        help="OSD search: exhaustive (OSD-E) or combination sweep (OSD-CS) (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--osd-order",
+        type=int,
+        default=2,
+        help="Number of least-reliable non-pivot columns searched by OSD (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--decode-workers",
+        type=int,
+        default=1,
+        help="Worker processes for block-wise OSD at the coordinator (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default="netsquid",
+        choices=["netsquid", "pauli"],
+        help="netsquid: full quantum simulation; pauli: bit-packed Pauli-frame Monte Carlo (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-n", "--shots",
+        type=int,
+        default=1000,
+        help="Number of simulated shots (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=1,
+        help="Processes the shots are split across, e.g. $SLURM_CPUS_PER_TASK (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Base seed; each worker derives an independent seed from it (default: random)"
+    )
+    parser.add_argument(
+        "-o", "--results",
+        type=str,
+        default=None,
+        help="Per-shot results file, appended in batches (see results.py)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Shots per shard / results batch (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="warning",
+        choices=LOG_LEVELS,
+        help="warning: quiet; info: one line per shot; debug: syndromes, noise and corrections (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--log-file",
+        type=str,
+        default=None,
+        help="Also log to this file, size-rotated and gzip-compressed"
+    )
+    parser.add_argument(
+        "--region-size",
+        type=int,
+        default=0,
+        help="Decode with one regional coordinator per tile of N x N nodes, "
+             "residuals at the top coordinator; 0: single coordinator (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-r", "--rounds",
+        type=int,
+        default=None,
+        help="Stabilizer rounds per shot, e.g. the code distance for a memory experiment "
+             f"(default: {ClusterNodeProgram.NUM_ROUNDS})"
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=None,
+        help="Detection layers each node streams to its coordinator per message "
+             f"(default: {ClusterNodeProgram.WINDOW}, i.e. every round as soon as it is measured)"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    configure_logging(args.log_level, args.log_file)
     #with open('output.txt', 'w') as f:
     #    with redirect_stdout(f):
-    main(args.error, args.prob)
-    sim_time_ns = n.sim_time()
-    sim_time_ms = sim_time_ns/1_000_000
+    sim_time_ns = main(args.error, args.prob, args.osd_method, args.osd_order,
+                       args.decode_workers, args.engine, args.shots, args.workers, args.seed,
+                       args.results, args.batch_size, args.log_level, args.log_file,
+                       args.region_size, args.rounds, args.decoder, args.window)
+    if sim_time_ns:
+        sim_time_ms = sim_time_ns/1_000_000
 
-    print(f"Execution time: {sim_time_ms} ms")
\ No newline at end of file
+        print(f"Execution time: {sim_time_ms} ms")
\ No newline at end of file
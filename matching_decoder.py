@@ -0,0 +1,145 @@
+"""
+Minimum-weight perfect matching decoder over a detector graph
+The graph is built once from a graph-like parity-check matrix (every
+column in at most two checks): detectors are the checks, one per round,
+and every column is a space-like edge, repeated in each round.  Columns
+with a single check end on one shared boundary vertex, and for
+num_rounds > 1 a time-like edge joins every detector to itself in the
+next round (a measurement error, no data correction).
+
+A window of a longer stream is decoded with an open top (open_top=True):
+its last-round detectors also get a time-like edge to the boundary, the
+rounds still to come.  A defect matched through it is not resolved in this
+window but carried: decode_window returns it, to be XORed into the first
+round of the next window.
+
+Per shot only the active detectors (defects) are matched:
+  - a BFS from every defect, cut off once no pairing can beat sending
+    both defects to the boundary, gives the defect-defect distances
+  - every defect also gets a private boundary copy at its (precomputed)
+    boundary distance, boundary copies pair with each other for free
+  - a blossom minimum-weight perfect matching (networkx) over this small
+    graph pairs the defects, and the correction is the XOR of the
+    space-like edges on the shortest paths of the matched pairs
+The matching graph has the size of the syndrome, not of the code.
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+try:
+    import networkx as nx
+except ImportError:  # optional: only the matching backend needs it
+    nx = None
+
+HAVE_NETWORKX = nx is not None
+
+
+class MatchingDecoder:
+    FUTURE = -2  # edge_column of a last-round detector's edge to the boundary (open top)
+
+    def __init__(self, H, num_rounds: int = 1, open_top: bool = False):
+        """H: (m, n) binary parity-check matrix, every column in at most two
+        checks; num_rounds: detector layers joined by time-like edges;
+        open_top: the last layer continues in a later window."""
+        if nx is None:
+            raise ImportError("MatchingDecoder needs networkx (pip install networkx)")
+        H = sparse.csc_matrix(H)
+        H.sum_duplicates()
+        H.data %= 2
+        H.eliminate_zeros()
+        self.m, self.n = H.shape
+        self.num_rounds = num_rounds
+        self.open_top = open_top
+        if np.any(np.diff(H.indptr) > 2):
+            raise ValueError("Matching needs a graph-like H (every column in at most two checks)")
+
+        # Vertex t * m + i is check i in round t; the last vertex is the boundary
+        self.boundary = self.m * num_rounds
+        edge_column = {}  # (u, v) with u < v → column of H, -1 for a time-like edge
+        for j in range(self.n):
+            rows = H.indices[H.indptr[j]:H.indptr[j + 1]].tolist()
+            if not rows:
+                continue
+            for t in range(num_rounds):
+                u = t * self.m + rows[0]
+                v = t * self.m + rows[1] if len(rows) == 2 else self.boundary
+                edge_column.setdefault((min(u, v), max(u, v)), j)
+        for t in range(num_rounds - 1):
+            for i in range(self.m):
+                edge_column[(t * self.m + i, (t + 1) * self.m + i)] = -1
+        if open_top:
+            # A boundary column already on that pair wins: both have weight 1
+            for i in range(self.m):
+                edge_column.setdefault(((num_rounds - 1) * self.m + i, self.boundary), self.FUTURE)
+        self.edge_column = edge_column
+
+        ends = np.array(list(edge_column), dtype=int).reshape(-1, 2)
+        u, v = ends[:, 0], ends[:, 1]
+        n_vertices = self.boundary + 1
+        self.adjacency = sparse.csr_matrix(
+            (np.ones(2 * len(u)), (np.concatenate([u, v]), np.concatenate([v, u]))),
+            shape=(n_vertices, n_vertices),
+        )
+        # Boundary distance and path of every detector, shared by all shots
+        self.boundary_dist, self.boundary_pred = csgraph.dijkstra(
+            self.adjacency, directed=False, indices=self.boundary,
+            return_predecessors=True, unweighted=True,
+        )
+
+    def decode(self, events: np.ndarray) -> np.ndarray:
+        """Correction e (uint8, length n) from the detection events, a
+        length-m syndrome or (num_rounds, m) events, round by round."""
+        return self.decode_window(events)[0]
+
+    def decode_window(self, events: np.ndarray) -> tuple:
+        """(e, carry): the correction of decode and the length-m detection
+        events carried into the next window (all zero unless open_top)."""
+        e = np.zeros(self.n, dtype=np.uint8)
+        carry = np.zeros(self.m, dtype=np.uint8)
+        defects = np.flatnonzero(np.asarray(events).reshape(-1) % 2)
+        if len(defects) == 0:
+            return e, carry
+
+        to_boundary = self.boundary_dist[defects]
+        reachable = to_boundary[np.isfinite(to_boundary)]
+        limit = 2 * reachable.max() if len(reachable) == len(defects) else np.inf
+        dist, pred = csgraph.dijkstra(
+            self.adjacency, directed=False, indices=defects,
+            return_predecessors=True, unweighted=True, limit=limit,
+        )
+
+        # Defects 0..k-1, boundary copies k..2k-1
+        k = len(defects)
+        G = nx.Graph()
+        for a in range(k):
+            if np.isfinite(to_boundary[a]):
+                G.add_edge(a, k + a, weight=to_boundary[a])
+            for b in range(a + 1, k):
+                d = dist[a, defects[b]]
+                if np.isfinite(d) and d <= to_boundary[a] + to_boundary[b]:
+                    G.add_edge(a, b, weight=d)
+                G.add_edge(k + a, k + b, weight=0)
+
+        for a, b in nx.min_weight_matching(G):
+            a, b = min(a, b), max(a, b)
+            if a >= k:
+                continue  # two boundary copies
+            if b >= k:
+                self._flip_path(e, carry, self.boundary_pred, defects[a], self.boundary)
+            else:
+                self._flip_path(e, carry, pred[a], defects[b], defects[a])
+        return e, carry
+
+    # XOR the space-like edges on the shortest path from v back to source,
+    # and carry the last-round detector of an edge into the next window
+    def _flip_path(self, e: np.ndarray, carry: np.ndarray, pred: np.ndarray, v: int, source: int):
+        while v != source:
+            w = pred[v]
+            j = self.edge_column[(min(v, w), max(v, w))]
+            if j >= 0:
+                e[j] ^= 1
+            elif j == self.FUTURE:
+                carry[min(v, w) % self.m] ^= 1
+            v = w
@@ -0,0 +1,77 @@
+"""
+OSD test-pattern search
+After the systematic form is known, every OSD candidate is fixed by the
+values it gives to a few "test" (non-pivot) columns: the pivot bits then
+follow as  e_piv = s_sys + H_sys[piv_rows, test_cols] @ e_test  (mod 2).
+Instead of looping over patterns, all candidates are stacked into one
+matrix and evaluated with a single matrix product.
+
+Search modes
+------------
+  exhaustive : all 2**order patterns over the `order` test columns (OSD-E)
+  cs         : combination sweep (OSD-CS) — the zero pattern, a single
+               flip of every non-pivot column, and every weight-2 pattern
+               over the `order` most reliable of them, which keeps large
+               orders affordable
+Both are truncated to `max_candidates` rows (weight-1 patterns first).
+"""
+
+import numpy as np
+
+OSD_METHODS = ("exhaustive", "cs")
+
+
+def search_columns(non_pivot: list, order: int, method: str = "exhaustive") -> list:
+    """Test columns of a search, from the non-pivot columns in search order:
+    the first `order` for OSD-E, all of them for OSD-CS."""
+    return list(non_pivot) if method == "cs" else list(non_pivot[:order])
+
+
+def candidate_patterns(n_test: int, method: str = "exhaustive",
+                       max_candidates: int = 4096, order: int = None) -> np.ndarray:
+    """Candidate assignments of the test columns, one per row (uint8).
+    In cs mode the weight-2 pairs only use the first `order` test columns
+    (all of them if order is None)."""
+    if method == "exhaustive":
+        n_patterns = min(2 ** n_test, max_candidates)
+        ints = np.arange(n_patterns, dtype=np.int64)
+        # bit b of the pattern index drives test column b
+        patterns = (ints[:, None] >> np.arange(n_test, dtype=np.int64)) & 1
+        return patterns.astype(np.uint8)
+
+    if method == "cs":
+        n_pairs = n_test if order is None else min(order, n_test)
+        i, j = np.triu_indices(n_pairs, k=1)
+        weight2 = np.zeros((len(i), n_test), dtype=np.uint8)
+        weight2[np.arange(len(i)), i] = 1
+        weight2[np.arange(len(i)), j] = 1
+        patterns = np.vstack([
+            np.zeros((1, n_test), dtype=np.uint8),
+            np.eye(n_test, dtype=np.uint8),
+            weight2,
+        ])
+        return patterns[:max_candidates]
+
+    raise ValueError(f"Unknown OSD method '{method}' (expected one of {OSD_METHODS})")
+
+
+def best_pattern(A: np.ndarray, s_piv: np.ndarray, w_piv: np.ndarray,
+                 w_test: np.ndarray, patterns: np.ndarray) -> tuple:
+    """
+    Evaluate all candidates at once and return the cheapest one.
+
+    Parameters
+    ----------
+    A        : (rank, n_test) systematic block H_sys[piv_rows][:, test_cols]
+    s_piv    : (rank,) reduced syndrome on the pivot rows
+    w_piv    : (rank,) cost of setting each pivot column
+    w_test   : (n_test,) cost of setting each test column
+    patterns : (n_candidates, n_test) candidate test assignments
+
+    Returns (pattern, e_piv) of the first candidate with minimum cost.
+    """
+    P = patterns.astype(np.int64)
+    E_piv = (s_piv[None, :].astype(np.int64) + P @ A.T.astype(np.int64)) % 2
+    cost = E_piv @ w_piv + P @ w_test
+    best = int(np.argmin(cost))
+    return patterns[best].astype(int), E_piv[best].astype(int)
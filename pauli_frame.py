@@ -0,0 +1,343 @@
+"""
+Pauli-frame Monte Carlo engine
+Classical stand-in for the NetSquid run of ClusterNodeProgram: the circuit
+the nodes build (num_rounds stabilizer rounds of zQ then xQ sub-rounds, TeleGate
+borders with their feed-forward corrections, and the identity / hadamard /
+initialization / readout / cnot noise channels) is replayed as a list of
+Clifford operations on Pauli frames instead of quantum states.
+
+Every qubit carries an X-frame and a Z-frame bit per shot, packed 64 shots
+to a uint64 word, so each gate is one XOR / swap over a row of words:
+  CNOT(c, t) : x_t ^= x_c,  z_c ^= z_t
+  H(q)       : swap x_q, z_q
+  measure Z  : outcome flipped w.r.t. the noiseless reference iff x_q
+A measured bit that is fed forward (X^m / Z^m in the TeleGate) toggles the
+frame of its target by the flip of m.
+
+Outcomes are deviations from the noiseless reference run.  The nodes only
+use the per-round detection events (syndrome_stream.py) and the logical-Z
+readout of a |0…0⟩ start, both deterministic in the reference, so they
+match the NetSquid path shot for shot in distribution.  The detection
+layers are then streamed to the coordinator window by window and decoded
+by the real node BP/SVD and coordinator code.
+"""
+
+import time
+
+import numpy as np
+
+from coordinator import CoordinatorProgram
+from dis_surface_mesure import ClusterNodeProgram
+from surface_code import XQ, ZQ
+
+WORD_BITS = 64
+NOISE_TYPES = ("identity", "hadamard", "initialization", "readout", "cnot")
+
+
+class PauliFrameSimulator:
+    def __init__(self, layout_manager, error: str, prob: float,
+                 coordinator: CoordinatorProgram = None, seed: int = None, num_rounds: int = None):
+        self.layout_manager = layout_manager
+        self.error = error
+        self.prob = prob
+        self.num_rounds = ClusterNodeProgram.NUM_ROUNDS if num_rounds is None else num_rounds
+        self.errors = set(NOISE_TYPES) if error == "all" else {error}
+        self.rng = np.random.default_rng(seed)
+
+        G = layout_manager.global_size
+        N = layout_manager.nodes_per_side
+        self.n_grid = G * G  # qubit g = r * G + c of the global grid
+        self.epr = (self.n_grid, self.n_grid + 1)  # scratch EPR halves (ancilla side, data side)
+        self.n_qubits = self.n_grid + 2
+
+        # The real decoders: one node program per node, one coordinator
+        self.nodes = {
+            (r, c): ClusterNodeProgram((r, c), layout_manager, error, prob, num_rounds=self.num_rounds)
+            for r in range(N) for c in range(N)
+        }
+        self.coordinator = coordinator or CoordinatorProgram(layout_manager)
+
+        self.cnot_count = 0
+        self.schedule = self._build_schedule()
+        self._index_decoding()
+
+    # ------------------------------------------------------------------ #
+    #  Circuit schedule                                                    #
+    # ------------------------------------------------------------------ #
+    def _build_schedule(self) -> list:
+        """Flatten the node programs into one op list, in an order that keeps
+        every qubit's gates in its own node's program order."""
+        ops = []
+        for round_idx in range(self.num_rounds):
+            noisy = round_idx >= 1  # as in the node programs, the first round is noiseless
+            if noisy:
+                self._schedule_data_noise(ops)
+            for role in ("zQ", "xQ"):
+                self._schedule_subround(ops, role, round_idx, noisy)
+        self.cnot_count = sum(op[0] in ("cx", "cx_noisy") for op in ops)
+        return ops
+
+    def _schedule_data_noise(self, ops: list):
+        for grid in self._grids():
+            for g in self._global_index(grid, grid.data_idx):
+                if "identity" in self.errors:
+                    ops.append(("x_noise", g))
+                if "hadamard" in self.errors:
+                    # Two noisy H gates: net identity, each one may add a random Pauli
+                    ops += [("h", g), ("depol", g), ("h", g), ("depol", g)]
+
+    def _schedule_subround(self, ops: list, role: str, round_idx: int, noisy: bool):
+        code = XQ if role == "xQ" else ZQ
+        cnot = "cx_noisy" if noisy and "cnot" in self.errors else "cx"
+
+        # a) fresh ancillas, b) local CNOTs with the neighbouring data qubits
+        for grid in self._grids():
+            anc_idx = grid.xq_idx if role == "xQ" else grid.zq_idx
+            for a in self._global_index(grid, anc_idx):
+                ops.append(("reset", a))
+                if noisy and "initialization" in self.errors:
+                    ops.append(("x_noise", a))
+                if role == "xQ":
+                    ops.append(("h", a))
+            table = grid.stab_neighbors[code]
+            for a, row in zip(self._global_index(grid, anc_idx), table):
+                for flat in row[row >= 0]:
+                    d = int(self._global_index(grid, [flat])[0])
+                    ops.append((cnot, a, d) if role == "xQ" else (cnot, d, a))
+
+        # c) TeleGate borders
+        for anc, data in self._border_pairs(role):
+            ops += self._telegate(anc, data, role, cnot)
+
+        # d) measurement (readout noise flips the recorded bit)
+        meas = "meas_noisy" if noisy and "readout" in self.errors else "meas"
+        for grid in self._grids():
+            anc_idx = grid.xq_idx if role == "xQ" else grid.zq_idx
+            for a in self._global_index(grid, anc_idx):
+                if role == "xQ":
+                    ops.append(("h", a))
+                ops.append((meas, a, (round_idx, a)))
+
+    def _telegate(self, anc: int, data: int, role: str, cnot: str) -> list:
+        """Ops of one non-local CNOT, byproduct corrections included."""
+        eA, eB = self.epr
+        ops = [("reset", eA), ("reset", eB)]  # fresh |Φ+⟩: no frame
+        if role == "xQ":
+            # CNOT(anc → data): Cat-Ent on the ancilla side, Cat-DisEnt back onto it
+            ops += [(cnot, anc, eA), ("meas", eA, "m_A"), ("ff_x", eB, "m_A"),
+                    (cnot, eB, data), ("h", eB), ("meas", eB, "m_B"), ("ff_z", anc, "m_B")]
+        else:
+            # CNOT(data → anc): Cat-Ent on the data side, Cat-DisEnt back onto it
+            ops += [(cnot, data, eB), ("meas", eB, "m_B"), ("ff_x", eA, "m_B"),
+                    (cnot, eA, anc), ("h", eA), ("meas", eA, "m_A"), ("ff_z", data, "m_A")]
+        return ops
+
+    def _border_pairs(self, role: str) -> list:
+        """(ancilla, data) global indices of every border interaction of one
+        stabilizer type: vertical node borders left to right, then horizontal
+        ones top to bottom, positions in order — the order each node runs its
+        own borders in _teleported_cnot_borders."""
+        G = self.layout_manager.global_size
+        N = self.layout_manager.nodes_per_side
+        pairs = []
+        for axis in ("col", "row"):
+            for line in range(N - 1):
+                for other in range(N):
+                    # Node on the left of / above the border; its neighbour owns the next cells
+                    a_node = (other, line) if axis == "col" else (line, other)
+                    grid_a = self.layout_manager.get_node_grid(*a_node)
+                    rows, cols = grid_a.shape
+                    r0, c0 = grid_a.origin
+                    if axis == "col":
+                        cells = [((r0 + i, c0 + cols - 1), (r0 + i, c0 + cols)) for i in range(rows)]
+                    else:
+                        cells = [((r0 + rows - 1, c0 + i), (r0 + rows, c0 + i)) for i in range(cols)]
+                    for pos_a, pos_b in cells:
+                        role_a = self.layout_manager.get_qubit_role(*pos_a)
+                        role_b = self.layout_manager.get_qubit_role(*pos_b)
+                        if role_a == role and role_b == "pQ":
+                            pairs.append((pos_a[0] * G + pos_a[1], pos_b[0] * G + pos_b[1]))
+                        elif role_a == "pQ" and role_b == role:
+                            pairs.append((pos_b[0] * G + pos_b[1], pos_a[0] * G + pos_a[1]))
+        return pairs
+
+    def _grids(self):
+        N = self.layout_manager.nodes_per_side
+        return [self.layout_manager.get_node_grid(r, c) for r in range(N) for c in range(N)]
+
+    def _global_index(self, grid, flat_idx) -> np.ndarray:
+        G = self.layout_manager.global_size
+        flat_idx = np.asarray(flat_idx, dtype=int)
+        return grid.global_rows.ravel()[flat_idx] * G + grid.global_cols.ravel()[flat_idx]
+
+    # ------------------------------------------------------------------ #
+    #  Frame propagation                                                   #
+    # ------------------------------------------------------------------ #
+    def sample(self, n_shots: int) -> tuple:
+        """
+        Run the schedule for n_shots at once.
+
+        Returns
+        -------
+        detection     : (n_shots, num_rounds - 1, n_anc) uint8 detection
+                        events, one layer per round after the reference,
+                        columns in self.ancillas order
+        logical_frame : (n_shots,) uint8 logical-Z readout before decoding
+        """
+        n_words = -(-n_shots // WORD_BITS)
+        X = np.zeros((self.n_qubits, n_words), dtype=np.uint64)
+        Z = np.zeros((self.n_qubits, n_words), dtype=np.uint64)
+        records = {}
+        # Ancilla records become a detection layer and are dropped once the
+        # next round is in
+        events = np.zeros((self.num_rounds - 1, len(self.ancillas), n_words), dtype=np.uint64)
+
+        for op in self.schedule:
+            kind = op[0]
+            if kind == "cx" or kind == "cx_noisy":
+                c, t = op[1], op[2]
+                X[t] ^= X[c]
+                Z[c] ^= Z[t]
+                if kind == "cx_noisy":
+                    # With prob. p each of the two qubits gets a uniform {I, X, Y, Z}:
+                    # independent fair X and Z bits under a shared Bernoulli mask
+                    hit = self._bernoulli(self.prob, n_shots)
+                    for q in (c, t):
+                        X[q] ^= hit & self._bernoulli(0.5, n_shots)
+                        Z[q] ^= hit & self._bernoulli(0.5, n_shots)
+            elif kind == "h":
+                q = op[1]
+                X[q], Z[q] = Z[q].copy(), X[q].copy()
+            elif kind == "reset":
+                X[op[1]] = 0
+                Z[op[1]] = 0
+            elif kind == "meas" or kind == "meas_noisy":
+                flip = X[op[1]].copy()
+                if kind == "meas_noisy":
+                    flip ^= self._bernoulli(self.prob, n_shots)
+                records[op[2]] = flip
+                if isinstance(op[2], tuple) and op[2][0] > 0:
+                    round_idx, anc = op[2]
+                    events[round_idx - 1, self.ancilla_column[anc]] = flip ^ records.pop((round_idx - 1, anc))
+            elif kind == "ff_x":
+                X[op[1]] ^= records[op[2]]
+            elif kind == "ff_z":
+                Z[op[1]] ^= records[op[2]]
+            elif kind == "x_noise":
+                X[op[1]] ^= self._bernoulli(self.prob, n_shots)
+            elif kind == "depol":
+                # X, Y or Z with equal probability
+                hit = self._unpacked_bernoulli(self.prob, n_shots)
+                pauli = self.rng.integers(0, 3, n_shots)
+                X[op[1]] ^= self._pack(hit & (pauli != 2))
+                Z[op[1]] ^= self._pack(hit & (pauli != 0))
+
+        logical = np.bitwise_xor.reduce(X[self.logical_support], axis=0)
+        return self._unpack(events, n_shots).transpose(2, 0, 1), self._unpack(logical[None, :], n_shots)[0]
+
+    def _unpacked_bernoulli(self, p: float, n_shots: int) -> np.ndarray:
+        return self.rng.random(n_shots) < p
+
+    def _bernoulli(self, p: float, n_shots: int) -> np.ndarray:
+        return self._pack(self._unpacked_bernoulli(p, n_shots))
+
+    @staticmethod
+    def _pack(bits: np.ndarray) -> np.ndarray:
+        n_words = -(-len(bits) // WORD_BITS)
+        packed = np.zeros(n_words * 8, dtype=np.uint8)
+        packed[: -(-len(bits) // 8)] = np.packbits(bits, bitorder="little")
+        return packed.view("<u8").astype(np.uint64)
+
+    @staticmethod
+    def _unpack(words: np.ndarray, n_shots: int) -> np.ndarray:
+        words = np.ascontiguousarray(words, dtype="<u8")
+        bits = np.unpackbits(words.view(np.uint8), axis=-1, bitorder="little")
+        return bits[..., :n_shots]
+
+    # ------------------------------------------------------------------ #
+    #  Decoding with the real node / coordinator decoders                  #
+    # ------------------------------------------------------------------ #
+    def _index_decoding(self):
+        """Column layout of the detection matrix and the logical-Z support."""
+        G = self.layout_manager.global_size
+        self.ancillas = []  # global index of every ancilla, node by node (detection columns)
+        self.node_zq = {}  # node → (ancilla count, anc_slot of its zQ ancillas, their detection columns)
+        self.node_row0 = {}  # node → mask of its data qubits on global row 0
+        self.node_checks = {}  # node → (H_Z, detection column of each of its rows)
+        for node_id, node in self.nodes.items():
+            grid = self.layout_manager.get_node_grid(*node_id)
+            is_zq = grid.roles.ravel()[grid.anc_idx] == ZQ
+            columns = len(self.ancillas) + np.flatnonzero(is_zq)
+            self.node_checks[node_id] = (node._local_structure()[0], len(self.ancillas) + grid.check_slots(ZQ))
+            self.ancillas += self._global_index(grid, grid.anc_idx).tolist()
+            self.node_zq[node_id] = (len(grid.anc_idx), np.flatnonzero(is_zq), columns)
+            self.node_row0[node_id] = grid.global_rows.ravel()[grid.data_idx] == 0
+        self.ancilla_column = {a: i for i, a in enumerate(self.ancillas)}
+
+        # Logical Z: Z-string along global row 0 (see ClusterNodeProgram._send_logical_parity)
+        self.logical_support = [c for c in range(G) if self.layout_manager.get_qubit_role(0, c) == "pQ"]
+        self.zq_columns = np.concatenate([cols for _, _, cols in self.node_zq.values()])
+
+    def decode(self, detection: np.ndarray, logical_frame: np.ndarray) -> np.ndarray:
+        """
+        Logical-Z outcome after decoding, per shot (1 = logical error).
+
+        The logical-Z readout only sees X errors, so only the X sector
+        (zQ detection events → H_Z) goes through BP/SVD/OSD; shots without
+        any zQ detection event keep their undecoded outcome.  The layers of
+        a shot reach the coordinator in windows of coordinator.window, as
+        _recv_windows would hand them over, and matching streams the X sector
+        only.  The per-node layers and the local BP on their XOR are built
+        for all busy shots at once.  Every shot is logged to
+        coordinator.shot_log like a NetSquid shot.
+        """
+        logical = logical_frame.astype(np.uint8).copy()
+        busy = np.flatnonzero(detection[:, :, self.zq_columns].any(axis=(1, 2)))
+        n_layers, window = detection.shape[1], self.coordinator.window
+
+        # Per node, over the busy shots: the zQ layers, and the local BP of their XOR
+        det = detection[busy]
+        folded = np.bitwise_xor.reduce(det, axis=1)
+        local = {}
+        for node_id, node in self.nodes.items():
+            n_anc, slots, columns = self.node_zq[node_id]
+            layers = np.zeros((len(busy), n_layers, n_anc), dtype=np.uint8)
+            layers[:, :, slots] = det[:, :, columns]
+            H_Z, columns = self.node_checks[node_id]
+            S = folded[:, columns]
+            E = np.zeros((len(busy), H_Z.shape[1]), dtype=int)
+            hit = np.flatnonzero(S.any(axis=1))
+            if H_Z.nnz and len(hit):
+                E[hit] = node._bp_local_batch(H_Z, S[hit])[0]
+            local[node_id] = (layers, S, E)
+
+        busy_index = np.full(len(logical), -1)
+        busy_index[busy] = np.arange(len(busy))
+        for shot in range(len(logical)):
+            payloads_X, merged, t_start = [], {}, time.time()
+            j = busy_index[shot]
+            if j >= 0:
+                for node_id, node in self.nodes.items():
+                    _, S, E = local[node_id]
+                    payloads_X.append(node._sector_payload(self.node_checks[node_id][0], S[j], "X",
+                                                           node.ENERGY_THRESHOLD, e_bp=E[j]))
+                for start in range(0, n_layers, window):
+                    self.coordinator._absorb_window(
+                        {node_id: l[0][j, start:start + window] for node_id, l in local.items()},
+                        last=start + window >= n_layers, sectors=("X",))
+
+                corrections = self.coordinator._decode_sector(payloads_X, "X")
+                merged = self.coordinator._merge_corrections(payloads_X, corrections)
+                for node_id, mask in merged.items():
+                    logical[shot] ^= int(np.count_nonzero(mask & self.node_row0[node_id]) % 2)
+            self.coordinator.shot_log.append(self.coordinator._shot_record(
+                payloads_X, [], merged, {}, logical[shot], self.cnot_count, time.time() - t_start))
+        return logical
+
+    def run(self, n_shots: int, batch_size: int = 1 << 16) -> np.ndarray:
+        """Sample and decode n_shots; returns the per-shot logical failures."""
+        failures = []
+        for start in range(0, n_shots, batch_size):
+            n = min(batch_size, n_shots - start)
+            failures.append(self.decode(*self.sample(n)))
+        return np.concatenate(failures) if failures else np.zeros(0, dtype=np.uint8)
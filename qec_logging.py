@@ -0,0 +1,72 @@
+"""
+Leveled logging for the node and coordinator programs
+Every module logs through a child of the "qec" logger (get_logger("node"),
+get_logger("coordinator"), ...) with %-style arguments, so a message below
+the configured level is dropped before it is ever formatted.  Messages
+whose arguments are costly to build (sorted correction lists, syndrome
+dicts) are additionally guarded with log.isEnabledFor(...).
+
+    warning : quiet production mode, only anomalies (default)
+    info    : one summary per shot (logical parity, CNOT count, decoding time)
+    debug   : per-round syndromes, injected noise, SVD ranks, corrections
+
+configure_logging can also attach a size-rotated, gzip-compressed file
+sink for debugging runs (log_file, log_file.1.gz, log_file.2.gz, ...).
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import sys
+from logging.handlers import RotatingFileHandler
+
+LOGGER_NAME = "qec"
+LOG_LEVELS = ("debug", "info", "warning", "error")
+LOG_MAX_BYTES = 64 * 1024 * 1024  # size of the active log file before rotation
+LOG_BACKUPS = 10                  # compressed rotated files kept
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class GzipRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler whose rotated files are gzip-compressed."""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._gzip_rotate
+
+    @staticmethod
+    def _gzip_rotate(source, dest):
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+def configure_logging(level: str = "warning", log_file: str = None, per_process: bool = False):
+    """Set the level of the "qec" loggers and install the console (and
+    optional file) handlers.  per_process=True gives every process its own
+    log file (log_file.<pid>), for pool workers that would otherwise rotate
+    the same file concurrently."""
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(getattr(logging, level.upper()))
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(console)
+
+    if log_file:
+        if per_process:
+            log_file = f"{log_file}.{os.getpid()}"
+        sink = GzipRotatingFileHandler(log_file)
+        sink.setFormatter(logging.Formatter(
+            "%(asctime)s %(processName)s %(name)s %(levelname)s %(message)s"))
+        logger.addHandler(sink)
+    return logger
@@ -0,0 +1,360 @@
+"""
+Tiered decoding: regional coordinators under one top-level coordinator
+The node grid is cut into square tiles of region_size × region_size nodes.
+Every tile has its own RegionalCoordinatorProgram, which plays the part of
+the coordinator for its nodes: it decodes both sectors of the tile (the
+same block-wise OSD as CoordinatorProgram) and sends the corrections back.
+
+A region decodes its nodes' systems node by node, so a chain of errors
+that crosses a node border can be left half explained, and a check on a
+tile border has data qubits in two tiles: no region sees it whole.  After
+its decode a region checks its merged correction against the tile's check
+matrix and escalates every node with an unsatisfied row, or whose
+correction touches a data qubit checked on another tile.  The
+TopCoordinatorProgram decodes the escalated nodes of all regions together
+on the layout's check matrix, with the tile-border checks whole, and
+returns their new corrections.  A sector without escalated nodes never
+waits for the top level.
+
+Per shot, between a region and the top coordinator:
+
+    region → top : for X then Z, {error_type, n_residual} + n_residual escalated nodes
+                   ({node_id, n_data, corrections, residual of its rows on the tile})
+    top → region : {error_type, corrections, t_tot}, only if n_residual > 0
+    region → top : tile summary (per-node record fields, parity, CNOT count, time)
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import gf2
+import wire
+from coordinator import CoordinatorProgram
+from matching_decoder import MatchingDecoder
+from qec_logging import get_logger
+from surface_code import NEIGHBOR_OFFSETS
+from uf_decoder import UnionFindDecoder
+
+from squidasm.sim.stack.program import ProgramContext, ProgramMeta
+
+log = get_logger("coordinator")
+
+
+def region_tiles(nodes_per_side: int, region_size: int) -> dict:
+    """{region name: [node ids]} for tiles of region_size × region_size nodes
+    (the tiles on the last row / column are smaller if the size does not divide)."""
+    tiles = {}
+    for r in range(nodes_per_side):
+        for c in range(nodes_per_side):
+            tiles.setdefault(f"region_{r // region_size}_{c // region_size}", []).append((r, c))
+    return tiles
+
+
+class RegionalCoordinatorProgram(CoordinatorProgram):
+    def __init__(self, layout_manager, name: str, node_ids: list, top_name: str = "coordinator",
+                 **decoder_kwargs):
+        super().__init__(layout_manager, **decoder_kwargs)
+        self.name = name
+        self.top_name = top_name
+        self.node_ids = [tuple(node_id) for node_id in node_ids]
+        self.node_names = [f"node_{r}_{c}" for r, c in self.node_ids]
+        self._residual_owners = {}  # error_type → nodes escalated to the top coordinator
+        self._tile_residual = {}  # error_type → (tile check matrix residual, row_starts)
+        self._outer_cols = {}  # (node_id, error_type) → data qubits checked on another tile
+        self._escalated = []  # current shot: (error_type, residual payloads, t_tot) awaiting the top
+
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name=self.name,
+            csockets=self.node_names + [self.top_name],
+            epr_sockets=[],
+            max_qubits=1,
+        )
+
+    # ------------------------------------------------------------------ #
+    #  Run                                                                 #
+    # ------------------------------------------------------------------ #
+    def run(self, context: ProgramContext):
+        # Steps 1-2: decode both sectors of the tile concurrently (as CoordinatorProgram).
+        # Residuals go up in sector order, the order the top coordinator reads them in;
+        # a sector without residuals is answered at once, the others after the top replies.
+        if self._sector_pool is None:
+            self._sector_pool = ThreadPoolExecutor(max_workers=2)
+        yield from self._recv_windows(context)
+        self._payloads, self._merged, self._escalated = {}, {}, []
+        futures = {}
+        for error_type in ("X", "Z"):
+            self._payloads[error_type] = yield from self._recv_payloads(context, futures)
+            future = self._sector_pool.submit(self._decode_and_merge, self._payloads[error_type], error_type)
+            futures[future] = error_type
+        # X is done by now if it finished during the Z receptions; otherwise wait for it first
+        for future in sorted(futures, key=futures.get):
+            yield from self._sector_done(context, futures.pop(future), future)
+        payloads, merged = self._payloads, self._merged
+
+        top = context.csockets[self.top_name]
+        for error_type, residual, t_tot in self._escalated:
+            reply = wire.decode((yield from top.recv()))
+            offsets = np.cumsum([0] + [int(p["n_data"]) for p in residual])
+            for p, start, end in zip(residual, offsets[:-1], offsets[1:]):
+                merged[error_type][tuple(p["node_id"])] = reply["corrections"][start:end]
+            # The top decode runs after the regional one: the times add up
+            yield from self._send_corrections(context, merged[error_type], error_type,
+                                              t_tot + reply["t_tot"])
+
+        # Step 3: tile parity, CNOT count and worst decoding time, forwarded to the top
+        parity = 0
+        for name in self.node_names:
+            val = json.loads((yield from context.csockets[name].recv()))
+            if val != -1:
+                parity ^= val
+        cnot_count = 0
+        for name in self.node_names:
+            cnot_count += json.loads((yield from context.csockets[name].recv()))
+        max_time = 0.0
+        for name in self.node_names:
+            max_time = max(max_time, json.loads((yield from context.csockets[name].recv())))
+
+        top.send(wire.encode(self._tile_summary(payloads, merged, parity, cnot_count, max_time)))
+        yield from context.connection.flush()
+        return parity, cnot_count
+
+    # A sector has finished: its residuals go up (header first, in sector order) and
+    # its corrections go down at once unless they wait for the top coordinator
+    def _sector_done(self, context: ProgramContext, error_type: str, future):
+        self._merged[error_type], t_tot = future.result()
+        residual = self._residual_payloads(self._payloads[error_type], self._merged[error_type], error_type)
+        top = context.csockets[self.top_name]
+        top.send(wire.encode({"error_type": error_type, "n_residual": len(residual)}))
+        for p in residual:
+            top.send(wire.encode(p))
+        yield from context.connection.flush()
+        if residual:
+            self._escalated.append((error_type, residual, t_tot))
+        else:
+            yield from self._send_corrections(context, self._merged[error_type], error_type, t_tot)
+
+    # Regional decode; records which nodes go to the top coordinator
+    def _decode_sector(self, payloads: list, error_type: str) -> dict:
+        """The merged correction is checked against the tile's check matrix
+        (border stabilizers between two nodes of the tile are whole there).
+        A node goes up if one of its rows is left unsatisfied, or if its
+        correction flips a data qubit watched by a stabilizer of another
+        tile: only the top sees both sides of a tile border."""
+        self._residual_owners[error_type] = set()
+        corrections = super()._decode_sector(payloads, error_type)
+        node_ids = [tuple(p["node_id"]) for p in payloads]
+        H, row_starts, col_starts = self._multi_check_matrix(node_ids, error_type)
+        merged = self._merge_corrections(payloads, corrections)
+        e = np.concatenate([merged[p["node_id"]] for p in payloads]).astype(np.uint8)
+        residual = (H @ e + self._sector_syndrome(payloads, row_starts, error_type)) % 2
+        self._tile_residual[error_type] = residual, row_starts
+        owners = set((np.searchsorted(row_starts, np.flatnonzero(residual), side="right") - 1).tolist())
+        owners |= {i for i, node_id in enumerate(node_ids)
+                   if np.any(e[col_starts[i]:col_starts[i + 1]] & self._outer_columns(node_id, error_type))}
+        self._residual_owners[error_type] |= {node_ids[i] for i in owners}
+        return corrections
+
+    # Data qubits of a node that a stabilizer of that sector on another tile also checks
+    def _outer_columns(self, node_id: tuple, error_type: str) -> np.ndarray:
+        key = (node_id, error_type)
+        if key not in self._outer_cols:
+            grid = self.layout_manager.get_node_grid(*node_id)
+            rows = grid.global_rows.ravel()[grid.data_idx]
+            cols = grid.global_cols.ravel()[grid.data_idx]
+            role = "zQ" if error_type == "X" else "xQ"
+            G = self.layout_manager.global_size
+            tile = set(self.node_ids)
+            outer = np.zeros(len(rows), dtype=bool)
+            for dr, dc in NEIGHBOR_OFFSETS:
+                for q, (r, c) in enumerate(zip((rows + dr).tolist(), (cols + dc).tolist())):
+                    if 0 <= r < G and 0 <= c < G and self.layout_manager.get_qubit_role(r, c) == role:
+                        node_r, node_c = self.layout_manager.node_of(r, c)
+                        outer[q] |= (int(node_r), int(node_c)) not in tile
+            self._outer_cols[key] = outer.astype(np.uint8)
+        return self._outer_cols[key]
+
+    def _decode_blocks(self, H_global, s_global, llr_global, registry, error_type):
+        e_global = super()._decode_blocks(H_global, s_global, llr_global, registry, error_type)
+        bad_rows = np.flatnonzero((H_global @ e_global + s_global) % 2)
+        if len(bad_rows):
+            # By row: a row left without ones by the rounding of H_reduced still has an owner
+            row_starts = np.array([reg["row_start"] for reg in registry])
+            owners = np.searchsorted(row_starts, bad_rows, side="right") - 1
+            self._residual_owners[error_type] = {registry[i]["node_id"] for i in set(owners.tolist())}
+        return e_global
+
+    # What the top needs of each escalated node: its current correction and its
+    # rows' residual on the tile (the other tiles' side of a border is added on top)
+    def _residual_payloads(self, payloads: list, merged: dict, error_type: str) -> list:
+        owners = self._residual_owners.pop(error_type, set())
+        residual, row_starts = self._tile_residual.pop(error_type)
+        escalated = []
+        for i, p in enumerate(payloads):
+            if tuple(p["node_id"]) in owners:
+                escalated.append({"node_id": p["node_id"], "error_type": error_type, "n_data": p["n_data"],
+                                  "corrections": merged[p["node_id"]],
+                                  "residual": residual[row_starts[i]:row_starts[i + 1]]})
+        return escalated
+
+    # Per-node record fields of the tile, in node_ids order (see TopCoordinatorProgram._tile_record)
+    def _tile_summary(self, payloads: dict, merged: dict, parity: int, cnot_count: int,
+                      decoding_time: float) -> dict:
+        summary = {
+            "node_rows": np.array([r for r, _ in self.node_ids], dtype=np.int32),
+            "node_cols": np.array([c for _, c in self.node_ids], dtype=np.int32),
+            "n_data": np.array([len(merged["X"][node_id]) for node_id in self.node_ids], dtype=np.int32),
+        }
+        for error_type in ("X", "Z"):
+            by_node = {tuple(p["node_id"]): p for p in payloads[error_type]}
+            nodes = [by_node[node_id] for node_id in self.node_ids]
+            summary[f"active_{error_type}"] = np.array([p.get("active", False) for p in nodes], dtype=bool)
+            summary[f"syndrome_weight_{error_type}"] = np.array(
+                [p.get("syndrome_weight", 0) for p in nodes], dtype=np.int32)
+            summary[f"k_{error_type}"] = np.array([p.get("k", 0) for p in nodes], dtype=np.int32)
+            summary[f"rows_{error_type}"] = np.array([len(p.get("s", ())) for p in nodes], dtype=np.int32)
+            summary[f"corrections_{error_type}"] = np.concatenate(
+                [merged[error_type][node_id] for node_id in self.node_ids])
+        summary["logical_parity"] = int(parity)
+        summary["cnot_count"] = int(cnot_count)
+        summary["decoding_time"] = float(decoding_time)
+        return summary
+
+
+class TopCoordinatorProgram(CoordinatorProgram):
+    RESIDUAL_ORDER_STEP = 2  # residuals are searched deeper than at the regions
+
+    def __init__(self, layout_manager, tiles: dict, osd_method: str = "exhaustive",
+                 osd_order: int = 2, **decoder_kwargs):
+        """tiles: {region name: node ids}, as from region_tiles."""
+        super().__init__(layout_manager, osd_method=osd_method,
+                         osd_order=osd_order + self.RESIDUAL_ORDER_STEP, **decoder_kwargs)
+        self.region_names = list(tiles)
+        self.tile_of = np.zeros(len(self.node_ids), dtype=int)  # tile index of every node (node_ids order)
+        for k, tile in enumerate(tiles.values()):
+            for node_id in tile:
+                self.tile_of[self.node_ids.index(tuple(node_id))] = k
+
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name="coordinator",
+            csockets=self.region_names,
+            epr_sockets=[],
+            max_qubits=1,
+        )
+
+    # ------------------------------------------------------------------ #
+    #  Run                                                                 #
+    # ------------------------------------------------------------------ #
+    def run(self, context: ProgramContext):
+        # Steps 1-2: per sector, collect the residuals of every region, decode them
+        # together and answer the regions that forwarded any
+        for error_type in ("X", "Z"):
+            residuals = {}
+            for name in self.region_names:
+                sock = context.csockets[name]
+                header = wire.decode((yield from sock.recv()))
+                residuals[name] = []
+                for _ in range(header["n_residual"]):
+                    residuals[name].append(wire.decode((yield from sock.recv())))
+            payloads = [p for ps in residuals.values() for p in ps]
+            if not payloads:
+                continue
+
+            merged, t_tot = self._decode_and_merge(payloads, error_type)
+            log.debug("[coordinator] %s-errors: %d residual nodes from %s", error_type, len(payloads),
+                      [name for name, ps in residuals.items() if ps])
+            for name, ps in residuals.items():
+                if ps:
+                    mask = np.concatenate([merged[tuple(p["node_id"])] for p in ps])
+                    context.csockets[name].send(wire.encode({"error_type": error_type,
+                                                             "corrections": mask, "t_tot": t_tot}))
+            yield from context.connection.flush()
+
+        # Step 3: combine the tile summaries
+        summaries = []
+        for name in self.region_names:
+            summaries.append(wire.decode((yield from context.csockets[name].recv())))
+        global_parity = 0
+        for summary in summaries:
+            global_parity ^= summary["logical_parity"]
+        global_cnot_count = sum(summary["cnot_count"] for summary in summaries)
+        max_time = max(summary["decoding_time"] for summary in summaries)
+
+        status = "OK — no logical error" if global_parity == 0 else "FAIL — logical error survived!"
+        log.info("=== Logical Z (global) = %d → %s ===", global_parity, status)
+        log.info("=== Global CNOT count = %d ===", global_cnot_count)
+        log.info("=== Max decoding time across nodes = %.2f seconds ===", max_time)
+
+        self.shot_log.append(self._tile_record(summaries, global_parity, global_cnot_count, max_time))
+        yield from context.connection.flush()
+        return global_parity, global_cnot_count
+
+    # Escalated nodes of every region, decoded together across the tile borders
+    def _decode_sector(self, payloads: list, error_type: str) -> dict:
+        """The unknowns are the escalated nodes' data qubits, the checks every
+        stabilizer on them, whole (from the layout's check matrix over all
+        nodes).  A check's syndrome is the residual its tile left (zero for
+        the rows of nodes that were not escalated) plus, for a check across a
+        tile border, the escalated corrections on the other tile's side.  The
+        correction found is applied on top of the regional one: OSD per
+        connected block (deeper than at the regions), Union-Find or matching
+        on the whole system.  Returns {node_id: correction mask}."""
+        H, row_starts, col_starts = self._multi_check_matrix(self.node_ids, error_type)
+        nodes = [self.node_ids.index(tuple(p["node_id"])) for p in payloads]
+        cols = np.concatenate([np.arange(col_starts[i], col_starts[i + 1]) for i in nodes])
+        e = np.concatenate([p["corrections"] for p in payloads]).astype(np.uint8)
+        s = np.zeros(H.shape[0], dtype=np.uint8)
+        for i, p in zip(nodes, payloads):
+            s[row_starts[i]:row_starts[i + 1]] = p["residual"]
+
+        H_cols = H[:, cols].tocoo()
+        row_tile = self.tile_of[np.searchsorted(row_starts, H_cols.row, side="right") - 1]
+        col_tile = self.tile_of[np.repeat(nodes, [col_starts[i + 1] - col_starts[i] for i in nodes])][H_cols.col]
+        cross = row_tile != col_tile
+        s ^= np.bincount(H_cols.row[cross], weights=e[H_cols.col[cross]],
+                         minlength=H.shape[0]).astype(np.uint8) % 2
+
+        rows = np.unique(H_cols.row)
+        H_sys, s_sys = H[rows][:, cols], s[rows]
+        if self.decoder == "matching":
+            e ^= MatchingDecoder(H_sys).decode(s_sys)
+        elif self.decoder == "uf":
+            e ^= UnionFindDecoder(H_sys).decode(s_sys).astype(np.uint8)
+        else:
+            for block_rows, block_cols in gf2.split_blocks(H_sys):
+                if len(block_cols) and np.any(s_sys[block_rows]):
+                    e[block_cols] ^= self._osd_gf2(H_sys[block_rows][:, block_cols],
+                                                   s_sys[block_rows]).astype(np.uint8)
+        offsets = np.cumsum([0] + [int(p["n_data"]) for p in payloads])
+        return {tuple(p["node_id"]): e[start:end].astype(bool)
+                for p, start, end in zip(payloads, offsets[:-1], offsets[1:])}
+
+    # The top returns whole corrections: they replace the regional ones
+    def _merge_corrections(self, payloads: list, corrections_per_node: dict) -> dict:
+        return corrections_per_node
+
+    # Rebuild the per-node view of the shot from the tile summaries, for _shot_record
+    def _tile_record(self, summaries: list, logical_parity: int, cnot_count: int,
+                     decoding_time: float) -> dict:
+        payloads = {"X": [], "Z": []}
+        merged = {"X": {}, "Z": {}}
+        for summary in summaries:
+            node_ids = list(zip(summary["node_rows"].tolist(), summary["node_cols"].tolist()))
+            offsets = np.cumsum([0, *summary["n_data"].tolist()])
+            for error_type in ("X", "Z"):
+                for i, node_id in enumerate(node_ids):
+                    payloads[error_type].append({
+                        "node_id": node_id,
+                        "active": bool(summary[f"active_{error_type}"][i]),
+                        "syndrome_weight": int(summary[f"syndrome_weight_{error_type}"][i]),
+                        "k": int(summary[f"k_{error_type}"][i]),
+                        "s": np.zeros(int(summary[f"rows_{error_type}"][i]), dtype=bool),
+                    })
+                    merged[error_type][node_id] = summary[f"corrections_{error_type}"][offsets[i]:offsets[i + 1]]
+        return self._shot_record(payloads["X"], payloads["Z"], merged["X"], merged["Z"],
+                                 logical_parity, cnot_count, decoding_time)
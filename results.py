@@ -0,0 +1,70 @@
+"""
+Per-shot results store
+The coordinator keeps one record per decoded shot (CoordinatorProgram.shot_log);
+run_shard turns a shard's records into columns and the driver appends them to
+one results file in batches.
+
+The file is a zip of .npy members, one per column and batch:
+
+    000000/logical_parity.npy  000000/k_X.npy  ...  000001/logical_parity.npy  ...
+
+so a batch is appended without rewriting the file, and load_results reads
+only the columns asked for.  np.load() opens it too (as an NpzFile).
+
+Columns (N = number of nodes, in CoordinatorProgram.node_ids order):
+    shot, seed                      shot index within the run, seed of its shard
+    error, prob, distance,          configuration of the shot
+    nodes_per_side, engine, rounds,
+    decoder, window                 (window: detection layers per streamed message)
+    syndrome_weight_X/_Z  (N,)      detection events seen by each node
+    bp_converged_X/_Z     (N,)      BP cleared the node's syndrome (or it was clean)
+    k_X/_Z                (N,)      SVD rank sent by the node, 0 if not active
+    n_data                (N,)      data qubits of the node (n of k/n)
+    osd_rows_X/_Z, osd_cols_X/_Z    size of the assembled global OSD system
+    corrections_X/_Z      (B,)      bit-packed merged correction masks, nodes concatenated
+    logical_parity                  1 = logical error
+    cnot_count                      total CNOTs over all nodes
+    decoding_time                   worst node decoding time [s]
+"""
+
+import zipfile
+
+import numpy as np
+
+
+def to_columns(shot_log: list, **constants) -> dict:
+    """Stack a list of per-shot record dicts into columns; keyword arguments
+    become constant columns (seed, error, ...)."""
+    if not shot_log:
+        return {}
+    columns = {name: np.stack([np.asarray(rec[name]) for rec in shot_log])
+               for name in shot_log[0]}
+    n_shots = len(shot_log)
+    for name, value in constants.items():
+        columns[name] = np.full(n_shots, value)
+    return columns
+
+
+def append_results(path: str, columns: dict):
+    """Append one batch of columns to the results file (created on first use)."""
+    if not columns:
+        return
+    with zipfile.ZipFile(path, mode="a", compression=zipfile.ZIP_DEFLATED) as zf:
+        batch = len({member.split("/")[0] for member in zf.namelist()})
+        for name, values in columns.items():
+            with zf.open(f"{batch:06d}/{name}.npy", mode="w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(values), allow_pickle=False)
+
+
+def load_results(path: str, columns=None) -> dict:
+    """Read the results file back as {column: array over all shots}.
+    `columns` restricts the read to the named columns."""
+    parts: dict = {}
+    with zipfile.ZipFile(path) as zf:
+        for member in sorted(zf.namelist()):
+            name = member.split("/", 1)[1][:-len(".npy")]
+            if columns is not None and name not in columns:
+                continue
+            with zf.open(member) as f:
+                parts.setdefault(name, []).append(np.lib.format.read_array(f, allow_pickle=False))
+    return {name: np.concatenate(arrays) for name, arrays in parts.items()}
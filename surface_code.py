@@ -1,14 +1,113 @@
+import numpy as np
+from scipy import sparse
+
+ROLE_NAMES = ("pQ", "xQ", "zQ")  # index = int8 code used in NodeGrid.roles
+PQ, XQ, ZQ = 0, 1, 2
+
+# Neighbour offsets of a stabilizer, in the column order of NodeGrid.stab_neighbors
+NEIGHBOR_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+class NodeGrid:
+    """Array view of one node's subgrid, computed once by SurfaceLayout.
+
+    Cells are addressed by their row-major flat index r * cols + c.
+      roles          : (rows, cols) int8 role codes (PQ / XQ / ZQ)
+      global_rows    : (rows, cols) global row of every cell
+      global_cols    : (rows, cols) global column of every cell
+      border         : (rows, cols) bool, True on the subgrid border
+      data_idx       : flat indices of the data qubits, row-major
+      xq_idx, zq_idx : flat indices of the xQ / zQ ancillas, row-major
+      anc_idx        : flat indices of all ancillas (xQ and zQ), row-major
+      data_column    : (rows * cols,) position of each cell in data_idx, -1 if not data
+      anc_slot       : (rows * cols,) position of each cell in anc_idx, -1 if not an ancilla
+      stab_neighbors : {XQ: (n_xq, 4), ZQ: (n_zq, 4)} flat indices of the data
+                       qubits around each ancilla (NEIGHBOR_OFFSETS order),
+                       -1 where the neighbour lies outside this node
+    """
+
+    def __init__(self, global_rows: np.ndarray, global_cols: np.ndarray, roles: np.ndarray):
+        self.shape = roles.shape
+        rows, cols = self.shape
+        self.origin = (int(global_rows.flat[0]), int(global_cols.flat[0])) if roles.size else (0, 0)
+
+        self.roles = roles
+        self.global_rows, self.global_cols = global_rows, global_cols
+        self.border = np.zeros(self.shape, dtype=bool)
+        if rows and cols:
+            self.border[[0, -1], :] = True
+            self.border[:, [0, -1]] = True
+
+        flat_roles = roles.ravel()
+        self.data_idx = np.flatnonzero(flat_roles == PQ)
+        self.xq_idx = np.flatnonzero(flat_roles == XQ)
+        self.zq_idx = np.flatnonzero(flat_roles == ZQ)
+        self.anc_idx = np.flatnonzero(flat_roles != PQ)
+        self.data_column = np.full(rows * cols, -1, dtype=int)
+        self.data_column[self.data_idx] = np.arange(len(self.data_idx))
+        self.anc_slot = np.full(rows * cols, -1, dtype=int)
+        self.anc_slot[self.anc_idx] = np.arange(len(self.anc_idx))
+
+        self.stab_neighbors = {
+            XQ: self._neighbor_table(self.xq_idx),
+            ZQ: self._neighbor_table(self.zq_idx),
+        }
+
+    def _neighbor_table(self, anc_idx: np.ndarray) -> np.ndarray:
+        rows, cols = self.shape
+        r, c = np.divmod(anc_idx, max(cols, 1))
+        table = np.full((len(anc_idx), len(NEIGHBOR_OFFSETS)), -1, dtype=int)
+        for k, (dr, dc) in enumerate(NEIGHBOR_OFFSETS):
+            nr, nc = r + dr, c + dc
+            inside = (nr >= 0) & (nr < rows) & (nc >= 0) & (nc < cols)
+            flat = np.where(inside, nr * cols + nc, 0)
+            is_data = inside & (self.roles.ravel()[flat] == PQ)
+            table[is_data, k] = flat[is_data]
+        return table
+
+    def check_matrix(self, role: int) -> tuple:
+        """Local parity-check matrix of one stabilizer type (ZQ → H_Z, XQ → H_X).
+
+        Returns (H, anc_local): H is a CSR matrix with one row per ancilla of
+        that type that has a data neighbour on this node (at most four ones
+        per row) and one column per data qubit (data_idx order); anc_local
+        is the local (r, c) of the ancilla behind each row.  Ancillas whose
+        neighbours all live on other nodes are dropped: they have no column
+        to assign an error to.
+        """
+        anc_idx = self.zq_idx if role == ZQ else self.xq_idx
+        table = self.stab_neighbors[role]
+        linked = table >= 0
+        rows = np.nonzero(linked)[0]
+        cols = self.data_column[table[linked]]
+        H = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=int), (rows, cols)), shape=(len(anc_idx), len(self.data_idx))
+        )
+        nonzero_rows = linked.any(axis=1)
+        r_loc, c_loc = np.divmod(anc_idx[nonzero_rows], self.shape[1])
+        return H[nonzero_rows], list(zip(r_loc.tolist(), c_loc.tolist()))
+
+    def check_slots(self, role: int) -> np.ndarray:
+        """anc_slot of the ancilla behind each row of check_matrix(role), to
+        gather that matrix's syndrome from anc_idx-ordered detection events."""
+        _, anc_local = self.check_matrix(role)
+        return self.anc_slot[[r * self.shape[1] + c for r, c in anc_local]].astype(int)
+
+
 class SurfaceLayout:
     """Manages the surface code grid layout and node subgrid assignments."""
-    
+
     def __init__(self, global_size: int, nodes_per_side: int):
         self.global_size = global_size
         self.nodes_per_side = nodes_per_side
         self.block_size = global_size // nodes_per_side
+        # Per-node caches: the layout never changes after construction
+        self._node_grids = {}
+        self._subgrids = {}
 
     def get_qubit_role(self, r_global: int, c_global: int) -> str:
         """Determines the qubit role based on the global grid."""
-        # Standard logic: 
+        # Standard logic:
         # (r+c) even -> Data Qubit (pQ)
         # (r+c) odd -> Ancilla (xQ or zQ)
         if (r_global + c_global) % 2 == 0:
@@ -18,26 +117,97 @@ class SurfaceLayout:
             # In a checkerboard, we use the parity of r or c to distinguish xQ from zQ
             return "zQ" if r_global % 2 != 0 else "xQ"
 
-    def get_subgrid_for_node(self, node_row: int, node_col: int) -> list:
-        subgrid = []
+    def _role_codes(self, r_global: np.ndarray, c_global: np.ndarray) -> np.ndarray:
+        """Vectorized get_qubit_role, as int8 codes."""
+        roles = np.where(r_global % 2 != 0, ZQ, XQ).astype(np.int8)
+        roles[(r_global + c_global) % 2 == 0] = PQ
+        return roles
+
+    def _node_bounds(self, node_row: int, node_col: int) -> tuple:
         r_start = node_row * self.block_size
         c_start = node_col * self.block_size
 
         r_end = self.global_size if node_row == self.nodes_per_side - 1 else r_start + self.block_size
         c_end = self.global_size if node_col == self.nodes_per_side - 1 else c_start + self.block_size
+        return r_start, r_end, c_start, c_end
 
-        for r in range(r_start, r_end):
-            row = []
-            for c in range(c_start, c_end):
-                role = self.get_qubit_role(r, c)
-                
-                is_border = (r == r_start or r == r_end - 1 or
-                            c == c_start or c == c_end - 1)
-                
-                row.append({
-                    "role": role,
-                    "is_border": is_border,
-                    "global_pos": (r, c)
-                })
-            subgrid.append(row)
-        return subgrid
\ No newline at end of file
+    def node_of(self, r_global, c_global) -> tuple:
+        """(node_row, node_col) of the node owning global cell(s) (r_global, c_global)."""
+        last = self.nodes_per_side - 1
+        return (np.minimum(np.asarray(r_global) // self.block_size, last),
+                np.minimum(np.asarray(c_global) // self.block_size, last))
+
+    def get_node_grid(self, node_row: int, node_col: int) -> NodeGrid:
+        """Array representation of a node's subgrid, built on first use."""
+        key = (node_row, node_col)
+        if key not in self._node_grids:
+            r_start, r_end, c_start, c_end = self._node_bounds(node_row, node_col)
+            r_global, c_global = np.meshgrid(
+                np.arange(r_start, r_end), np.arange(c_start, c_end), indexing="ij"
+            )
+            roles = self._role_codes(r_global, c_global)
+            self._node_grids[key] = NodeGrid(r_global, c_global, roles)
+        return self._node_grids[key]
+
+    def check_matrix(self, role: int, node_ids: list = None) -> tuple:
+        """Parity-check matrix of one stabilizer type over several nodes (all by default).
+
+        Rows are every node's NodeGrid.check_matrix rows and columns every
+        node's data qubits, stacked node by node in node_ids order, but each
+        row also has its ones on the other listed nodes' data qubits (the
+        cross-node half of a border stabilizer).  Returns (H, row_starts,
+        col_starts): node i owns rows row_starts[i]:row_starts[i + 1] and
+        columns col_starts[i]:col_starts[i + 1].
+        """
+        if node_ids is None:
+            N = self.nodes_per_side
+            node_ids = [(r, c) for r in range(N) for c in range(N)]
+        column_of = {}  # global (r, c) of a data qubit → column
+        anc_pos = []
+        row_starts, col_starts = [0], [0]
+        for node_id in node_ids:
+            grid = self.get_node_grid(*node_id)
+            data_rows = grid.global_rows.ravel()[grid.data_idx].tolist()
+            data_cols = grid.global_cols.ravel()[grid.data_idx].tolist()
+            for pos in zip(data_rows, data_cols):
+                column_of[pos] = len(column_of)
+            _, anc_local = grid.check_matrix(role)
+            r0, c0 = grid.origin
+            anc_pos += [(r0 + r, c0 + c) for r, c in anc_local]
+            row_starts.append(len(anc_pos))
+            col_starts.append(len(column_of))
+
+        rows, cols = [], []
+        for i, (r, c) in enumerate(anc_pos):
+            for dr, dc in NEIGHBOR_OFFSETS:
+                j = column_of.get((r + dr, c + dc))
+                if j is not None:
+                    rows.append(i)
+                    cols.append(j)
+        H = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=int), (rows, cols)), shape=(len(anc_pos), len(column_of))
+        )
+        return H, np.array(row_starts), np.array(col_starts)
+
+    def get_subgrid_for_node(self, node_row: int, node_col: int) -> list:
+        """List-of-rows view of a node's cells ({"role", "is_border",
+        "global_pos"} dicts), built once from the node grid and shared by
+        every caller: treat it as read-only."""
+        key = (node_row, node_col)
+        if key not in self._subgrids:
+            grid = self.get_node_grid(node_row, node_col)
+            roles = grid.roles.tolist()
+            border = grid.border.tolist()
+            r_start, c_start = grid.origin
+            self._subgrids[key] = [
+                [
+                    {
+                        "role": ROLE_NAMES[roles[r][c]],
+                        "is_border": border[r][c],
+                        "global_pos": (r_start + r, c_start + c),
+                    }
+                    for c in range(grid.shape[1])
+                ]
+                for r in range(grid.shape[0])
+            ]
+        return self._subgrids[key]
@@ -0,0 +1,254 @@
+"""
+Parameter sweep driver
+Runs every point of  error types × probabilities × code distances × nodes_per_side
+on one process pool and writes a single CSV results table (one row per point).
+
+Each point is cut into shards of --chunk shots.  Shards are submitted
+grouped by configuration, and main.run_shard caches the layout, network
+config and programs per process, so a worker that draws several shards of
+the same point builds them only once.  Every shard gets its own seed from
+SeedSequence(--seed).spawn, so the table is reproducible.
+
+    python sweep.py --errors identity cnot --probs 0.001 0.005 0.01 \
+                    --distances 9 13 17 --nodes-per-side 1 2 --shots 10000 --workers 32
+"""
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from coordinator import CoordinatorProgram
+from dis_surface_mesure import ClusterNodeProgram
+from main import BLAS_THREAD_VARS, run_shard
+from qec_logging import LOG_LEVELS, configure_logging
+from results import append_results
+
+RESULT_FIELDS = (
+    "error", "prob", "distance", "nodes_per_side", "engine", "decoder", "window", "shots",
+    "failures", "logical_error_rate", "std_error", "mean_cnot_count", "wall_time_s",
+)
+
+
+def sweep_points(errors, probs, distances, nodes_per_side):
+    points = []
+    for error, prob, d, nps in itertools.product(errors, probs, distances, nodes_per_side):
+        if nps > d:
+            print(f"[sweep] skipping d={d}, nodes_per_side={nps}: more nodes than rows")
+            continue
+        points.append((error, prob, d, nps))
+    return points
+
+
+def run_sweep(points, shots, chunk, workers, engine="netsquid", osd_method="exhaustive",
+              osd_order=2, seed=None, output="sweep_results.csv", results_path=None,
+              log_level="warning", region_size=0, num_rounds=None, decoder="osd",
+              window=None):
+    # Cut every point into shards; list them grouped by point
+    tasks = []
+    for point in points:
+        for start in range(0, shots, chunk):
+            tasks.append((point, start, min(chunk, shots - start)))
+    seed_seq = np.random.SeedSequence(seed)
+    seeds = [int(s.generate_state(1)[0]) for s in seed_seq.spawn(len(tasks))]
+    print(f"[sweep] {len(points)} points, {len(tasks)} shards on {workers} workers "
+          f"(base seed {seed_seq.entropy})")
+
+    for var in BLAS_THREAD_VARS:
+        os.environ.setdefault(var, "1")
+
+    records = {point: [] for point in points}
+    wall_time = dict.fromkeys(points, 0.0)
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=configure_logging, initargs=(log_level,)) as pool:
+        futures = {}
+        for (point, start, n_shots), shard_seed in zip(tasks, seeds):
+            error, prob, d, nps = point
+            future = pool.submit(_timed_shard, d, nps, error, prob, osd_method, osd_order,
+                                 1, engine, region_size, num_rounds, decoder, window, n_shots,
+                                 shard_seed, start)
+            futures[future] = point
+
+        for done, future in enumerate(as_completed(futures), 1):
+            point = futures[future]
+            shard, elapsed = future.result()
+            records[point].append(shard)
+            if results_path:
+                append_results(results_path, shard)
+            wall_time[point] += elapsed
+            print(f"[sweep] {done}/{len(futures)} shards done")
+
+    rows = [_summarize(point, records[point], wall_time[point], engine, decoder, window)
+            for point in points]
+    with open(output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"[sweep] results written to {output}")
+    return rows
+
+
+def _timed_shard(*args):
+    t0 = time.time()
+    columns, _ = run_shard(*args)
+    return columns, time.time() - t0
+
+
+def _summarize(point, shards, wall_time, engine, decoder, window):
+    error, prob, d, nps = point
+    parity = np.concatenate([s["logical_parity"] for s in shards if s] or [np.zeros(0)])
+    cnots = np.concatenate([s["cnot_count"] for s in shards if s] or [np.zeros(0)])
+    shots = len(parity)
+    failures = int(parity.sum())
+    rate = failures / shots if shots else 0.0
+    return {
+        "error": error,
+        "prob": prob,
+        "distance": d,
+        "nodes_per_side": nps,
+        "engine": engine,
+        "decoder": decoder,
+        "window": window or ClusterNodeProgram.WINDOW,
+        "shots": shots,
+        "failures": failures,
+        "logical_error_rate": rate,
+        "std_error": np.sqrt(rate * (1 - rate) / shots) if shots else 0.0,
+        "mean_cnot_count": float(cnots.mean()) if shots else 0.0,
+        "wall_time_s": round(wall_time, 3),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--errors",
+        nargs="+",
+        default=["identity"],
+        choices=["identity", "hadamard", "initialization", "readout", "cnot", "all"],
+        help="Error types to sweep (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--probs",
+        nargs="+",
+        type=float,
+        default=[0.001, 0.005, 0.01],
+        help="Error probabilities to sweep (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--distances",
+        nargs="+",
+        type=int,
+        default=[13],
+        help="Code distances, i.e. global grid sizes (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--nodes-per-side",
+        nargs="+",
+        type=int,
+        default=[2],
+        help="Cluster node grid sizes (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-n", "--shots",
+        type=int,
+        default=1000,
+        help="Shots per point (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--chunk",
+        type=int,
+        default=250,
+        help="Shots per scheduled shard (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes (default: all cores)"
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default="netsquid",
+        choices=["netsquid", "pauli"],
+        help="Simulation engine, see main.py (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--decoder",
+        type=str,
+        default="osd",
+        choices=CoordinatorProgram.DECODERS,
+        help="Coordinator backend, see main.py (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--osd-method",
+        type=str,
+        default="exhaustive",
+        choices=["exhaustive", "cs"],
+        help="OSD search used by the coordinator (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--osd-order",
+        type=int,
+        default=2,
+        help="OSD order (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Base seed of the sweep (default: random)"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type=str,
+        default="sweep_results.csv",
+        help="Results table (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--results",
+        type=str,
+        default=None,
+        help="Also append every shot to this per-shot results file (see results.py)"
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="warning",
+        choices=LOG_LEVELS,
+        help="Log level of the node / coordinator programs (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--region-size",
+        type=int,
+        default=0,
+        help="Regional coordinators over tiles of N x N nodes, see main.py (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-r", "--rounds",
+        type=int,
+        default=None,
+        help="Stabilizer rounds per shot (default: ClusterNodeProgram.NUM_ROUNDS)"
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=None,
+        help="Detection layers streamed per message (default: ClusterNodeProgram.WINDOW)"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    points = sweep_points(args.errors, args.probs, args.distances, args.nodes_per_side)
+    run_sweep(points, args.shots, args.chunk, args.workers, args.engine,
+              args.osd_method, args.osd_order, args.seed, args.output, args.results,
+              args.log_level, args.region_size, args.rounds, args.decoder, args.window)
@@ -0,0 +1,77 @@
+"""
+Streaming detection events over R stabilizer rounds
+A node measures every ancilla once per round.  Each round's syndrome is
+bit-packed (1 bit per ancilla, NodeGrid.anc_idx order) and XORed against
+the previous round as soon as it is measured, giving that round's layer of
+detection events.  Layers are buffered in windows of `window` rounds and a
+full window is handed back to be streamed to the coordinator at once, so a
+node holds the previous round plus at most one window: memory does not
+grow with the number of rounds.
+
+The first round is the noiseless reference, so R >= 2 and a shot has R - 1
+layers, in window_count(R, window) windows (the last one may be shorter).
+The node also keeps the running XOR of the layers for its local BP / SVD
+pre-filter.  That XOR telescopes to the first round XOR the last (the
+intermediate measurement errors cancel in pairs), so only the streamed
+layers tell a measurement error from a data error.
+"""
+
+import numpy as np
+
+NUM_ROUNDS = 2  # default number of stabilizer rounds (the first is the noiseless reference)
+WINDOW = 1      # default number of detection layers per streamed window
+
+
+def window_count(num_rounds: int, window: int) -> int:
+    """Number of windows streamed for num_rounds rounds."""
+    return -(-(num_rounds - 1) // window)
+
+
+class DetectionStream:
+    def __init__(self, n_ancillas: int, window: int = WINDOW):
+        if window < 1:
+            raise ValueError(f"window must be >= 1 (got {window})")
+        self.n_ancillas = n_ancillas
+        self.window = window
+        self.rounds = 0
+        n_bytes = -(-n_ancillas // 8)
+        self._previous = None  # packed syndrome of the last round
+        self._layers = np.zeros((window, n_bytes), dtype=np.uint8)  # current window, packed
+        self._filled = 0
+        self._folded = np.zeros(n_bytes, dtype=np.uint8)  # running XOR of all layers
+
+    def push(self, syndrome: np.ndarray) -> np.ndarray:
+        """Add one round's 0/1 syndrome.  Returns the packed (w, n_bytes)
+        layers of the window this round completes, else None (the first
+        round only sets the reference)."""
+        packed = np.packbits(np.asarray(syndrome, dtype=bool), bitorder="little")
+        previous, self._previous = self._previous, packed
+        self.rounds += 1
+        if previous is None:
+            return None
+        self._layers[self._filled] = packed ^ previous
+        self._folded ^= self._layers[self._filled]
+        self._filled += 1
+        return self.flush() if self._filled == self.window else None
+
+    def flush(self) -> np.ndarray:
+        """Packed layers of the current, possibly partial, window (None if empty)."""
+        if self._filled == 0:
+            return None
+        layers = self._layers[:self._filled].copy()
+        self._filled = 0
+        return layers
+
+    def detection_events(self) -> np.ndarray:
+        """Running XOR of all detection layers so far, one uint8 per ancilla."""
+        return np.unpackbits(self._folded, count=self.n_ancillas, bitorder="little")
+
+    @staticmethod
+    def unpack(layers: np.ndarray, n_ancillas: int) -> np.ndarray:
+        """(w, n_ancillas) uint8 detection events of packed window layers."""
+        return np.unpackbits(np.atleast_2d(layers), axis=1, count=n_ancillas, bitorder="little")
+
+    @staticmethod
+    def weight(events: np.ndarray) -> int:
+        """Number of detection events in a packed array."""
+        return int(np.unpackbits(events).sum())
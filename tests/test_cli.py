@@ -0,0 +1,12 @@
+import pytest
+
+pytest.importorskip("squidasm")
+
+import main
+import sweep
+
+
+@pytest.mark.parametrize("module", [main, sweep])
+def test_parser_builds(module):
+    args = module.build_parser().parse_args(["-w", "4", "--window", "3", "-r", "5"])
+    assert (args.workers, args.window, args.rounds) == (4, 3, 5)
@@ -0,0 +1,75 @@
+import numpy as np
+from scipy import sparse
+
+import gf2
+
+
+def random_binary(m: int, n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 2, size=(m, n), dtype=np.uint8)
+
+
+def test_pack_rows_round_trip_across_words():
+    M = random_binary(5, 130)
+    P = gf2.pack_rows(M)
+    assert P.shape == (5, 3) and P.dtype == np.uint64
+    assert np.array_equal(gf2.unpack_rows(P, 130), M)
+    assert np.array_equal(gf2.pack_rows(sparse.csr_matrix(M)), P)
+
+
+def test_systematic_form_transform():
+    M = random_binary(12, 20)
+    M[5] = M[1] ^ M[3]  # force a dependent row
+    M_sys, pivot_cols, T = gf2.systematic_form(M, with_transform=True)
+    assert np.array_equal(T.astype(int) @ M % 2, M_sys)
+    r = len(pivot_cols)
+    # Pivot i lives on row i, and the rows below the rank are zero
+    assert np.array_equal(M_sys[:r][:, pivot_cols], np.eye(r, dtype=np.uint8))
+    assert not M_sys[r:].any()
+    assert gf2.systematic_form(M)[2] is None
+
+
+def test_rank():
+    M = random_binary(8, 8)
+    assert gf2.rank(np.eye(8, dtype=np.uint8)) == 8
+    assert gf2.rank(np.zeros((4, 6), dtype=np.uint8)) == 0
+    assert gf2.rank(np.vstack([M, M[0] ^ M[1]])) == gf2.rank(M)
+
+
+def test_solve():
+    M = random_binary(10, 16, seed=1)
+    x = random_binary(1, 16, seed=2)[0]
+    b = M.astype(int) @ x % 2
+    assert np.array_equal(M.astype(int) @ gf2.solve(M, b) % 2, b)
+    # x0 + x1 = 0 and x0 + x1 = 1 cannot both hold
+    assert gf2.solve(np.array([[1, 1], [1, 1]], dtype=np.uint8), np.array([0, 1])) is None
+
+
+def test_null_space():
+    M = random_binary(6, 14, seed=3)
+    N = gf2.null_space(M)
+    assert N.shape == (14 - gf2.rank(M), 14)
+    assert not (M.astype(int) @ N.T.astype(int) % 2).any()
+    assert gf2.rank(N) == len(N)
+
+
+def test_matvec():
+    M = random_binary(7, 70, seed=4)
+    v = random_binary(1, 70, seed=5)[0]
+    assert np.array_equal(gf2.matvec(gf2.pack_rows(M), v), M.astype(int) @ v % 2)
+
+
+def test_digest_tracks_the_entries():
+    M = random_binary(4, 9)
+    flipped = M.copy()
+    flipped[2, 3] ^= 1
+    assert gf2.digest(M) == gf2.digest(M.copy())
+    assert gf2.digest(M) != gf2.digest(flipped)
+    # Same packed words, different width
+    assert gf2.digest(np.zeros((2, 3))) != gf2.digest(np.zeros((2, 5)))
+
+
+def test_split_blocks():
+    M = np.zeros((3, 5), dtype=np.uint8)
+    M[0, [0, 1]] = M[1, [1, 2]] = M[2, 4] = 1
+    blocks = sorted((r.tolist(), c.tolist()) for r, c in gf2.split_blocks(M))
+    assert blocks == [([], [3]), ([0, 1], [0, 1, 2]), ([2], [4])]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx")
+
+from matching_decoder import MatchingDecoder
+
+
+# Distance-5 repetition code: check i compares data qubits i and i + 1
+def repetition_code(n: int = 5) -> np.ndarray:
+    H = np.zeros((n - 1, n), dtype=np.uint8)
+    for i in range(n - 1):
+        H[i, i] = H[i, i + 1] = 1
+    return H
+
+
+def test_decode_single_round():
+    H = repetition_code()
+    e = np.zeros(5, dtype=np.uint8)
+    e[2] = 1
+    assert np.array_equal(MatchingDecoder(H).decode(H @ e % 2), e)
+    assert not MatchingDecoder(H).decode(np.zeros(4, dtype=np.uint8)).any()
+
+
+def test_decode_data_error_over_rounds():
+    # A data error before round 1 shows up once, in layer 1
+    H = repetition_code()
+    events = np.zeros((3, 4), dtype=np.uint8)
+    events[1, 1] = events[1, 2] = 1
+    e = MatchingDecoder(H, num_rounds=3).decode(events)
+    assert e.tolist() == [0, 0, 1, 0, 0]
+
+
+def test_measurement_error_is_not_corrected():
+    # A flipped outcome of check 1 in round 1: the same detector fires in layers 1 and 2
+    H = repetition_code()
+    events = np.zeros((3, 4), dtype=np.uint8)
+    events[1, 1] = events[2, 1] = 1
+    assert not MatchingDecoder(H, num_rounds=3).decode(events).any()
+
+
+def test_open_window_carries_its_last_layer():
+    # The measurement error straddles two windows: the first defers it, the second absorbs it
+    H = repetition_code()
+    first = np.zeros((2, 4), dtype=np.uint8)
+    first[1, 1] = 1
+    e, carry = MatchingDecoder(H, num_rounds=2, open_top=True).decode_window(first)
+    assert not e.any()
+    assert carry.tolist() == [0, 1, 0, 0]
+
+    second = np.zeros((2, 4), dtype=np.uint8)
+    second[0, 1] = 1
+    second[0] ^= carry
+    e, carry = MatchingDecoder(H, num_rounds=2).decode_window(second)
+    assert not e.any() and not carry.any()
@@ -0,0 +1,21 @@
+import numpy as np
+
+import osd
+
+
+def test_cs_flips_every_test_column_and_pairs_only_the_first_order():
+    patterns = osd.candidate_patterns(6, "cs", max_candidates=4096, order=3)
+    weights = patterns.sum(axis=1)
+    assert weights.tolist() == [0] + [1] * 6 + [2] * 3
+    assert np.array_equal(patterns[1:7], np.eye(6, dtype=np.uint8))
+    assert not patterns[weights == 2][:, 3:].any()
+
+
+def test_cs_searches_all_non_pivot_columns():
+    non_pivot = [4, 1, 7, 2]
+    assert osd.search_columns(non_pivot, 2, "cs") == non_pivot
+    assert osd.search_columns(non_pivot, 2, "exhaustive") == [4, 1]
+
+
+def test_candidate_budget():
+    assert len(osd.candidate_patterns(50, "cs", max_candidates=20, order=10)) == 20
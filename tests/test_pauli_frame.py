@@ -0,0 +1,15 @@
+import pytest
+
+from surface_code import SurfaceLayout
+
+pytest.importorskip("squidasm")
+
+from pauli_frame import NOISE_TYPES, PauliFrameSimulator  # noqa: E402
+
+
+def test_cnot_count_does_not_depend_on_noise_model():
+    layout = SurfaceLayout(6, 2)
+    counts = {error: PauliFrameSimulator(layout, error, 0.01, seed=0).cnot_count
+              for error in NOISE_TYPES + ("all",)}
+    assert len(set(counts.values())) == 1, counts
+    assert counts["cnot"] > 0
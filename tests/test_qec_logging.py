@@ -0,0 +1,39 @@
+import gzip
+import logging
+
+import pytest
+
+from qec_logging import LOGGER_NAME, GzipRotatingFileHandler, configure_logging, get_logger
+
+
+@pytest.fixture(autouse=True)
+def reset_logger():
+    yield
+    configure_logging("warning")
+
+
+def test_level_filters_child_loggers(capsys):
+    configure_logging("info")
+    log = get_logger("coordinator")
+    log.debug("dropped %s", "debug")
+    log.info("kept %d", 1)
+    assert capsys.readouterr().out == "kept 1\n"
+    assert log.name == f"{LOGGER_NAME}.coordinator"
+
+
+def test_reconfiguring_replaces_the_handlers(tmp_path):
+    configure_logging("debug", log_file=str(tmp_path / "run.log"))
+    configure_logging("warning")
+    handlers = logging.getLogger(LOGGER_NAME).handlers
+    assert len(handlers) == 1 and not isinstance(handlers[0], GzipRotatingFileHandler)
+
+
+def test_rotated_files_are_gzipped(tmp_path):
+    path = tmp_path / "run.log"
+    handler = GzipRotatingFileHandler(str(path), max_bytes=64, backups=2)
+    record = logging.LogRecord("qec", logging.WARNING, __file__, 0, "x" * 40, None, None)
+    for _ in range(3):
+        handler.emit(record)
+    handler.close()
+    with gzip.open(str(path) + ".1.gz", "rt") as f:
+        assert "x" * 40 in f.read()
@@ -0,0 +1,33 @@
+import zipfile
+
+import numpy as np
+
+from results import append_results, load_results, to_columns
+
+
+def shot_log(n: int, offset: int = 0) -> list:
+    return [{"shot": offset + i, "logical_parity": (offset + i) % 2, "k_X": np.array([i, 0])}
+            for i in range(n)]
+
+
+def test_batches_are_numbered_in_append_order(tmp_path):
+    path = str(tmp_path / "results.npz")
+    append_results(path, to_columns(shot_log(3), seed=11))
+    append_results(path, {})  # an empty shard adds no batch
+    append_results(path, to_columns(shot_log(2, offset=3), seed=12))
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+    assert sorted({name.split("/")[0] for name in names}) == ["000000", "000001"]
+    assert "000001/seed.npy" in names
+
+    columns = load_results(path)
+    assert columns["shot"].tolist() == [0, 1, 2, 3, 4]
+    assert columns["seed"].tolist() == [11, 11, 11, 12, 12]
+    assert columns["k_X"].shape == (5, 2)
+
+
+def test_load_only_the_requested_columns(tmp_path):
+    path = str(tmp_path / "results.npz")
+    append_results(path, to_columns(shot_log(4)))
+    assert list(load_results(path, columns=["logical_parity"])) == ["logical_parity"]
+    assert np.load(path)["000000/shot.npy"].tolist() == [0, 1, 2, 3]
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from syndrome_stream import DetectionStream, window_count
+
+N_ANC = 11
+
+
+def run_stream(syndromes: np.ndarray, window: int) -> tuple:
+    stream = DetectionStream(N_ANC, window)
+    windows = [w for w in map(stream.push, syndromes) if w is not None]
+    tail = stream.flush()
+    if tail is not None:
+        windows.append(tail)
+    return stream, [DetectionStream.unpack(w, N_ANC) for w in windows]
+
+
+@pytest.mark.parametrize("num_rounds, window", [(2, 1), (5, 2), (7, 3), (7, 6), (4, 10)])
+def test_windows_slice_the_layers(num_rounds, window):
+    syndromes = np.random.default_rng(num_rounds).integers(0, 2, (num_rounds, N_ANC), dtype=np.uint8)
+    stream, windows = run_stream(syndromes, window)
+    assert len(windows) == window_count(num_rounds, window)
+    assert [len(w) for w in windows[:-1]] == [window] * (len(windows) - 1)
+    # Layer k is round k + 1 XOR round k
+    assert np.array_equal(np.concatenate(windows), syndromes[1:] ^ syndromes[:-1])
+    assert stream.rounds == num_rounds
+
+
+def test_folded_events_telescope_to_first_xor_last():
+    syndromes = np.random.default_rng(0).integers(0, 2, (6, N_ANC), dtype=np.uint8)
+    stream, _ = run_stream(syndromes, 2)
+    assert np.array_equal(stream.detection_events(), syndromes[0] ^ syndromes[-1])
+
+
+def test_reference_round_and_empty_flush():
+    stream = DetectionStream(N_ANC, 2)
+    assert stream.push(np.ones(N_ANC)) is None
+    assert stream.flush() is None
+    assert stream.push(np.zeros(N_ANC)) is None
+    layers = stream.flush()
+    assert DetectionStream.weight(layers) == N_ANC
+    assert stream.flush() is None
+
+
+def test_window_must_be_positive():
+    with pytest.raises(ValueError):
+        DetectionStream(N_ANC, 0)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from surface_code import SurfaceLayout, XQ, ZQ
+from uf_decoder import UnionFindDecoder
+
+
+@pytest.mark.parametrize("role", [ZQ, XQ])
+def test_correction_satisfies_the_syndrome(role):
+    H = SurfaceLayout(13, 1).check_matrix(role)[0]
+    decoder = UnionFindDecoder(H)
+    rng = np.random.default_rng(role)
+    for _ in range(50):
+        e = (rng.random(H.shape[1]) < 0.05).astype(np.uint8)
+        s = H @ e % 2
+        assert np.array_equal(H @ decoder.decode(s) % 2, s)
+
+
+def test_single_error_in_the_bulk():
+    # Repetition code: check i compares data qubits i and i + 1
+    H = np.zeros((4, 5), dtype=np.uint8)
+    for i in range(4):
+        H[i, i] = H[i, i + 1] = 1
+    decoder = UnionFindDecoder(H)
+    assert decoder.decode(np.array([0, 1, 1, 0])).tolist() == [0, 0, 1, 0, 0]
+    assert not decoder.decode(np.zeros(4, dtype=np.uint8)).any()
+
+
+def test_rejects_a_column_in_three_checks():
+    with pytest.raises(ValueError, match="graph-like"):
+        UnionFindDecoder(np.ones((3, 2), dtype=np.uint8))
@@ -0,0 +1,63 @@
+import base64
+import struct
+
+import numpy as np
+import pytest
+
+import wire
+
+
+def test_round_trip_keeps_values_and_dtypes():
+    fields = {
+        "node_id": (1, 2),
+        "active": True,
+        "n_data": 25,
+        "energy_threshold": 0.99,
+        "error_type": "X",
+        "residual": None,
+        "s": np.array([1, 0, 1, 1, 0, 0, 0, 1, 1], dtype=bool),
+        "U": np.arange(6, dtype=np.float32).reshape(2, 3),
+        "indices": np.array([3, -1, 7], dtype=np.int32),
+    }
+    out = wire.decode(wire.encode(fields))
+    assert list(out) == list(fields)
+    for name, value in fields.items():
+        if isinstance(value, np.ndarray):
+            assert out[name].dtype == value.dtype
+            assert np.array_equal(out[name], value)
+        else:
+            assert out[name] == value
+
+
+def test_bool_arrays_are_bit_packed():
+    n = 800
+    small = base64.b85decode(wire.encode({"s": np.ones(n, dtype=bool)}))
+    wide = base64.b85decode(wire.encode({"s": np.ones(n, dtype=np.uint8)}))
+    assert len(wide) - len(small) == n - n // 8
+
+
+def test_version_byte_is_checked():
+    buf = bytearray(base64.b85decode(wire.encode({"n_data": 1})))
+    assert buf[:4] == wire.WIRE_MAGIC and buf[4] == wire.WIRE_VERSION
+    buf[4] = wire.WIRE_VERSION + 1
+    with pytest.raises(ValueError, match="version"):
+        wire.decode(base64.b85encode(bytes(buf)).decode("ascii"))
+    with pytest.raises(ValueError, match="wire-format"):
+        wire.decode(base64.b85encode(b"JUNK" + bytes(buf[4:])).decode("ascii"))
+
+
+def test_ints_count_is_one_byte():
+    longest = tuple(range(255))
+    assert wire.decode(wire.encode({"cols": longest}))["cols"] == longest
+    buf = base64.b85decode(wire.encode({"cols": (4, 5)}))
+    # magic | version, n_fields | name_len, "cols" | tag | count
+    assert struct.unpack_from("<BB", buf, 7 + 1 + 4) == (5, 2)
+    with pytest.raises(ValueError, match="cols"):
+        wire.encode({"cols": tuple(range(256))})
+
+
+def test_unsupported_values_name_the_field():
+    with pytest.raises(TypeError, match="U"):
+        wire.encode({"U": np.zeros(2, dtype=np.complex64)})
+    with pytest.raises(TypeError, match="meta"):
+        wire.encode({"meta": {"a": 1}})
@@ -0,0 +1,122 @@
+"""
+Binary wire format for node <-> coordinator messages
+A message is a flat set of named fields packed into one versioned byte
+string, then Base85-encoded because classical sockets carry text:
+
+    b"QECW" | version (u8) | n_fields (u16) | field*
+
+    field  = name_len (u8) | name (ascii) | tag (u8) | value
+    NONE   : no value
+    BOOL   : u8
+    INT    : i64
+    FLOAT  : f64
+    STR    : len (u32) | utf-8 bytes
+    INTS   : count (u8) | i32 * count          (decoded as a tuple of int)
+    ARRAY  : dtype (u8) | ndim (u8) | u32 * ndim | raw little-endian buffer
+
+Arrays keep their dtype on the wire, so the sender picks the width
+(float32 for SVD factors, int32 for CSR indices, ...).  Boolean arrays
+(syndromes, correction masks) are bit-packed: 1 bit per entry.
+"""
+
+import base64
+import struct
+
+import numpy as np
+
+WIRE_MAGIC = b"QECW"
+WIRE_VERSION = 1
+
+_NONE, _BOOL, _INT, _FLOAT, _STR, _INTS, _ARRAY = range(7)
+_DTYPES = (
+    np.dtype(bool), np.dtype("<i1"), np.dtype("<i2"), np.dtype("<i4"), np.dtype("<i8"),
+    np.dtype("<u1"), np.dtype("<f4"), np.dtype("<f8"),
+)
+_DTYPE_CODES = {dt: code for code, dt in enumerate(_DTYPES)}
+
+
+def encode(fields: dict) -> str:
+    """Pack a dict of scalars, strings, int tuples and NumPy arrays."""
+    out = [WIRE_MAGIC, struct.pack("<BH", WIRE_VERSION, len(fields))]
+    for name, value in fields.items():
+        key = name.encode("ascii")
+        out.append(struct.pack("<B", len(key)) + key)
+        out.append(_encode_value(name, value))
+    return base64.b85encode(b"".join(out)).decode("ascii")
+
+
+def decode(msg: str) -> dict:
+    """Inverse of encode; bool arrays come back as bool, others with their sent dtype."""
+    buf = base64.b85decode(msg)
+    if buf[:4] != WIRE_MAGIC:
+        raise ValueError("Not a wire-format message")
+    version, n_fields = struct.unpack_from("<BH", buf, 4)
+    if version != WIRE_VERSION:
+        raise ValueError(f"Unsupported wire-format version {version} (expected {WIRE_VERSION})")
+
+    fields, pos = {}, 7
+    for _ in range(n_fields):
+        (key_len,) = struct.unpack_from("<B", buf, pos)
+        name = buf[pos + 1 : pos + 1 + key_len].decode("ascii")
+        fields[name], pos = _decode_value(buf, pos + 1 + key_len)
+    return fields
+
+
+def _encode_value(name: str, value) -> bytes:
+    if value is None:
+        return struct.pack("<B", _NONE)
+    if isinstance(value, (bool, np.bool_)):
+        return struct.pack("<BB", _BOOL, bool(value))
+    if isinstance(value, (int, np.integer)):
+        return struct.pack("<Bq", _INT, int(value))
+    if isinstance(value, (float, np.floating)):
+        return struct.pack("<Bd", _FLOAT, float(value))
+    if isinstance(value, str):
+        raw = value.encode("utf-8")
+        return struct.pack("<BI", _STR, len(raw)) + raw
+    if isinstance(value, tuple):
+        if len(value) > 0xFF:
+            raise ValueError(f"Field '{name}': {len(value)} ints exceed the u8 INTS count")
+        return struct.pack(f"<BB{len(value)}i", _INTS, len(value), *value)
+    if isinstance(value, np.ndarray):
+        dtype = value.dtype.newbyteorder("<") if value.dtype.byteorder == ">" else value.dtype
+        if dtype not in _DTYPE_CODES:
+            raise TypeError(f"Field '{name}': unsupported array dtype {value.dtype}")
+        header = struct.pack(f"<BBB{value.ndim}I", _ARRAY, _DTYPE_CODES[dtype],
+                             value.ndim, *value.shape)
+        if dtype == np.dtype(bool):
+            return header + np.packbits(value.ravel(), bitorder="little").tobytes()
+        return header + np.ascontiguousarray(value, dtype=dtype).tobytes()
+    raise TypeError(f"Field '{name}': cannot encode {type(value).__name__}")
+
+
+def _decode_value(buf: bytes, pos: int) -> tuple:
+    (tag,) = struct.unpack_from("<B", buf, pos)
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _BOOL:
+        return bool(buf[pos]), pos + 1
+    if tag == _INT:
+        return struct.unpack_from("<q", buf, pos)[0], pos + 8
+    if tag == _FLOAT:
+        return struct.unpack_from("<d", buf, pos)[0], pos + 8
+    if tag == _STR:
+        (n,) = struct.unpack_from("<I", buf, pos)
+        return buf[pos + 4 : pos + 4 + n].decode("utf-8"), pos + 4 + n
+    if tag == _INTS:
+        (n,) = struct.unpack_from("<B", buf, pos)
+        return struct.unpack_from(f"<{n}i", buf, pos + 1), pos + 1 + 4 * n
+    if tag == _ARRAY:
+        code, ndim = struct.unpack_from("<BB", buf, pos)
+        shape = struct.unpack_from(f"<{ndim}I", buf, pos + 2)
+        pos += 2 + 4 * ndim
+        dtype, size = _DTYPES[code], int(np.prod(shape, dtype=np.int64))
+        if dtype == np.dtype(bool):
+            n_bytes = -(-size // 8)
+            bits = np.unpackbits(np.frombuffer(buf, np.uint8, n_bytes, pos),
+                                 count=size, bitorder="little")
+            return bits.astype(bool).reshape(shape), pos + n_bytes
+        n_bytes = size * dtype.itemsize
+        return np.frombuffer(buf, dtype, size, pos).reshape(shape).copy(), pos + n_bytes
+    raise ValueError(f"Unknown wire-format tag {tag}")